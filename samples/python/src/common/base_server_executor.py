@@ -18,14 +18,16 @@ This provides some custom abilities over the default AgentExecutor:
 1. It accepts a list of supported A2A extensions. Upon receiving a message, it
 activates any requested extensions that the agent supports.
 2. It leverages the FunctionCallResolver to identify the appropriate tool to
-use for a given request, and invoking it to complete the task.
+use for a given request, and invoking it to complete the task. The tools are
+indexed by name in a ToolRegistry when the executor is created.
 3. It logs key events in the Agent Payments Protocol to the watch log. See
 watch_log.py for more details.
 """
 
 import abc
 import logging
-from typing import Any, Callable, Tuple
+import time
+from typing import Any, Tuple
 import uuid
 
 from a2a.server.agent_execution.agent_executor import AgentExecutor
@@ -36,17 +38,23 @@ from a2a.types import Part
 from a2a.types import Task
 from a2a.types import TextPart
 from a2a.utils import message
+from ap2.types.mandate import CART_MANDATE_DATA_KEY
+from ap2.types.mandate import CartMandate
 from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
 from google import genai
 from ap2.types.mandate import PaymentMandate
-from common import message_utils
 from common import watch_log
 from common.a2a_extension_utils import EXTENSION_URI
 from common.function_call_resolver import FunctionCallResolver
+from common.function_call_resolver import KeywordRule
+from common.function_call_resolver import RoutingDecisionCache
+from common.message_utils import DataPartIndex
+from common.tool_registry import Tool
+from common.tool_registry import ToolRegistry
+from common.tool_registry import ToolSpec
 from common.validation import validate_payment_mandate_signature
 
 DataPartContent = dict[str, Any]
-Tool = Callable[[list[DataPartContent], TaskUpdater, Task | None], Any]
 
 class BaseServerExecutor(AgentExecutor, abc.ABC):
   """A baseline A2A AgentExecutor to be utilized by agents."""
@@ -54,15 +62,29 @@ class BaseServerExecutor(AgentExecutor, abc.ABC):
   def __init__(
       self,
       supported_extensions: list[dict[str, Any]] | None,
-      tools: list[Tool],
+      tools: list[Tool | ToolSpec],
       system_prompt: str = "You are a helpful assistant.",
+      prompt_routes: dict[str, str] | None = None,
+      keyword_rules: list[KeywordRule] | None = None,
+      audience: str | None = None,
   ):
     """Initialization.
 
     Args:
       supported_extensions: Extensions the agent declares that it supports.
-      tools: Tools supported by the agent.
+      tools: Tools supported by the agent, optionally with their metadata.
       system_prompt: Helps steer the model when choosing tools.
+      prompt_routes: Known prompts mapped to the tool that handles them, used
+        to skip the model for well-known requests.
+      keyword_rules: Keyword rules used to skip the model for requests that
+        are not known prompts.
+      audience: The merchant this agent is, or acts for, which the user
+        authorization of a PaymentMandate must be intended for. Defaults to
+        the merchant the PaymentMandate pays.
+
+    Raises:
+      ValueError: If several tools have the same name, or a route or rule
+        refers to a tool that does not exist.
     """
     if supported_extensions is not None:
       self._supported_extension_uris = {ext.uri for ext in supported_extensions}
@@ -75,9 +97,18 @@ class BaseServerExecutor(AgentExecutor, abc.ABC):
     else:
       # Try to get API key from environment or raise error
       raise ValueError("GOOGLE_API_KEY environment variable is required. Please set it in your .env file.")
-    self._tools = tools
+    self._audience = audience
+    self._tools = ToolRegistry(tools)
     self._tool_resolver = FunctionCallResolver(
-        self._client, self._tools, system_prompt
+        self._client,
+        self._tools.tools,
+        system_prompt,
+        prompt_routes=prompt_routes,
+        keyword_rules=keyword_rules,
+        # Set ROUTING_CACHE_PATH to keep routing decisions across restarts.
+        decision_cache=RoutingDecisionCache(
+            sqlite_path=os.getenv("ROUTING_CACHE_PATH")
+        ),
     )
     super().__init__()
 
@@ -98,12 +129,14 @@ class BaseServerExecutor(AgentExecutor, abc.ABC):
     self._handle_extensions(context)
 
     if EXTENSION_URI in context.call_context.activated_extensions:
-      payment_mandate = message_utils.find_data_part(
-          PAYMENT_MANDATE_DATA_KEY, data_parts
+      payment_mandate = data_parts.parse(
+          PAYMENT_MANDATE_DATA_KEY, PaymentMandate
       )
       if payment_mandate is not None:
-        validate_payment_mandate_signature(
-            PaymentMandate.model_validate(payment_mandate)
+        await validate_payment_mandate_signature(
+            payment_mandate,
+            data_parts.parse(CART_MANDATE_DATA_KEY, CartMandate),
+            audience=self._audience,
         )
     else:
       raise ValueError(
@@ -136,7 +169,7 @@ class BaseServerExecutor(AgentExecutor, abc.ABC):
   async def _handle_request(
       self,
       text_parts: list[str],
-      data_parts: list[dict[str, Any]],
+      data_parts: DataPartIndex,
       updater: TaskUpdater,
       current_task: Task | None,
   ) -> None:
@@ -144,24 +177,24 @@ class BaseServerExecutor(AgentExecutor, abc.ABC):
 
     Args:
       text_parts: A list of text parts from the request.
-      data_parts: A list of data parts from the request.
+      data_parts: The data parts from the request, indexed by key.
       updater: The TaskUpdater instance for updating the task.
       current_task: The current Task, if available.
     """
     try:
       prompt = (text_parts[0] if text_parts else "").strip()
-      tool_name = self._tool_resolver.determine_tool_to_use(prompt)
+      tool_name = await self._tool_resolver.determine_tool_to_use(
+          prompt, data_parts
+      )
       logging.info("Using tool: %s", tool_name)
 
-      matching_tools = list(
-          filter(lambda tool: tool.__name__ == tool_name, self._tools)
-      )
-      if len(matching_tools) != 1:
+      spec = self._tools.get(tool_name)
+      missing_keys = spec.data_keys.difference(data_parts.keys())
+      if missing_keys:
         raise ValueError(
-            f"Expected 1 tool matching {tool_name}, got {len(matching_tools)}"
+            f"Missing {', '.join(sorted(missing_keys))} for {tool_name}"
         )
-      callable_tool = matching_tools[0]
-      await callable_tool(data_parts, updater, current_task)
+      await self._call_tool(spec, data_parts, updater, current_task)
 
     except Exception as e:  # pylint: disable=broad-exception-caught
       error_message = updater.new_agent_message(
@@ -169,20 +202,43 @@ class BaseServerExecutor(AgentExecutor, abc.ABC):
       )
       await updater.failed(message=error_message)
 
+  def tool_stats(self) -> dict[str, dict[str, Any]]:
+    """Returns the call count, latency and error histograms of each tool."""
+    return self._tools.stats()
+
+  async def _call_tool(
+      self,
+      spec: ToolSpec,
+      data_parts: DataPartIndex,
+      updater: TaskUpdater,
+      current_task: Task | None,
+  ) -> None:
+    """Calls a tool, counting its latency and errors."""
+    start = time.perf_counter()
+    error = None
+    try:
+      await spec.tool(data_parts, updater, current_task)
+    except Exception as e:
+      error = e
+      raise
+    finally:
+      self._tools.record(spec.name, time.perf_counter() - start, error)
+
   def _parse_request(
       self, context: RequestContext
-  ) -> Tuple[list[str], list[dict[str, Any]]]:
+  ) -> Tuple[list[str], DataPartIndex]:
     """Parses the request and returns the text and data parts.
 
     Args:
       context: The A2A RequestContext
 
     Returns:
-      A tuple containing the contents of TextPart and DataPart objects.
+      A tuple containing the contents of TextPart objects, and of DataPart
+      objects indexed by key.
     """
     parts = context.message.parts if context.message else []
     text_parts = message.get_text_parts(parts)
-    data_parts = message.get_data_parts(parts)
+    data_parts = DataPartIndex(message.get_data_parts(parts))
     return text_parts, data_parts
 
   def _handle_extensions(self, context: RequestContext) -> None:
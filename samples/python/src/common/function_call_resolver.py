@@ -14,11 +14,32 @@
 
 """This module provides a FunctionCallResolver class.
 
-The FunctionCallResolver uses a LLM to determine which tool to
-use based on the instructions provided.
+The FunctionCallResolver determines which tool to use based on the
+instructions provided. Most callers send fixed, well-known prompts, so the
+resolver tries a series of cheap deterministic layers before falling back to
+the LLM:
+
+1. The prompt is exactly the name of a tool, e.g. "initiate_payment".
+2. The request carries an explicit `tool` DataPart naming the tool.
+3. The normalized prompt is in the table of known prompts.
+4. All the words of a keyword rule appear in the prompt.
+5. The LLM already chose a tool for the same prompt, tools and instructions,
+   and the decision is still in the RoutingDecisionCache.
+6. Otherwise, the LLM chooses the tool. The call is made asynchronously,
+   so that it does not block other requests, and is bounded by a deadline.
+
+Hits and misses are counted per layer and exposed through `stats()`.
 """
 
+import collections
+from collections.abc import Sequence
+import hashlib
 import logging
+import os
+import re
+import sqlite3
+import threading
+import time
 from typing import Any, Callable
 
 from a2a.server.tasks.task_updater import TaskUpdater
@@ -26,9 +47,162 @@ from a2a.types import Task
 from google import genai
 from google.genai import types
 
+from common import llm_utils
 
 DataPartContent = dict[str, Any]
-Tool = Callable[[list[DataPartContent], TaskUpdater, Task | None], Any]
+Tool = Callable[[Sequence[DataPartContent], TaskUpdater, Task | None], Any]
+# A keyword rule maps a set of words, all of which must appear in the prompt,
+# to the name of a tool.
+KeywordRule = tuple[tuple[str, ...], str]
+
+# The key of the DataPart a caller may use to name the tool explicitly.
+TOOL_DATA_KEY = "tool"
+
+UNKNOWN_TOOL = "Unknown"
+
+# The routing layers, in the order they are consulted.
+_LAYERS = (
+    "tool_name",
+    "tool_data_part",
+    "prompt_table",
+    "keyword",
+    "decision_cache",
+    "llm",
+)
+
+DEFAULT_CACHE_MAX_ENTRIES = 1024
+DEFAULT_CACHE_TTL_SECONDS = 3600.0
+
+# Expired rows are purged from the on-disk cache every this many writes.
+_SQLITE_PURGE_INTERVAL = 256
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+class RoutingDecisionCache:
+  """A bounded LRU cache of tool routing decisions with a TTL.
+
+  Entries are held in memory, least recently used first, and evicted once the
+  cache is full or their TTL has passed. If a SQLite path is given, decisions
+  are also written to disk, so that they survive restarts: a miss in memory
+  falls through to the database before counting as a miss.
+  """
+
+  def __init__(
+      self,
+      max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+      ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS,
+      sqlite_path: str | None = None,
+  ):
+    """Initialization.
+
+    Args:
+      max_entries: The maximum number of decisions held in memory.
+      ttl_seconds: How long a decision stays valid.
+      sqlite_path: The path of the optional on-disk tier.
+
+    Raises:
+      ValueError: If max_entries is not positive.
+    """
+    if max_entries <= 0:
+      raise ValueError("max_entries must be positive.")
+    self._max_entries = max_entries
+    self._ttl_seconds = ttl_seconds
+    self._entries: collections.OrderedDict[str, tuple[str, float]] = (
+        collections.OrderedDict()
+    )
+    self._lock = threading.Lock()
+    self._stats = collections.Counter()
+    self._sqlite_path = sqlite_path
+    self._db = None
+    self._db_pid = None
+
+  def get(self, key: str) -> str | None:
+    """Returns the cached tool name for the key, or None on a miss."""
+    now = time.time()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        tool_name, expires_at = entry
+        if expires_at > now:
+          self._entries.move_to_end(key)
+          self._stats["hits"] += 1
+          return tool_name
+        del self._entries[key]
+        self._stats["expirations"] += 1
+
+      db = self._connection()
+      if db is not None:
+        row = db.execute(
+            "SELECT tool_name, expires_at FROM routing_decisions"
+            " WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        if row is not None:
+          self._insert(key, row[0], row[1])
+          self._stats["disk_hits"] += 1
+          return row[0]
+
+      self._stats["misses"] += 1
+      return None
+
+  def put(self, key: str, tool_name: str) -> None:
+    """Caches a tool name for the key."""
+    expires_at = time.time() + self._ttl_seconds
+    with self._lock:
+      self._insert(key, tool_name, expires_at)
+      db = self._connection()
+      if db is not None:
+        db.execute(
+            "INSERT OR REPLACE INTO routing_decisions VALUES (?, ?, ?)",
+            (key, tool_name, expires_at),
+        )
+        self._stats["disk_writes"] += 1
+        if self._stats["disk_writes"] % _SQLITE_PURGE_INTERVAL == 0:
+          db.execute(
+              "DELETE FROM routing_decisions WHERE expires_at <= ?",
+              (time.time(),),
+          )
+        db.commit()
+
+  def stats(self) -> dict[str, int]:
+    """Returns the hit, miss, eviction and expiration counts."""
+    with self._lock:
+      return {
+          "size": len(self._entries),
+          "hits": self._stats["hits"],
+          "disk_hits": self._stats["disk_hits"],
+          "misses": self._stats["misses"],
+          "evictions": self._stats["evictions"],
+          "expirations": self._stats["expirations"],
+      }
+
+  def _connection(self) -> sqlite3.Connection | None:
+    """Returns the on-disk tier's connection for the current process.
+
+    A SQLite connection must not be used across a fork, so a worker process
+    opens its own rather than using one inherited from its parent.
+    """
+    if not self._sqlite_path:
+      return None
+    if self._db is None or self._db_pid != os.getpid():
+      self._db = sqlite3.connect(self._sqlite_path, check_same_thread=False)
+      self._db.execute(
+          "CREATE TABLE IF NOT EXISTS routing_decisions ("
+          " key TEXT PRIMARY KEY, tool_name TEXT NOT NULL,"
+          " expires_at REAL NOT NULL)"
+      )
+      self._db.commit()
+      self._db_pid = os.getpid()
+    return self._db
+
+  def _insert(self, key: str, tool_name: str, expires_at: float) -> None:
+    """Inserts an entry in memory, evicting the least recently used."""
+    self._entries[key] = (tool_name, expires_at)
+    self._entries.move_to_end(key)
+    while len(self._entries) > self._max_entries:
+      self._entries.popitem(last=False)
+      self._stats["evictions"] += 1
 
 
 class FunctionCallResolver:
@@ -39,6 +213,10 @@ class FunctionCallResolver:
       llm_client: genai.Client,
       tools: list[Tool],
       instructions: str = "You are a helpful assistant.",
+      prompt_routes: dict[str, str] | None = None,
+      keyword_rules: list[KeywordRule] | None = None,
+      decision_cache: RoutingDecisionCache | None = None,
+      llm_timeout_seconds: float = llm_utils.DEFAULT_TIMEOUT_SECONDS,
   ):
     """Initialization.
 
@@ -46,8 +224,33 @@ class FunctionCallResolver:
       llm_client: The LLM client.
       tools: The list of tools that a request can be resolved to.
       instructions: The instructions to guide the LLM.
+      prompt_routes: Known prompts mapped to the name of the tool to use.
+      keyword_rules: Keyword rules, consulted in order, used when the prompt
+        is not a known prompt.
+      decision_cache: The cache of earlier LLM decisions. Defaults to an
+        in-memory cache.
+      llm_timeout_seconds: The deadline for the LLM to choose a tool.
+
+    Raises:
+      ValueError: If a route or rule refers to a tool that does not exist.
     """
     self._client = llm_client
+    self._llm_timeout_seconds = llm_timeout_seconds
+    self._tool_names = frozenset(tool.__name__ for tool in tools)
+    self._prompt_routes = {
+        _normalize_prompt(prompt): self._check_tool_name(tool_name)
+        for prompt, tool_name in (prompt_routes or {}).items()
+    }
+    self._keyword_rules = [
+        (
+            frozenset(keyword.casefold() for keyword in keywords),
+            self._check_tool_name(tool_name),
+        )
+        for keywords, tool_name in (keyword_rules or [])
+    ]
+    self._decision_cache = decision_cache or RoutingDecisionCache()
+    self._fingerprint = _fingerprint_tools(tools, instructions)
+    self._stats = collections.Counter()
     function_declarations = [
         types.FunctionDeclaration(
             name=tool.__name__, description=tool.__doc__
@@ -66,24 +269,104 @@ class FunctionCallResolver:
         ),
     )
 
-  def determine_tool_to_use(self, prompt: str) -> str:
+  async def determine_tool_to_use(
+      self,
+      prompt: str,
+      data_parts: Sequence[DataPartContent] | None = None,
+  ) -> str:
     """Determines which tool to use based on a user's prompt.
 
-    Uses a LLM to analyze the user's prompt and decide which of the available
-    tools (functions) is the most appropriate to handle the request.
+    The deterministic routing layers are tried first. Only if none of them
+    resolves the request is the LLM asked to analyze the prompt and decide
+    which of the available tools (functions) is the most appropriate.
 
     Args:
         prompt: The user's request as a string.
+        data_parts: The DataPart contents of the request, if any.
 
     Returns:
-        The name of the tool function that the model has determined should be
-        called. If no suitable tool is found, it returns "Unknown".
+        The name of the tool function that should be called. If no suitable
+        tool is found, it returns "Unknown".
+
+    Raises:
+        TimeoutError: If the LLM does not respond within the deadline.
+    """
+    normalized_prompt = _normalize_prompt(prompt)
+
+    tool_name = self._route_deterministically(
+        prompt, normalized_prompt, data_parts or []
+    )
+    if tool_name is not None:
+      return tool_name
+
+    cache_key = self._cache_key(normalized_prompt)
+    tool_name = self._decision_cache.get(cache_key)
+    self._record("decision_cache", tool_name in self._tool_names)
+    if tool_name in self._tool_names:
+      return tool_name
+
+    tool_name = await self._ask_llm(prompt)
+    self._record("llm", tool_name != UNKNOWN_TOOL)
+    if tool_name in self._tool_names:
+      self._decision_cache.put(cache_key, tool_name)
+    return tool_name
+
+  def stats(self) -> dict[str, dict[str, int]]:
+    """Returns the hit and miss counts of each routing layer.
+
+    The statistics of the decision cache itself, such as its evictions, are
+    reported under the "cache" key.
     """
+    stats = {
+        layer: {
+            "hits": self._stats[f"{layer}_hits"],
+            "misses": self._stats[f"{layer}_misses"],
+        }
+        for layer in _LAYERS
+    }
+    stats["cache"] = self._decision_cache.stats()
+    return stats
 
-    response = self._client.models.generate_content(
-        model="gemini-2.5-flash",
+  def _route_deterministically(
+      self,
+      prompt: str,
+      normalized_prompt: str,
+      data_parts: Sequence[DataPartContent],
+  ) -> str | None:
+    """Resolves the tool without the LLM, or returns None on a miss."""
+    if prompt.strip() in self._tool_names:
+      self._record("tool_name", True)
+      return prompt.strip()
+    self._record("tool_name", False)
+
+    tool_name = _find_tool_data_part(data_parts)
+    if tool_name in self._tool_names:
+      self._record("tool_data_part", True)
+      return tool_name
+    if tool_name is not None:
+      logging.warning("Ignoring request for unknown tool: %s", tool_name)
+    self._record("tool_data_part", False)
+
+    tool_name = self._prompt_routes.get(normalized_prompt)
+    self._record("prompt_table", tool_name is not None)
+    if tool_name is not None:
+      return tool_name
+
+    words = set(_WORD_PATTERN.findall(normalized_prompt))
+    for keywords, tool_name in self._keyword_rules:
+      if keywords <= words:
+        self._record("keyword", True)
+        return tool_name
+    self._record("keyword", False)
+    return None
+
+  async def _ask_llm(self, prompt: str) -> str:
+    """Uses the LLM to choose a tool for the prompt."""
+    response = await llm_utils.generate_content(
+        self._client,
         contents=prompt,
         config=self._config,
+        timeout=self._llm_timeout_seconds,
     )
 
     logging.debug("\nDetermine Tool Response: %s\n", response)
@@ -97,4 +380,46 @@ class FunctionCallResolver:
         if part.function_call:
           return part.function_call.name
 
-    return "Unknown"
+    return UNKNOWN_TOOL
+
+  def _cache_key(self, normalized_prompt: str) -> str:
+    """Returns the decision cache key of a normalized prompt."""
+    return hashlib.sha256(
+        f"{self._fingerprint}\0{normalized_prompt}".encode("utf-8")
+    ).hexdigest()
+
+  def _check_tool_name(self, tool_name: str) -> str:
+    """Returns the tool name, or raises if no such tool exists."""
+    if tool_name not in self._tool_names:
+      raise ValueError(f"Unknown tool in routing table: {tool_name}")
+    return tool_name
+
+  def _record(self, layer: str, hit: bool) -> None:
+    """Counts a hit or a miss for the given routing layer."""
+    self._stats[f"{layer}_{'hits' if hit else 'misses'}"] += 1
+    if hit:
+      logging.debug("Tool resolved by the %s layer.", layer)
+
+
+def _fingerprint_tools(tools: list[Tool], instructions: str) -> str:
+  """Returns a digest of the tool declarations and the system prompt."""
+  fingerprint = hashlib.sha256(instructions.encode("utf-8"))
+  for tool in sorted(tools, key=lambda tool: tool.__name__):
+    fingerprint.update(f"\0{tool.__name__}\0{tool.__doc__ or ''}".encode())
+  return fingerprint.hexdigest()
+
+
+def _normalize_prompt(prompt: str) -> str:
+  """Normalizes case, whitespace and trailing punctuation of a prompt."""
+  return " ".join(prompt.casefold().split()).rstrip(".!?")
+
+
+def _find_tool_data_part(
+    data_parts: Sequence[DataPartContent],
+) -> str | None:
+  """Returns the tool explicitly named in the data parts, if any."""
+  for data_part in data_parts:
+    tool_name = data_part.get(TOOL_DATA_KEY)
+    if isinstance(tool_name, str):
+      return tool_name
+  return None
@@ -0,0 +1,61 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generation of unique IDs.
+
+IDs are ULIDs (https://github.com/ulid/spec): 26 characters that encode a
+millisecond timestamp followed by 80 random bits. They are unique across
+processes, and sort in the order they were created.
+"""
+
+import secrets
+import threading
+import time
+
+
+# Crockford's base32 alphabet, which excludes I, L, O and U.
+_ENCODING = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last_timestamp_ms = 0
+_last_random = 0
+
+
+def new_ulid() -> str:
+  """Returns a new ULID.
+
+  IDs created within the same millisecond by this process increment the random
+  part of the previous ID, so they still sort in creation order.
+  """
+  global _last_timestamp_ms, _last_random
+  with _lock:
+    timestamp_ms = time.time_ns() // 1_000_000
+    if timestamp_ms <= _last_timestamp_ms:
+      timestamp_ms = _last_timestamp_ms
+      random_part = _last_random + 1
+      if random_part >> _RANDOM_BITS:
+        # The random part overflowed; borrow the next millisecond.
+        timestamp_ms += 1
+        random_part = secrets.randbits(_RANDOM_BITS)
+    else:
+      random_part = secrets.randbits(_RANDOM_BITS)
+    _last_timestamp_ms = timestamp_ms
+    _last_random = random_part
+
+  value = (timestamp_ms << _RANDOM_BITS) | random_part
+  return "".join(
+      _ENCODING[(value >> shift) & 0x1F] for shift in range(125, -1, -5)
+  )
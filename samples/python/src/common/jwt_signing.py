@@ -0,0 +1,473 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Signing of JSON Web Tokens (JWTs) with ES256.
+
+Agents sign JWTs, such as a CartMandate's merchant_authorization, with P-256
+keys from a KeyRing. A KeyRing holds every key in rotation, identified by its
+key ID (kid): new tokens are signed with the active key, and the public keys
+of all of them are published so that tokens signed before a rotation can still
+be verified.
+
+The signatures are computed in a pool of worker processes, so they do not
+hold up the event loop. Each worker loads the private keys once, when it
+starts, and several tokens can be signed in a single call to the pool.
+"""
+
+import asyncio
+import base64
+from collections.abc import Mapping
+from collections.abc import Sequence
+import concurrent.futures
+import json
+import multiprocessing
+import os
+from typing import Any
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import utils
+
+from common import id_utils
+
+
+ALGORITHM = "ES256"
+
+# The number of worker processes that sign tokens. 0 signs them in a thread of
+# the calling process instead.
+DEFAULT_SIGNING_PROCESSES = int(os.getenv("JWT_SIGNING_PROCESSES", "1"))
+
+# The byte length of each of the r and s values of a P-256 signature.
+_COORDINATE_SIZE = 32
+
+# The file of the key generated in an empty key directory.
+_GENERATED_KEY_FILE = "generated.pem"
+
+
+class KeyRing:
+  """The signing keys in rotation, by key ID."""
+
+  def __init__(self, private_keys_pem: Mapping[str, bytes], active_kid: str):
+    """Initialization.
+
+    Args:
+      private_keys_pem: The PEM encoded P-256 private keys, by key ID.
+      active_kid: The ID of the key that signs new tokens.
+
+    Raises:
+      ValueError: If the active key is not one of the keys, or a key is not a
+        P-256 private key.
+    """
+    if active_kid not in private_keys_pem:
+      raise ValueError(f"Unknown active key ID: {active_kid}")
+    self.private_keys_pem = dict(private_keys_pem)
+    self.active_kid = active_kid
+    self._public_keys = {
+        kid: load_private_key(pem).public_key()
+        for kid, pem in self.private_keys_pem.items()
+    }
+
+  @classmethod
+  def from_directory(
+      cls, directory: str, active_kid: str | None = None
+  ) -> "KeyRing":
+    """Loads the keys in a directory, named <kid>.pem.
+
+    Args:
+      directory: The directory holding the PEM encoded private keys.
+      active_kid: The ID of the key that signs new tokens. Defaults to the
+        last key ID in sort order, e.g. the newest of dated key IDs.
+
+    Returns:
+      The KeyRing.
+
+    Raises:
+      ValueError: If the directory holds no keys.
+    """
+    private_keys_pem = {}
+    for file_name in sorted(os.listdir(directory)):
+      kid, extension = os.path.splitext(file_name)
+      if extension == ".pem":
+        with open(os.path.join(directory, file_name), "rb") as f:
+          private_keys_pem[kid] = f.read()
+    if not private_keys_pem:
+      raise ValueError(f"No signing keys found in {directory}")
+    return cls(private_keys_pem, active_kid or max(private_keys_pem))
+
+  @classmethod
+  def from_directory_or_generate(
+      cls, directory: str, active_kid: str | None = None
+  ) -> "KeyRing":
+    """Loads the keys in a directory, generating a key if it holds none.
+
+    Processes that start at once, e.g. the workers of a server, all load the
+    same key: only the first of them to store a generated key succeeds.
+
+    Args:
+      directory: The directory holding the PEM encoded private keys.
+      active_kid: The ID of the key that signs new tokens, see
+        from_directory().
+
+    Returns:
+      The KeyRing.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if not any(name.endswith(".pem") for name in os.listdir(directory)):
+      key_ring = cls.generate()
+      temporary_path = os.path.join(directory, f".{key_ring.active_kid}.tmp")
+      # Only readable by the user, as it is a private key.
+      fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+      with os.fdopen(fd, "wb") as f:
+        f.write(key_ring.private_keys_pem[key_ring.active_kid])
+      try:
+        # Unlike a rename, fails if another process stored its key first.
+        os.link(temporary_path, os.path.join(directory, _GENERATED_KEY_FILE))
+      except FileExistsError:
+        pass
+      finally:
+        os.remove(temporary_path)
+    return cls.from_directory(directory, active_kid)
+
+  @classmethod
+  def generate(cls) -> "KeyRing":
+    """Creates a KeyRing holding a single, newly generated key."""
+    pem = ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    kid = f"generated-{id_utils.new_ulid()}"
+    return cls({kid: pem}, kid)
+
+  def public_key(self, kid: str) -> ec.EllipticCurvePublicKey | None:
+    """Returns the public key with the given ID, or None if it is unknown."""
+    return self._public_keys.get(kid)
+
+  def jwks(self) -> dict[str, Any]:
+    """Returns the public keys of all the keys, as a JSON Web Key Set."""
+    return {
+        "keys": [
+            public_jwk(key, kid) for kid, key in self._public_keys.items()
+        ]
+    }
+
+  def publish_jwks(self, path: str) -> None:
+    """Writes the JSON Web Key Set of the keys to a file, for verifiers.
+
+    Args:
+      path: The path of the file. Readers never see it partially written.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+      json.dump(self.jwks(), f)
+    os.replace(temporary_path, path)
+
+  def public_keys_pem(self) -> dict[str, bytes]:
+    """Returns the PEM encoded public keys of all the keys, by key ID."""
+    return {
+        kid: key.public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        for kid, key in self._public_keys.items()
+    }
+
+
+class JwtSigner:
+  """Signs JWTs with the active key of a KeyRing."""
+
+  def __init__(
+      self,
+      key_ring: KeyRing,
+      processes: int = DEFAULT_SIGNING_PROCESSES,
+  ):
+    """Initialization.
+
+    Args:
+      key_ring: The signing keys.
+      processes: The number of worker processes that sign tokens. 0 signs
+        them in a thread of this process instead.
+    """
+    self._key_ring = key_ring
+    self._processes = processes
+    self._executor: concurrent.futures.Executor | None = None
+
+  @property
+  def key_ring(self) -> KeyRing:
+    return self._key_ring
+
+  async def sign(self, claims: Mapping[str, Any]) -> str:
+    """Signs a JWT.
+
+    Args:
+      claims: The claims of the JWT's payload.
+
+    Returns:
+      The compact serialization of the JWT.
+    """
+    (token,) = await self.sign_many([claims])
+    return token
+
+  async def sign_many(self, claims: Sequence[Mapping[str, Any]]) -> list[str]:
+    """Signs several JWTs in a single call to a worker.
+
+    Args:
+      claims: The claims of each JWT's payload.
+
+    Returns:
+      The compact serializations of the JWTs, in the same order.
+    """
+    if not claims:
+      return []
+    kid = self._key_ring.active_kid
+    header = _encode_part({"alg": ALGORITHM, "kid": kid, "typ": "JWT"})
+    signing_inputs = [f"{header}.{_encode_part(c)}" for c in claims]
+    signatures = await asyncio.get_running_loop().run_in_executor(
+        self._get_executor(),
+        _sign_batch,
+        kid,
+        [signing_input.encode("ascii") for signing_input in signing_inputs],
+    )
+    return [
+        f"{signing_input}.{_base64url(signature)}"
+        for signing_input, signature in zip(
+            signing_inputs, signatures, strict=True
+        )
+    ]
+
+  def close(self) -> None:
+    """Stops the worker processes."""
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+  def _get_executor(self) -> concurrent.futures.Executor:
+    """Returns the executor, starting it on first use."""
+    if self._executor is None:
+      if self._processes > 0:
+        # Spawned rather than forked: the workers are started from a process
+        # that is already running threads and an event loop.
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_keys,
+            initargs=(self._key_ring.private_keys_pem,),
+        )
+      else:
+        _load_keys(self._key_ring.private_keys_pem)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="jwt-signer"
+        )
+    return self._executor
+
+
+def encode(
+    claims: Mapping[str, Any],
+    private_key: ec.EllipticCurvePrivateKey,
+    kid: str | None = None,
+    typ: str = "JWT",
+) -> str:
+  """Signs a JWT in the calling thread, with a key outside of any KeyRing.
+
+  Used for keys that sign rarely, e.g. a user's device key.
+
+  Args:
+    claims: The claims of the JWT's payload.
+    private_key: The P-256 private key to sign with.
+    kid: The ID of the key, if any.
+    typ: The type of the JWT.
+
+  Returns:
+    The compact serialization of the JWT.
+  """
+  header = {"alg": ALGORITHM, "typ": typ}
+  if kid is not None:
+    header["kid"] = kid
+  signing_input = f"{_encode_part(header)}.{_encode_part(claims)}"
+  (signature,) = _sign_all(private_key, [signing_input.encode("ascii")])
+  return f"{signing_input}.{_base64url(signature)}"
+
+
+def public_jwk(
+    public_key: ec.EllipticCurvePublicKey, kid: str | None = None
+) -> dict[str, str]:
+  """Returns a P-256 public key as a JSON Web Key."""
+  numbers = public_key.public_numbers()
+  jwk = {
+      "kty": "EC",
+      "crv": "P-256",
+      "x": _base64url(numbers.x.to_bytes(_COORDINATE_SIZE, "big")),
+      "y": _base64url(numbers.y.to_bytes(_COORDINATE_SIZE, "big")),
+  }
+  if kid is not None:
+    jwk["kid"] = kid
+  return jwk
+
+
+def public_key_from_jwk(jwk: Mapping[str, Any]) -> ec.EllipticCurvePublicKey:
+  """Loads a P-256 public key from a JSON Web Key.
+
+  Raises:
+    ValueError: If the JWK is not a valid P-256 public key.
+  """
+  if jwk.get("kty") != "EC" or jwk.get("crv") != "P-256":
+    raise ValueError("Only P-256 JSON Web Keys are supported.")
+  try:
+    x = int.from_bytes(_base64url_decode(jwk["x"]), "big")
+    y = int.from_bytes(_base64url_decode(jwk["y"]), "big")
+    return ec.EllipticCurvePublicNumbers(x, y, ec.SECP256R1()).public_key()
+  except (KeyError, TypeError, ValueError) as e:
+    raise ValueError(f"Invalid JSON Web Key: {e}") from e
+
+
+def decode_unverified(token: str) -> tuple[dict[str, Any], dict[str, Any]]:
+  """Decodes a JWT's header and claims, without verifying its signature."""
+  header, payload, _ = token.split(".")
+  return json.loads(_base64url_decode(header)), json.loads(
+      _base64url_decode(payload)
+  )
+
+
+def verify(token: str, key_ring: KeyRing) -> dict[str, Any]:
+  """Verifies a JWT's signature and returns its claims.
+
+  Only the signature is checked; the caller must validate the claims.
+
+  Args:
+    token: The compact serialization of the JWT.
+    key_ring: The keys that may have signed the token.
+
+  Returns:
+    The claims.
+
+  Raises:
+    ValueError: If the token is malformed, or its signature is not valid.
+  """
+  header, _ = _decode(token)
+  public_key = key_ring.public_key(header.get("kid", ""))
+  if public_key is None:
+    raise ValueError("Invalid JWT signature.")
+  _, claims = verify_with_key(token, public_key)
+  return claims
+
+
+def verify_with_key(
+    token: str, public_key: ec.EllipticCurvePublicKey
+) -> tuple[dict[str, Any], dict[str, Any]]:
+  """Verifies a JWT's signature with a given key.
+
+  Only the signature is checked; the caller must validate the claims.
+
+  Args:
+    token: The compact serialization of the JWT.
+    public_key: The public key of the key that signed the token.
+
+  Returns:
+    The header and claims.
+
+  Raises:
+    ValueError: If the token is malformed, or its signature is not valid.
+  """
+  header, claims = _decode(token)
+  if header.get("alg") != ALGORITHM:
+    raise ValueError(f"Unsupported JWT algorithm: {header.get('alg')}")
+  signing_input, encoded_signature = token.rsplit(".", 1)
+  try:
+    signature = _base64url_decode(encoded_signature)
+  except ValueError as e:
+    raise ValueError(f"Malformed JWT: {e}") from e
+  if len(signature) != 2 * _COORDINATE_SIZE:
+    raise ValueError("Invalid JWT signature.")
+  r = int.from_bytes(signature[:_COORDINATE_SIZE], "big")
+  s = int.from_bytes(signature[_COORDINATE_SIZE:], "big")
+  try:
+    public_key.verify(
+        utils.encode_dss_signature(r, s),
+        signing_input.encode("ascii"),
+        ec.ECDSA(hashes.SHA256()),
+    )
+  except Exception as e:  # cryptography raises InvalidSignature.
+    raise ValueError("Invalid JWT signature.") from e
+  return header, claims
+
+
+def _decode(token: str) -> tuple[dict[str, Any], dict[str, Any]]:
+  """Decodes a JWT's header and claims, raising ValueError if malformed."""
+  try:
+    header, claims = decode_unverified(token)
+  except (ValueError, UnicodeDecodeError) as e:
+    raise ValueError(f"Malformed JWT: {e}") from e
+  if not isinstance(header, dict) or not isinstance(claims, dict):
+    raise ValueError("Malformed JWT: the header and claims must be objects.")
+  return header, claims
+
+
+# The private keys loaded by this process, by key ID.
+_loaded_keys: dict[str, ec.EllipticCurvePrivateKey] = {}
+
+
+def _load_keys(private_keys_pem: Mapping[str, bytes]) -> None:
+  """Loads the private keys, once per worker."""
+  for kid, pem in private_keys_pem.items():
+    if kid not in _loaded_keys:
+      _loaded_keys[kid] = load_private_key(pem)
+
+
+def load_private_key(pem: bytes) -> ec.EllipticCurvePrivateKey:
+  """Loads a PEM encoded P-256 private key.
+
+  Raises:
+    ValueError: If the key is not a P-256 private key.
+  """
+  key = serialization.load_pem_private_key(pem, password=None)
+  if not isinstance(key, ec.EllipticCurvePrivateKey) or not isinstance(
+      key.curve, ec.SECP256R1
+  ):
+    raise ValueError("Signing keys must be P-256 private keys.")
+  return key
+
+
+def _sign_batch(kid: str, signing_inputs: list[bytes]) -> list[bytes]:
+  """Signs each input with a loaded key, in a worker."""
+  return _sign_all(_loaded_keys[kid], signing_inputs)
+
+
+def _sign_all(
+    key: ec.EllipticCurvePrivateKey, signing_inputs: list[bytes]
+) -> list[bytes]:
+  """Signs each input with the key. Returns raw r || s values."""
+  signatures = []
+  for signing_input in signing_inputs:
+    r, s = utils.decode_dss_signature(
+        key.sign(signing_input, ec.ECDSA(hashes.SHA256()))
+    )
+    signatures.append(
+        r.to_bytes(_COORDINATE_SIZE, "big")
+        + s.to_bytes(_COORDINATE_SIZE, "big")
+    )
+  return signatures
+
+
+def _encode_part(value: Mapping[str, Any]) -> str:
+  """Encodes a JWT header or payload."""
+  return _base64url(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def _base64url(data: bytes) -> str:
+  return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _base64url_decode(data: str) -> bytes:
+  return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
@@ -0,0 +1,357 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Key-value stores for state that the agents keep between requests.
+
+By default, state is kept in process memory. When an agent is served by
+several worker processes, a request may land on a different process than the
+one before it, so the state must be shared: configure() switches every store to
+a SQLite database that all the processes open.
+
+Values must be JSON serializable. A value may be given an expiry time, after
+which it is removed, and in-memory stores can be bounded in size, evicting the
+least recently used values first.
+"""
+
+import abc
+import collections
+from collections.abc import Callable
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+
+# How many writes a SQLite store makes between purges of expired values.
+_SQLITE_PURGE_INTERVAL = 256
+
+
+class KeyValueStore(abc.ABC):
+  """A namespace of keys mapped to JSON serializable values."""
+
+  @abc.abstractmethod
+  def get(self, key: str) -> Any | None:
+    """Returns the value of the key, or None if it is not set or expired."""
+
+  @abc.abstractmethod
+  def set(self, key: str, value: Any, expires_at: float | None = None) -> None:
+    """Sets the value of the key.
+
+    Args:
+      key: The key to set.
+      value: The value.
+      expires_at: When the value expires, in seconds since the epoch. None if
+        it never expires.
+    """
+
+  @abc.abstractmethod
+  def delete(self, key: str) -> None:
+    """Deletes the key, if it is set."""
+
+  @abc.abstractmethod
+  def update(
+      self,
+      key: str,
+      update_fn: Callable[[Any | None], Any],
+      ttl_seconds: float | None = None,
+  ) -> Any:
+    """Atomically replaces the value of the key.
+
+    Args:
+      key: The key to update.
+      update_fn: Returns the new value, given the current value or None. If it
+        raises, the value is left unchanged.
+      ttl_seconds: If set, the value expires this long from now. Otherwise, it
+        keeps its expiry time.
+
+    Returns:
+      The new value.
+    """
+
+  @abc.abstractmethod
+  def stats(self) -> dict[str, int]:
+    """Returns the hit, miss, eviction and expiration counts."""
+
+
+class InMemoryKeyValueStore(KeyValueStore):
+  """A KeyValueStore held in the memory of the current process.
+
+  Expired values are found through a min-heap of expiry times, so they are
+  removed in the order they expire without scanning the store.
+  """
+
+  def __init__(self, max_entries: int | None = None):
+    """Initialization.
+
+    Args:
+      max_entries: The maximum number of values held. When exceeded, the
+        least recently used values are evicted. None for no limit.
+
+    Raises:
+      ValueError: If max_entries is not positive.
+    """
+    if max_entries is not None and max_entries <= 0:
+      raise ValueError("max_entries must be positive.")
+    self._max_entries = max_entries
+    self._entries: collections.OrderedDict[str, tuple[Any, float | None]] = (
+        collections.OrderedDict()
+    )
+    self._expiry_heap: list[tuple[float, str]] = []
+    self._lock = threading.Lock()
+    self._stats = collections.Counter()
+
+  def get(self, key: str) -> Any | None:
+    with self._lock:
+      self._expire()
+      entry = self._entries.get(key)
+      if entry is None:
+        self._stats["misses"] += 1
+        return None
+      self._entries.move_to_end(key)
+      self._stats["hits"] += 1
+      return entry[0]
+
+  def set(self, key: str, value: Any, expires_at: float | None = None) -> None:
+    with self._lock:
+      self._expire()
+      self._insert(key, value, expires_at)
+
+  def delete(self, key: str) -> None:
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def update(
+      self,
+      key: str,
+      update_fn: Callable[[Any | None], Any],
+      ttl_seconds: float | None = None,
+  ) -> Any:
+    with self._lock:
+      self._expire()
+      value, expires_at = self._entries.get(key, (None, None))
+      value = update_fn(value)
+      if ttl_seconds is not None:
+        expires_at = time.time() + ttl_seconds
+      self._insert(key, value, expires_at)
+      return value
+
+  def stats(self) -> dict[str, int]:
+    with self._lock:
+      return {
+          "size": len(self._entries),
+          "hits": self._stats["hits"],
+          "misses": self._stats["misses"],
+          "evictions": self._stats["evictions"],
+          "expirations": self._stats["expirations"],
+      }
+
+  def _insert(self, key: str, value: Any, expires_at: float | None) -> None:
+    """Inserts a value, evicting the least recently used if over the limit."""
+    self._entries[key] = (value, expires_at)
+    self._entries.move_to_end(key)
+    if expires_at is not None:
+      heapq.heappush(self._expiry_heap, (expires_at, key))
+    while self._max_entries and len(self._entries) > self._max_entries:
+      self._entries.popitem(last=False)
+      self._stats["evictions"] += 1
+
+    # Values that were replaced, deleted or evicted leave stale entries in the
+    # heap; rebuild it once they make up most of it.
+    if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+      self._expiry_heap = [
+          (entry_expires_at, entry_key)
+          for entry_key, (_, entry_expires_at) in self._entries.items()
+          if entry_expires_at is not None
+      ]
+      heapq.heapify(self._expiry_heap)
+
+  def _expire(self) -> None:
+    """Removes the values that have expired."""
+    now = time.time()
+    while self._expiry_heap and self._expiry_heap[0][0] <= now:
+      expires_at, key = heapq.heappop(self._expiry_heap)
+      entry = self._entries.get(key)
+      # Skip heap entries of values that were since replaced or removed.
+      if entry is not None and entry[1] == expires_at:
+        del self._entries[key]
+        self._stats["expirations"] += 1
+
+
+class SqliteKeyValueStore(KeyValueStore):
+  """A KeyValueStore in a SQLite database shared by several processes."""
+
+  def __init__(self, path: str, namespace: str):
+    """Initialization.
+
+    Args:
+      path: The path of the database file.
+      namespace: Separates these keys from those of other stores.
+    """
+    self._path = path
+    self._namespace = namespace
+    self._lock = threading.Lock()
+    self._db = None
+    self._db_pid = None
+    self._stats = collections.Counter()
+
+  def get(self, key: str) -> Any | None:
+    with self._lock:
+      row = self._select(self._connection(), key)
+      self._stats["hits" if row else "misses"] += 1
+    return json.loads(row[0]) if row else None
+
+  def set(self, key: str, value: Any, expires_at: float | None = None) -> None:
+    with self._lock:
+      self._write(self._connection(), key, value, expires_at)
+
+  def delete(self, key: str) -> None:
+    with self._lock:
+      self._connection().execute(
+          "DELETE FROM kv WHERE namespace = ? AND key = ?",
+          (self._namespace, key),
+      )
+
+  def update(
+      self,
+      key: str,
+      update_fn: Callable[[Any | None], Any],
+      ttl_seconds: float | None = None,
+  ) -> Any:
+    with self._lock:
+      db = self._connection()
+      # Take the write lock up front, so that no other process can update the
+      # key between the read and the write.
+      db.execute("BEGIN IMMEDIATE")
+      try:
+        row = self._select(db, key)
+        value = update_fn(json.loads(row[0]) if row else None)
+        if ttl_seconds is not None:
+          expires_at = time.time() + ttl_seconds
+        else:
+          expires_at = row[1] if row else None
+        self._write(db, key, value, expires_at)
+      except BaseException:
+        db.execute("ROLLBACK")
+        raise
+      db.execute("COMMIT")
+      return value
+
+  def stats(self) -> dict[str, int]:
+    with self._lock:
+      return {
+          "hits": self._stats["hits"],
+          "misses": self._stats["misses"],
+          "evictions": 0,
+          "expirations": self._stats["expirations"],
+      }
+
+  def _select(
+      self, db: sqlite3.Connection, key: str
+  ) -> tuple[str, float | None] | None:
+    """Returns the unexpired value of the key and its expiry time."""
+    return db.execute(
+        "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?"
+        " AND (expires_at IS NULL OR expires_at > ?)",
+        (self._namespace, key, time.time()),
+    ).fetchone()
+
+  def _write(
+      self,
+      db: sqlite3.Connection,
+      key: str,
+      value: Any,
+      expires_at: float | None,
+  ) -> None:
+    """Writes a value, purging expired values every so often."""
+    db.execute(
+        "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+        (self._namespace, key, json.dumps(value), expires_at),
+    )
+    self._stats["writes"] += 1
+    if self._stats["writes"] % _SQLITE_PURGE_INTERVAL == 0:
+      cursor = db.execute(
+          "DELETE FROM kv WHERE namespace = ? AND expires_at <= ?",
+          (self._namespace, time.time()),
+      )
+      self._stats["expirations"] += cursor.rowcount
+
+  def _connection(self) -> sqlite3.Connection:
+    """Returns the connection of the current process, opening it if needed.
+
+    A SQLite connection must not be used across a fork, so a worker process
+    opens its own rather than using one inherited from its parent.
+    """
+    if self._db is None or self._db_pid != os.getpid():
+      directory = os.path.dirname(self._path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      self._db = sqlite3.connect(
+          self._path,
+          timeout=30.0,
+          isolation_level=None,
+          check_same_thread=False,
+      )
+      self._db.execute("PRAGMA journal_mode=WAL")
+      self._db.execute(
+          "CREATE TABLE IF NOT EXISTS kv ("
+          " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+          " expires_at REAL, PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+      )
+      self._db_pid = os.getpid()
+    return self._db
+
+
+_sqlite_path: str | None = None
+
+_stores: dict[str, KeyValueStore] = {}
+
+
+def configure(sqlite_path: str | None) -> None:
+  """Selects where the stores returned by get_store() keep their values.
+
+  Must be called before the stores are first used.
+
+  Args:
+    sqlite_path: The SQLite database shared by the server processes, or None
+      to keep the values in process memory.
+  """
+  global _sqlite_path
+  _sqlite_path = sqlite_path
+  _stores.clear()
+
+
+def get_store(
+    namespace: str, max_entries: int | None = None
+) -> KeyValueStore:
+  """Returns the process-wide store for a namespace.
+
+  Args:
+    namespace: The namespace of the store.
+    max_entries: The maximum number of values held by an in-memory store,
+      used when the store is created. None for no limit.
+
+  Returns:
+    The store.
+  """
+  store = _stores.get(namespace)
+  if store is None:
+    if _sqlite_path:
+      store = SqliteKeyValueStore(_sqlite_path, namespace)
+    else:
+      store = InMemoryKeyValueStore(max_entries)
+    _stores[namespace] = store
+  return store
@@ -0,0 +1,75 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Helpers for calling the LLM from async request handlers.
+
+The agents serve many sessions from a single event loop, so LLM calls go
+through the client's async API rather than blocking the loop. The number of
+calls in flight per process is bounded by MAX_CONCURRENT_LLM_CALLS, and each
+call must finish within a deadline, including any time spent waiting for a
+free slot.
+"""
+
+import asyncio
+import os
+from typing import Any
+
+from google import genai
+from google.genai import types
+
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+_MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+
+_llm_call_slots = asyncio.Semaphore(_MAX_CONCURRENT_LLM_CALLS)
+
+
+async def generate_content(
+    client: genai.Client,
+    contents: Any,
+    config: types.GenerateContentConfigOrDict | None = None,
+    model: str = DEFAULT_MODEL,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+) -> types.GenerateContentResponse:
+  """Generates content without blocking the event loop.
+
+  Args:
+    client: The LLM client.
+    contents: The contents to send to the model.
+    config: The generation config.
+    model: The name of the model.
+    timeout: The deadline for the call, in seconds.
+
+  Returns:
+    The model's response.
+
+  Raises:
+    TimeoutError: If the call does not complete within the deadline.
+  """
+
+  async def _generate() -> types.GenerateContentResponse:
+    async with _llm_call_slots:
+      return await client.aio.models.generate_content(
+          model=model, contents=contents, config=config
+      )
+
+  try:
+    return await asyncio.wait_for(_generate(), timeout=timeout)
+  except asyncio.TimeoutError as e:
+    raise TimeoutError(
+        f"The LLM did not respond within {timeout:g} seconds."
+    ) from e
@@ -12,15 +12,115 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Helper functions for working with A2A Message objects."""
+"""Helper functions for working with A2A Message objects.
 
-from typing import Any
+A request's data parts are parsed once into a DataPartIndex, which the agents'
+tools receive. The find and parse functions below accept either an index, which
+they read in constant time, or a plain list of data parts, which they scan.
+"""
+
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sequence
+import types
+from typing import Any, TypeVar, overload
 
 from pydantic import BaseModel
 
+ModelT = TypeVar('ModelT', bound=BaseModel)
+
+
+class DataPartIndex(Sequence[dict[str, Any]]):
+    """The data parts of a request, indexed by key.
+
+    The index is a read-only sequence of the data parts, so code written for a
+    list of data parts works unchanged. Lookups by key take constant time, and
+    the canonical objects parsed from the data parts are cached, so that each
+    is validated at most once per request.
+    """
+
+    def __init__(self, data_parts: Iterable[dict[str, Any]]):
+        """Initialization.
+
+        Args:
+          data_parts: The contents of the request's DataParts.
+        """
+        self._data_parts = tuple(data_parts)
+        values: dict[str, list[Any]] = {}
+        for data_part in self._data_parts:
+            for key, value in data_part.items():
+                values.setdefault(key, []).append(value)
+        self._values = types.MappingProxyType(
+            {key: tuple(key_values) for key, key_values in values.items()}
+        )
+        self._parsed: dict[tuple[str, type[BaseModel]], BaseModel] = {}
+
+    @classmethod
+    def of(cls, data_parts: Iterable[dict[str, Any]]) -> 'DataPartIndex':
+        """Returns the data parts as an index, indexing them if needed."""
+        if isinstance(data_parts, DataPartIndex):
+            return data_parts
+        return cls(data_parts)
+
+    def get(self, data_key: str, default: Any = None) -> Any:
+        """Returns the value for the first occurrence of the key, or default."""
+        key_values = self._values.get(data_key)
+        return key_values[0] if key_values else default
+
+    def get_all(self, data_key: str) -> tuple[Any, ...]:
+        """Returns all the values for the key, in the order of the parts."""
+        return self._values.get(data_key, ())
+
+    def keys(self) -> Iterable[str]:
+        """Returns the keys found in the data parts, in order of appearance."""
+        return self._values.keys()
+
+    def parse(
+        self, data_key: str, canonical_object_model: type[ModelT]
+    ) -> ModelT | None:
+        """Returns the first value for the key as a canonical object.
+
+        The object is validated on first use, and then shared by every caller
+        handling the request; it must not be modified.
+
+        Args:
+          data_key: The key of the canonical object.
+          canonical_object_model: The pydantic model of the canonical object.
+
+        Returns:
+          The canonical object, or None if the key is not found.
+        """
+        cache_key = (data_key, canonical_object_model)
+        canonical_object = self._parsed.get(cache_key)
+        if canonical_object is None:
+            value = self.get(data_key)
+            if value is None:
+                return None
+            canonical_object = canonical_object_model.model_validate(value)
+            self._parsed[cache_key] = canonical_object
+        return canonical_object
+
+    @overload
+    def __getitem__(self, index: int) -> dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[dict[str, Any]]: ...
+
+    def __getitem__(self, index):
+        return self._data_parts[index]
+
+    def __len__(self) -> int:
+        return len(self._data_parts)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return iter(self._data_parts)
+
+    def __repr__(self) -> str:
+        return f'DataPartIndex({list(self._data_parts)!r})'
+
 
 def find_data_part(
-    data_key: str, data_parts: list[dict[str, Any]]
+    data_key: str, data_parts: Sequence[dict[str, Any]]
 ) -> Any | None:
     """Returns the value for the first occurrence of the key in the data parts.
 
@@ -31,6 +131,8 @@ def find_data_part(
     Returns:
       The value for the first occurrence of the key in the data parts, or None.
     """
+    if isinstance(data_parts, DataPartIndex):
+        return data_parts.get(data_key)
     for data_part in data_parts:
         if data_key in data_part:
             return data_part[data_key]
@@ -39,7 +141,7 @@ def find_data_part(
 
 
 def find_data_parts(
-    data_key: str, data_parts: list[dict[str, Any]]
+    data_key: str, data_parts: Sequence[dict[str, Any]]
 ) -> list[Any]:
     """Returns a list of all values for the given key in the data parts.
 
@@ -50,6 +152,8 @@ def find_data_parts(
     Returns:
       A list of all values for the given key in the data parts.
     """
+    if isinstance(data_parts, DataPartIndex):
+        return list(data_parts.get_all(data_key))
     data_parts_with_key = []
     for data_part in data_parts:
         if data_key in data_part:
@@ -60,9 +164,9 @@ def find_data_parts(
 
 def parse_canonical_object(
     data_key: str,
-    data_parts: list[dict[str, Any]],
-    canonical_object_model: BaseModel,
-) -> Any:
+    data_parts: Sequence[dict[str, Any]],
+    canonical_object_model: type[ModelT],
+) -> ModelT:
     """Converts the data part value for the given key to a canonical object.
 
     Args:
@@ -71,9 +175,16 @@ def parse_canonical_object(
       canonical_object_model: The pydantic model of the canonical object.
 
     Returns:
-      The canonical object created from the data part value.
+      The canonical object created from the data part value. Objects parsed
+      from a DataPartIndex are shared for the request, and must not be
+      modified.
+
+    Raises:
+      ValueError: If the key is not found, or its value is not valid.
     """
-    canonical_object_data = find_data_part(data_key, data_parts)
-    if canonical_object_data is None:
-        raise ValueError(f'{type(canonical_object_model)} not found.')
-    return canonical_object_model.model_validate(canonical_object_data)
+    canonical_object = DataPartIndex.of(data_parts).parse(
+        data_key, canonical_object_model
+    )
+    if canonical_object is None:
+        raise ValueError(f'{canonical_object_model.__name__} not found.')
+    return canonical_object
@@ -16,12 +16,21 @@
 
 Adds structured logging around outbound A2A calls so we can diagnose hangs.
 Logs include remote name, base URL, operation, and elapsed time.
+
+Clients are meant to be long-lived: each one keeps its HTTP connections alive
+and resolves the remote AgentCard only once. Agents that call other agents
+while serving requests should use get_client(), which returns a process-wide
+client per (base URL, required extensions) pair, rather than constructing a
+new client for every request.
 """
 
 import asyncio
+import collections
 import httpx
 import logging
+import os
 import time
+from typing import Any
 import uuid
 
 from a2a import types as a2a_types
@@ -32,8 +41,19 @@ from a2a.client.client_factory import ClientFactory
 from a2a.client.client_task_manager import ClientTaskManager
 from a2a.extensions.common import HTTP_EXTENSION_HEADER
 
+from common.rate_limiter import TokenBucketRateLimiter
+from common.single_flight import SingleFlight
+
 DEFAULT_TIMEOUT = 600.0
 
+# Connection pool limits of each client. Remote agents are called repeatedly
+# over the life of the process, so idle connections are kept alive for reuse.
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=60.0,
+)
+
 
 class PaymentRemoteA2aClient():
   """Wrapper for the A2A client.
@@ -49,6 +69,8 @@ class PaymentRemoteA2aClient():
       base_url: str,
       required_extensions: set[str] | None = None,
       delay_between_calls: float = 1.0,
+      limits: httpx.Limits = DEFAULT_LIMITS,
+      rate_limiter: TokenBucketRateLimiter | None = None,
   ):
     """Initializes the PaymentRemoteA2aClient.
 
@@ -56,10 +78,24 @@ class PaymentRemoteA2aClient():
       name: The name of the agent.
       base_url: The base URL where the remote agent is hosted.
       required_extensions: A set of extension URIs that the client requires.
+      delay_between_calls: The average delay between calls, in seconds, once
+        the burst allowance of the rate limiter is used up.
+      limits: The connection pool limits of the underlying HTTP client.
+      rate_limiter: The rate limiter for calls to the remote agent. Overrides
+        delay_between_calls.
     """
 
+    self._client_required_extensions = required_extensions or set()
+    self._transport = httpx.AsyncHTTPTransport(limits=limits)
     self._httpx_client = httpx.AsyncClient(
-        timeout=httpx.Timeout(timeout=DEFAULT_TIMEOUT)
+        timeout=httpx.Timeout(timeout=DEFAULT_TIMEOUT),
+        transport=self._transport,
+        headers={
+            HTTP_EXTENSION_HEADER: ", ".join(
+                sorted(self._client_required_extensions)
+            )
+        },
+        event_hooks={"request": [self._on_request]},
     )
     self._a2a_client_factory = ClientFactory(
         ClientConfig(
@@ -69,59 +105,88 @@ class PaymentRemoteA2aClient():
     self._name = name
     self._base_url = base_url
     self._agent_card = None
-    self._client_required_extensions = required_extensions or set()
-    self._delay_between_calls = delay_between_calls
-    self._last_call_time = 0
-
-  async def _enforce_delay(self):
-    """Enforce delay between A2A calls to prevent rate limiting."""
-    current_time = time.time()
-    time_since_last_call = current_time - self._last_call_time
-    if time_since_last_call < self._delay_between_calls:
-      delay_needed = self._delay_between_calls - time_since_last_call
-      await asyncio.sleep(delay_needed)
-    self._last_call_time = time.time()
+    self._agent_card_resolution = SingleFlight()
+    self._a2a_client = None
+    self._rate_limiter = rate_limiter or TokenBucketRateLimiter.from_delay(
+        delay_between_calls
+    )
+    self._requests_sent = 0
+    self._connections_opened = 0
+    self._calls_in_flight = 0
+    self._retired = False
 
-  async def get_agent_card(self) -> a2a_types.AgentCard:
-    """Get agent card."""
-    if self._agent_card is None:
-      start_time = time.perf_counter()
+  async def _enforce_rate_limit(self, context_id: str | None) -> None:
+    """Waits until the rate limit allows another A2A call."""
+    if self._rate_limiter is None:
+      return
+    waited = await self._rate_limiter.acquire(context_id)
+    if waited > 0:
       logging.info(
-          "[A2A][%s] Resolving agent card from %s",
-          self._name,
-          f"{self._base_url}/.well-known/agent-card.json",
+          "[A2A][%s] Rate limited for %.0f ms", self._name, waited * 1000
       )
-      resolver = A2ACardResolver(
-          httpx_client=self._httpx_client,
-          base_url=self._base_url,
-      )
-      self._agent_card = await resolver.get_agent_card()
-      elapsed_ms = (time.perf_counter() - start_time) * 1000
-      logging.info(
-          "[A2A][%s] Agent card resolved in %.0f ms",
-          self._name,
-          elapsed_ms,
+
+  async def get_agent_card(self) -> a2a_types.AgentCard:
+    """Get agent card.
+
+    The card is resolved on the first call. Concurrent first calls, e.g. when
+    a cold process serves several requests at once, share one resolution.
+    """
+    if self._agent_card is None:
+      self._agent_card = await self._agent_card_resolution.do(
+          self._base_url, self._resolve_agent_card
       )
     return self._agent_card
 
+  async def _resolve_agent_card(self) -> a2a_types.AgentCard:
+    """Fetches the agent card from the remote agent."""
+    start_time = time.perf_counter()
+    logging.info(
+        "[A2A][%s] Resolving agent card from %s",
+        self._name,
+        f"{self._base_url}/.well-known/agent-card.json",
+    )
+    resolver = A2ACardResolver(
+        httpx_client=self._httpx_client,
+        base_url=self._base_url,
+    )
+    agent_card = await resolver.get_agent_card()
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    logging.info(
+        "[A2A][%s] Agent card resolved in %.0f ms",
+        self._name,
+        elapsed_ms,
+    )
+    return agent_card
+
   async def send_a2a_message(
       self, message: a2a_types.Message
   ) -> a2a_types.Task:
     """Retrieves the A2A client, sends the message, and returns the event."""
-    # Enforce delay before making A2A call
-    await self._enforce_delay()
-    my_a2a_client: Client = await self._get_a2a_client()
+    # The call is in flight from the start, so that the client is not closed
+    # if it is evicted from the pool while the call waits.
+    self._calls_in_flight += 1
+    try:
+      # Stay within the rate limit of the remote agent. Calls are queued
+      # fairly per context (i.e. shopping session).
+      await self._enforce_rate_limit(message.context_id)
+      my_a2a_client: Client = await self._get_a2a_client()
 
-    task_manager = ClientTaskManager()
+      task_manager = ClientTaskManager()
 
-    logging.info("[A2A][%s] Sending message to %s", self._name, self._base_url)
-    start_time = time.perf_counter()
-    async for event in my_a2a_client.send_message(message):
-      # Tasks are returned in tuples (aka ClientEvent). The first element is the
-      # Task, the second element is the UpdateEvent.
-      if isinstance(event, tuple):
-        event = event[0]
-      await task_manager.process(event)
+      logging.info(
+          "[A2A][%s] Sending message to %s", self._name, self._base_url
+      )
+      start_time = time.perf_counter()
+      async for event in my_a2a_client.send_message(message):
+        # Tasks are returned in tuples (aka ClientEvent). The first element is
+        # the Task, the second element is the UpdateEvent.
+        if isinstance(event, tuple):
+          event = event[0]
+        await task_manager.process(event)
+    finally:
+      self._calls_in_flight -= 1
+      if self._retired and not self._calls_in_flight:
+        await self.close()
 
     task = task_manager.get_task()
     if task is None:
@@ -136,13 +201,55 @@ class PaymentRemoteA2aClient():
     )
     return task
 
+  async def close(self) -> None:
+    """Closes the client's HTTP connections."""
+    await self._httpx_client.aclose()
+
+  async def close_when_idle(self) -> None:
+    """Closes the client's HTTP connections once its calls in flight end."""
+    self._retired = True
+    if not self._calls_in_flight:
+      await self.close()
+
+  def metrics(self) -> dict[str, Any]:
+    """Returns connection pool metrics for the client.
+
+    The reuse ratio is the fraction of requests that were sent over an
+    existing connection rather than a newly opened one.
+    """
+    pool = getattr(self._transport, "_pool", None)
+    reused = max(self._requests_sent - self._connections_opened, 0)
+    return {
+        "base_url": self._base_url,
+        "open_connections": len(pool.connections) if pool else None,
+        "requests_sent": self._requests_sent,
+        "connections_opened": self._connections_opened,
+        "reuse_ratio": (
+            reused / self._requests_sent if self._requests_sent else 0.0
+        ),
+        "rate_limiter": (
+            self._rate_limiter.stats() if self._rate_limiter else None
+        ),
+    }
+
   async def _get_a2a_client(self) -> Client:
     """Get A2A client."""
-    agent_card = await self.get_agent_card()
-    self._httpx_client.headers[HTTP_EXTENSION_HEADER] = ", ".join(
-        self._client_required_extensions
-    )
-    return self._a2a_client_factory.create(agent_card)
+    if self._a2a_client is None:
+      agent_card = await self.get_agent_card()
+      # Another caller may have created the client while the card resolved.
+      if self._a2a_client is None:
+        self._a2a_client = self._a2a_client_factory.create(agent_card)
+    return self._a2a_client
+
+  async def _on_request(self, request: httpx.Request) -> None:
+    """Counts outgoing requests and traces new connections."""
+    self._requests_sent += 1
+    request.extensions["trace"] = self._trace
+
+  async def _trace(self, event_name: str, info: dict[str, Any]) -> None:
+    """Counts the TCP connections opened by the connection pool."""
+    if event_name == "connection.connect_tcp.complete":
+      self._connections_opened += 1
 
   def _create_agent_message(
       self,
@@ -154,3 +261,83 @@ class PaymentRemoteA2aClient():
         parts=[a2a_types.Part(root=a2a_types.TextPart(text=str(message)))],
         role=a2a_types.Role.agent,
     )
+
+
+# The maximum number of shared clients. Base URLs may come from remote input,
+# e.g. a PaymentMandate's token URL, so the least recently used client is
+# closed when a new one would exceed the limit.
+_MAX_CLIENTS = int(os.getenv("A2A_CLIENT_POOL_MAX_CLIENTS", "64"))
+
+_clients: collections.OrderedDict[
+    tuple[str, frozenset[str]], PaymentRemoteA2aClient
+] = collections.OrderedDict()
+
+# The closing of evicted clients, kept referenced until they are done.
+_closing: set[asyncio.Task] = set()
+
+
+def get_client(
+    name: str,
+    base_url: str,
+    required_extensions: set[str] | None = None,
+    rate_limiter: TokenBucketRateLimiter | None = None,
+) -> PaymentRemoteA2aClient:
+  """Returns the process-wide client for a remote agent.
+
+  The client is created on first use and then shared by all callers that
+  request the same base URL and required extensions. At most
+  A2A_CLIENT_POOL_MAX_CLIENTS clients are kept; the least recently used one is
+  evicted, and closed once its calls in flight end.
+
+  Args:
+    name: The name of the agent, used when the client is created.
+    base_url: The base URL where the remote agent is hosted.
+    required_extensions: A set of extension URIs that the client requires.
+    rate_limiter: The rate limiter for the remote agent, used when the client
+      is created. Defaults to the client's default limit.
+
+  Returns:
+    The shared PaymentRemoteA2aClient.
+  """
+  key = (base_url.rstrip("/"), frozenset(required_extensions or ()))
+  client = _clients.get(key)
+  if client is not None:
+    _clients.move_to_end(key)
+    return client
+  client = PaymentRemoteA2aClient(
+      name=name,
+      base_url=base_url,
+      required_extensions=required_extensions,
+      rate_limiter=rate_limiter,
+  )
+  _clients[key] = client
+  while len(_clients) > _MAX_CLIENTS:
+    _, evicted = _clients.popitem(last=False)
+    _close_in_background(evicted)
+  return client
+
+
+def _close_in_background(client: PaymentRemoteA2aClient) -> None:
+  """Closes an evicted client without waiting for it."""
+  try:
+    loop = asyncio.get_running_loop()
+  except RuntimeError:
+    # Without an event loop, the client cannot have sent anything yet.
+    return
+  task = loop.create_task(client.close_when_idle())
+  _closing.add(task)
+  task.add_done_callback(_closing.discard)
+
+
+async def close_all_clients() -> None:
+  """Closes all the clients created by get_client()."""
+  clients = list(_clients.values())
+  _clients.clear()
+  await asyncio.gather(
+      *(client.close() for client in clients), return_exceptions=True
+  )
+
+
+def pool_metrics() -> list[dict[str, Any]]:
+  """Returns the connection pool metrics of all the shared clients."""
+  return [client.metrics() for client in _clients.values()]
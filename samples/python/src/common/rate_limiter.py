@@ -0,0 +1,158 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An async token bucket rate limiter.
+
+Calls to remote agents and to the LLM are rate limited to avoid overloading
+them. A token bucket lets callers that are within their budget proceed
+immediately, absorbs short bursts up to the bucket's capacity, and only makes
+callers wait once the sustained rate is exceeded.
+
+Waiting callers can be queued per session. The queues are served round robin,
+so a session issuing many calls cannot starve the other sessions sharing the
+same limiter.
+"""
+
+import asyncio
+import collections
+from collections.abc import Hashable
+import time
+from typing import Any, Self
+
+
+DEFAULT_BURST = 5
+
+
+class TokenBucketRateLimiter:
+  """Limits the rate of calls, allowing bursts up to a fixed capacity."""
+
+  def __init__(
+      self, rate: float, burst: int = DEFAULT_BURST, fair: bool = True
+  ):
+    """Initialization.
+
+    Args:
+      rate: The sustained number of calls allowed per second.
+      burst: The number of calls that may be made at once when the bucket is
+        full.
+      fair: Whether waiting callers are served round robin per session,
+        rather than in arrival order.
+
+    Raises:
+      ValueError: If the rate or burst is not positive.
+    """
+    if rate <= 0 or burst <= 0:
+      raise ValueError("rate and burst must be positive.")
+    self._rate = rate
+    self._capacity = float(burst)
+    self._fair = fair
+    self._tokens = self._capacity
+    self._updated_at = time.monotonic()
+    self._queues: collections.OrderedDict[
+        Hashable, collections.deque[asyncio.Future[None]]
+    ] = collections.OrderedDict()
+    self._dispatcher: asyncio.Task[None] | None = None
+    self._calls = 0
+    self._delayed_calls = 0
+    self._total_wait = 0.0
+    self._max_wait = 0.0
+
+  @classmethod
+  def from_delay(
+      cls, delay_between_calls: float, burst: int = DEFAULT_BURST
+  ) -> Self | None:
+    """Creates a limiter allowing one call per delay, or None if no delay."""
+    if delay_between_calls <= 0:
+      return None
+    return cls(rate=1.0 / delay_between_calls, burst=burst)
+
+  async def acquire(self, session_id: Hashable | None = None) -> float:
+    """Waits until a call is allowed.
+
+    Args:
+      session_id: Identifies the session making the call, for fair queuing.
+
+    Returns:
+      The time spent waiting, in seconds.
+    """
+    self._refill()
+    if not self._queues and self._tokens >= 1:
+      self._tokens -= 1
+      self._record_wait(0.0)
+      return 0.0
+
+    start_time = time.monotonic()
+    waiter = asyncio.get_running_loop().create_future()
+    queue_key = session_id if self._fair else None
+    self._queues.setdefault(queue_key, collections.deque()).append(waiter)
+    if self._dispatcher is None or self._dispatcher.done():
+      self._dispatcher = asyncio.create_task(self._dispatch())
+
+    try:
+      await waiter
+    except asyncio.CancelledError:
+      if waiter.done() and not waiter.cancelled():
+        # The token was granted as the caller was cancelled; give it back.
+        self._tokens = min(self._tokens + 1, self._capacity)
+      raise
+
+    waited = time.monotonic() - start_time
+    self._record_wait(waited)
+    return waited
+
+  def stats(self) -> dict[str, Any]:
+    """Returns how many calls were made and how long they waited."""
+    return {
+        "calls": self._calls,
+        "delayed_calls": self._delayed_calls,
+        "waiting": sum(len(queue) for queue in self._queues.values()),
+        "total_wait_seconds": self._total_wait,
+        "max_wait_seconds": self._max_wait,
+    }
+
+  async def _dispatch(self) -> None:
+    """Grants tokens to waiting callers as they become available."""
+    while self._queues:
+      self._refill()
+      if self._tokens < 1:
+        await asyncio.sleep((1 - self._tokens) / self._rate)
+        continue
+
+      queue_key, queue = next(iter(self._queues.items()))
+      waiter = queue.popleft()
+      if queue:
+        # Serve the other sessions before this one's next call.
+        self._queues.move_to_end(queue_key)
+      else:
+        del self._queues[queue_key]
+
+      if not waiter.done():
+        self._tokens -= 1
+        waiter.set_result(None)
+
+  def _refill(self) -> None:
+    """Adds the tokens accrued since the last refill."""
+    now = time.monotonic()
+    self._tokens = min(
+        self._capacity, self._tokens + (now - self._updated_at) * self._rate
+    )
+    self._updated_at = now
+
+  def _record_wait(self, waited: float) -> None:
+    """Records the time a call spent waiting."""
+    self._calls += 1
+    if waited > 0:
+      self._delayed_calls += 1
+      self._total_wait += waited
+      self._max_wait = max(self._max_wait, waited)
@@ -0,0 +1,344 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stores of the IDs already seen, to reject replayed mandates and tokens.
+
+An ID, e.g. a JWT's jti or a PaymentMandate's payment_mandate_id, is recorded
+until the token or mandate carrying it expires; a replay is rejected because
+its ID is still recorded, and a replay after the expiry is rejected as
+expired. Memory is thus bounded by the rate of new IDs times their lifetime.
+
+IDs are grouped into time partitions by expiry, and a partition is dropped as
+a whole once all its IDs have expired. In-memory stores can put a Bloom filter
+of each partition in front of its IDs: an ID the filters have not seen is new
+without a lookup, and only the IDs they may have seen are looked up, so a
+false positive of a filter never rejects a new ID.
+"""
+
+import abc
+import collections
+from collections.abc import Iterator
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+# The width of a time partition, in seconds.
+DEFAULT_PARTITION_SECONDS = 60.0
+
+# When set, in-memory stores put a Bloom filter sized for this many IDs in
+# front of each time partition.
+_BLOOM_FILTER_CAPACITY = int(os.getenv("REPLAY_STORE_BLOOM_CAPACITY", "0"))
+
+# The fraction of new IDs a Bloom filter may have seen, when not over capacity.
+_BLOOM_FILTER_ERROR_RATE = float(
+    os.getenv("REPLAY_STORE_BLOOM_ERROR_RATE", "1e-6")
+)
+
+# How many IDs a SQLite store records between purges of expired IDs.
+_SQLITE_PURGE_INTERVAL = 256
+
+
+class ReplayStore(abc.ABC):
+  """A namespace of IDs, each recorded until it expires."""
+
+  @abc.abstractmethod
+  def add(self, id_: str, expires_at: float) -> bool:
+    """Records an ID, unless it is already recorded.
+
+    Args:
+      id_: The ID.
+      expires_at: When the token or mandate carrying the ID expires, in
+        seconds since the epoch.
+
+    Returns:
+      True if the ID is new, False if it is a replay.
+    """
+
+  @abc.abstractmethod
+  def stats(self) -> dict[str, int]:
+    """Returns the counts of new, replayed and expired IDs."""
+
+
+class InMemoryReplayStore(ReplayStore):
+  """A ReplayStore held in the memory of the current process."""
+
+  def __init__(
+      self,
+      partition_seconds: float = DEFAULT_PARTITION_SECONDS,
+      bloom_filter_capacity: int = 0,
+      bloom_filter_error_rate: float = _BLOOM_FILTER_ERROR_RATE,
+  ):
+    """Initialization.
+
+    Args:
+      partition_seconds: The width of a time partition.
+      bloom_filter_capacity: If positive, each partition has a Bloom filter
+        sized for this many IDs in front of it.
+      bloom_filter_error_rate: The fraction of new IDs a Bloom filter may have
+        seen, and which are then looked up, when it holds at most
+        bloom_filter_capacity IDs.
+
+    Raises:
+      ValueError: If partition_seconds is not positive.
+    """
+    if partition_seconds <= 0:
+      raise ValueError("partition_seconds must be positive.")
+    self._partition_seconds = partition_seconds
+    self._bloom_filter_capacity = bloom_filter_capacity
+    self._bloom_filter_error_rate = bloom_filter_error_rate
+    # The expiry of each ID.
+    self._expiries: dict[str, float] = {}
+    # The IDs of each partition, by partition number.
+    self._partitions: dict[int, list[str]] = {}
+    # The Bloom filter of each partition, if enabled, by partition number.
+    self._bloom_filters: dict[int, _BloomFilter] = {}
+    self._current_partition = self._partition(time.time())
+    self._lock = threading.Lock()
+    self._stats = collections.Counter()
+
+  def add(self, id_: str, expires_at: float) -> bool:
+    with self._lock:
+      now = time.time()
+      self._expire(now)
+      partition = self._partition(max(expires_at, now))
+      is_new = self._add(id_, expires_at, partition, now)
+      self._stats["new" if is_new else "replayed"] += 1
+      return is_new
+
+  def stats(self) -> dict[str, int]:
+    with self._lock:
+      return {
+          "size": len(self._expiries),
+          "partitions": len(self._partitions),
+          "new": self._stats["new"],
+          "replayed": self._stats["replayed"],
+          "expirations": self._stats["expirations"],
+          "bloom_filter_false_positives": self._stats["false_positives"],
+      }
+
+  def _add(
+      self, id_: str, expires_at: float, partition: int, now: float
+  ) -> bool:
+    hashes = None
+    maybe_seen = True
+    if self._bloom_filter_capacity > 0:
+      hashes = _BloomFilter.hashes_of(id_)
+      # An ID no filter has seen is new, without a lookup.
+      maybe_seen = any(
+          bloom_filter.contains(hashes)
+          for bloom_filter in self._bloom_filters.values()
+      )
+    if maybe_seen:
+      previous_expiry = self._expiries.get(id_)
+      if previous_expiry is not None and previous_expiry > now:
+        return False
+      if hashes is not None:
+        self._stats["false_positives"] += 1
+    if hashes is not None:
+      self._bloom_filter(partition).add(hashes)
+    self._expiries[id_] = expires_at
+    self._partitions.setdefault(partition, []).append(id_)
+    return True
+
+  def _bloom_filter(self, partition: int) -> "_BloomFilter":
+    """Returns the Bloom filter of a partition, creating it if needed."""
+    bloom_filter = self._bloom_filters.get(partition)
+    if bloom_filter is None:
+      bloom_filter = _BloomFilter(
+          self._bloom_filter_capacity, self._bloom_filter_error_rate
+      )
+      self._bloom_filters[partition] = bloom_filter
+    return bloom_filter
+
+  def _expire(self, now: float) -> None:
+    """Drops the partitions whose IDs have all expired."""
+    current_partition = self._partition(now)
+    if current_partition == self._current_partition:
+      return
+    self._current_partition = current_partition
+    for partition in [p for p in self._bloom_filters if p < current_partition]:
+      del self._bloom_filters[partition]
+    for partition in [p for p in self._partitions if p < current_partition]:
+      ids = self._partitions.pop(partition)
+      partition_end = (partition + 1) * self._partition_seconds
+      for id_ in ids:
+        # Skip IDs that were recorded again, with a later expiry.
+        if self._expiries.get(id_, math.inf) < partition_end:
+          del self._expiries[id_]
+          self._stats["expirations"] += 1
+
+  def _partition(self, timestamp: float) -> int:
+    return int(timestamp // self._partition_seconds)
+
+
+class _BloomFilter:
+  """A Bloom filter of strings, with a fixed size."""
+
+  def __init__(self, capacity: int, error_rate: float):
+    # The optimal number of bits and hash functions for the capacity.
+    self._size = max(
+        8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    )
+    self._hash_count = max(1, round(self._size / capacity * math.log(2)))
+    self._bits = bytearray((self._size + 7) // 8)
+
+  @classmethod
+  def hashes_of(cls, value: str) -> tuple[int, int]:
+    """Returns the two base hashes of a value."""
+    value_hash = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+    return (
+        int.from_bytes(value_hash[:8], "little"),
+        int.from_bytes(value_hash[8:], "little") | 1,
+    )
+
+  def contains(self, hashes: tuple[int, int]) -> bool:
+    bits = self._bits
+    return all(
+        bits[bit >> 3] & (1 << (bit & 7)) for bit in self._bits_of(hashes)
+    )
+
+  def add(self, hashes: tuple[int, int]) -> None:
+    for bit in self._bits_of(hashes):
+      self._bits[bit >> 3] |= 1 << (bit & 7)
+
+  def _bits_of(self, hashes: tuple[int, int]) -> Iterator[int]:
+    # Double hashing: the i-th hash function is h1 + i * h2.
+    h1, h2 = hashes
+    return ((h1 + i * h2) % self._size for i in range(self._hash_count))
+
+
+class SqliteReplayStore(ReplayStore):
+  """A ReplayStore in a SQLite database shared by several processes.
+
+  Expired IDs are purged through an index on their expiry, so a purge only
+  reads the rows it deletes.
+  """
+
+  def __init__(self, path: str, namespace: str):
+    """Initialization.
+
+    Args:
+      path: The path of the database file.
+      namespace: Separates these IDs from those of other stores.
+    """
+    self._path = path
+    self._namespace = namespace
+    self._lock = threading.Lock()
+    self._db = None
+    self._db_pid = None
+    self._stats = collections.Counter()
+
+  def add(self, id_: str, expires_at: float) -> bool:
+    with self._lock:
+      db = self._connection()
+      now = time.time()
+      # A single statement, so that of several processes recording the same
+      # ID at once, only one sees it as new. An expired ID is recorded anew.
+      cursor = db.execute(
+          "INSERT INTO seen_ids VALUES (?, ?, ?)"
+          " ON CONFLICT (namespace, id) DO UPDATE"
+          " SET expires_at = excluded.expires_at"
+          " WHERE seen_ids.expires_at <= ?",
+          (self._namespace, id_, expires_at, now),
+      )
+      is_new = cursor.rowcount == 1
+      self._stats["new" if is_new else "replayed"] += 1
+      if is_new and self._stats["new"] % _SQLITE_PURGE_INTERVAL == 0:
+        cursor = db.execute(
+            "DELETE FROM seen_ids WHERE expires_at <= ?", (now,)
+        )
+        self._stats["expirations"] += cursor.rowcount
+      return is_new
+
+  def stats(self) -> dict[str, int]:
+    with self._lock:
+      return {
+          "new": self._stats["new"],
+          "replayed": self._stats["replayed"],
+          "expirations": self._stats["expirations"],
+      }
+
+  def _connection(self) -> sqlite3.Connection:
+    """Returns the connection of the current process, opening it if needed.
+
+    A SQLite connection must not be used across a fork, so a worker process
+    opens its own rather than using one inherited from its parent.
+    """
+    if self._db is None or self._db_pid != os.getpid():
+      directory = os.path.dirname(self._path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      self._db = sqlite3.connect(
+          self._path,
+          timeout=30.0,
+          isolation_level=None,
+          check_same_thread=False,
+      )
+      self._db.execute("PRAGMA journal_mode=WAL")
+      self._db.execute(
+          "CREATE TABLE IF NOT EXISTS seen_ids ("
+          " namespace TEXT NOT NULL, id TEXT NOT NULL,"
+          " expires_at REAL NOT NULL, PRIMARY KEY (namespace, id))"
+          " WITHOUT ROWID"
+      )
+      self._db.execute(
+          "CREATE INDEX IF NOT EXISTS seen_ids_by_expiry"
+          " ON seen_ids (expires_at)"
+      )
+      self._db_pid = os.getpid()
+    return self._db
+
+
+_sqlite_path: str | None = None
+
+_stores: dict[str, ReplayStore] = {}
+
+
+def configure(sqlite_path: str | None) -> None:
+  """Selects where the stores returned by get_store() record IDs.
+
+  Must be called before the stores are first used.
+
+  Args:
+    sqlite_path: The SQLite database shared by the server processes, or None
+      to record the IDs in process memory.
+  """
+  global _sqlite_path
+  _sqlite_path = sqlite_path
+  _stores.clear()
+
+
+def get_store(namespace: str) -> ReplayStore:
+  """Returns the process-wide store for a namespace.
+
+  In-memory stores use Bloom filters when REPLAY_STORE_BLOOM_CAPACITY is set.
+
+  Args:
+    namespace: The namespace of the store, e.g. the kind of ID it records.
+
+  Returns:
+    The store.
+  """
+  store = _stores.get(namespace)
+  if store is None:
+    if _sqlite_path:
+      store = SqliteReplayStore(_sqlite_path, namespace)
+    else:
+      store = InMemoryReplayStore(bloom_filter_capacity=_BLOOM_FILTER_CAPACITY)
+    _stores[namespace] = store
+  return store
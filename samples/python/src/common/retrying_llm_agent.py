@@ -18,22 +18,33 @@ This implementation enhances the ADK's LlmAgent by automatically retrying
 requests and surfacing errors captured from the LLM.
 """
 
-import asyncio
-import time
+from typing import Any
+
 from google.adk.agents.invocation_context import InvocationContext
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.events.event import Event
 from typing_extensions import AsyncGenerator, override
 
+from common.rate_limiter import DEFAULT_BURST
+from common.rate_limiter import TokenBucketRateLimiter
+
 
 class RetryingLlmAgent(LlmAgent):
   """An LLM agent that surfaces errors to the user and then retries."""
 
-  def __init__(self, *args, max_retries: int = 1, delay_between_calls: float = 1.0, **kwargs):
+  def __init__(
+      self,
+      *args,
+      max_retries: int = 1,
+      delay_between_calls: float = 1.0,
+      burst: int = DEFAULT_BURST,
+      **kwargs,
+  ):
     super().__init__(*args, **kwargs)
     self._max_retries = max_retries
-    self._delay_between_calls = delay_between_calls
-    self._last_call_time = 0
+    self._rate_limiter = TokenBucketRateLimiter.from_delay(
+        delay_between_calls, burst
+    )
 
   async def _retry_async(
       self, ctx: InvocationContext, retries_left: int = 0
@@ -61,20 +72,17 @@ class RetryingLlmAgent(LlmAgent):
         async for event in self._retry_async(ctx, retries_left - 1):
           yield event
 
-  async def _enforce_delay(self):
-    """Enforce delay between API calls to prevent rate limiting."""
-    current_time = time.time()
-    time_since_last_call = current_time - self._last_call_time
-    if time_since_last_call < self._delay_between_calls:
-      delay_needed = self._delay_between_calls - time_since_last_call
-      await asyncio.sleep(delay_needed)
-    self._last_call_time = time.time()
+  def rate_limit_stats(self) -> dict[str, Any] | None:
+    """Returns how long calls to the model waited for the rate limit."""
+    return self._rate_limiter.stats() if self._rate_limiter else None
 
   @override
   async def _run_async_impl(
       self, ctx: InvocationContext
   ) -> AsyncGenerator[Event, None]:
-    # Enforce delay before making API call
-    await self._enforce_delay()
+    # Stay within the API rate limit. Sessions are served fairly when calls
+    # have to wait.
+    if self._rate_limiter is not None:
+      await self._rate_limiter.acquire(ctx.session.id)
     async for event in self._retry_async(ctx, retries_left=self._max_retries):
       yield event
@@ -19,28 +19,98 @@ this server operates without the Google ADK. Instead, it directly uses an
 AgentCard and AgentExecutor to launch a Uvicorn server.
 """
 
+import asyncio
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Sequence
+import contextlib
 import json
 import logging
+import multiprocessing
 import os
+import random
+import signal
+import socket
 
 from a2a.server.agent_execution.simple_request_context_builder import SimpleRequestContextBuilder
 from a2a.server.apps.jsonrpc.starlette_app import A2AStarletteApplication
 from a2a.server.request_handlers.default_request_handler import DefaultRequestHandler
 from a2a.server.tasks.inmemory_task_store import InMemoryTaskStore
+from a2a.server.tasks.task_store import TaskStore
 from a2a.types import AgentCard
 from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
-from starlette.middleware.base import BaseHTTPMiddleware
+from absl import flags
+from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
 import uvicorn
 
+from . import kv_store
+from . import replay_store
+from . import payment_remote_a2a_client
+from . import task_store as task_stores
 from . import watch_log
 from .base_server_executor import BaseServerExecutor
 
 # Constant for the A2A extensions header
 A2A_EXTENSIONS_HEADER = "X-A2A-Extensions"
 
+_HOST = flags.DEFINE_string(
+    "host", "127.0.0.1", "The interface the agent server binds to."
+)
+_PORT = flags.DEFINE_integer(
+    "port", None, "The port the agent server binds to, instead of its default."
+)
+_WORKERS = flags.DEFINE_integer(
+    "workers",
+    1,
+    "The number of server processes. With more than one, tasks and agent state"
+    " are shared through SQLite, at --task_store_path and --state_store_path.",
+    lower_bound=1,
+)
+_STATE_STORE_PATH = flags.DEFINE_string(
+    "state_store_path",
+    ".state/state.db",
+    "The SQLite database in which server processes share agent state.",
+)
+_TASK_STORE = flags.DEFINE_enum(
+    "task_store",
+    "memory",
+    task_stores.TASK_STORE_KINDS,
+    "Where A2A tasks are stored: in process memory, or in a SQLite database.",
+)
+_TASK_STORE_PATH = flags.DEFINE_string(
+    "task_store_path",
+    ".state/tasks.db",
+    "The SQLite database file used by --task_store=sqlite.",
+)
+_TASK_RETENTION_SECONDS = flags.DEFINE_float(
+    "task_retention_seconds",
+    task_stores.DEFAULT_RETENTION_SECONDS,
+    "How long finished tasks are kept by --task_store=sqlite.",
+)
+_TASK_CACHE_MAX_ENTRIES = flags.DEFINE_integer(
+    "task_cache_max_entries",
+    task_stores.DEFAULT_CACHE_MAX_ENTRIES,
+    "The number of tasks cached in memory in front of --task_store=sqlite.",
+)
+
+# The path of the readiness endpoint.
+READY_PATH = "/ready"
+
+# The fraction of requests whose details are logged to watch.log.
+_LOG_SAMPLE_RATE = float(os.getenv("WATCH_LOG_SAMPLE_RATE", "1.0"))
+
+# The maximum number of bytes logged of each request and response body.
+_MAX_LOGGED_BODY_BYTES = int(os.getenv("WATCH_LOG_MAX_BODY_BYTES", "16384"))
+
 
 def load_local_agent_card(file_path: str) -> AgentCard:
   """Loads the AgentCard from the specified file path.
@@ -63,73 +133,176 @@ def run_agent_blocking(
     *,
     executor: BaseServerExecutor,
     rpc_url: str,
+    task_store: TaskStore | None = None,
+    startup_hooks: Sequence[Callable[[], Awaitable[None]]] = (),
 ) -> None:
   """Launches a Uvicorn server for an agent and block the current thread.
 
+  The --host, --port and --workers flags override where the server listens and
+  how many processes serve it.
+
   Args:
-      port: TCP port to bind to.
+      port: TCP port to bind to, unless overridden by --port.
       agent_card: The AgentCard object describing the agent.
       executor: The AgentExecutor that processes A2A requests.
       rpc_url: The base URL path at which to mount the JSON-RPC handler.
+      task_store: Where A2A tasks are stored. Defaults to the store selected
+        by the --task_store flags. Must be safe to share across processes
+        when there are several workers.
+      startup_hooks: Coroutine functions run in each server process before it
+        accepts requests, e.g. to warm up clients and caches.
   """
+  host = _HOST.value
+  port = _PORT.value or port
+  workers = _WORKERS.value
+
+  task_store_kind = _TASK_STORE.value
+  task_cache_max_entries = _TASK_CACHE_MAX_ENTRIES.value
+  if workers > 1:
+    # A request may be served by any process, so the processes share tasks
+    # and agent state through SQLite. Tasks are not cached in memory, since a
+    # cached task may have been updated by another process.
+    task_store_kind = "sqlite"
+    task_cache_max_entries = 0
+    kv_store.configure(_STATE_STORE_PATH.value)
+    replay_store.configure(_STATE_STORE_PATH.value)
+
+  def serve(sockets: list[socket.socket] | None = None) -> None:
+    # Everything holding threads, connections or an event loop is created
+    # here, in the process that serves the requests.
+    logger = logging.getLogger(__name__)
+    logger.addHandler(watch_log.create_queue_handler())
+
+    store = task_store
+    if store is None:
+      store = task_stores.create_task_store(
+          task_store_kind,
+          path=_TASK_STORE_PATH.value,
+          retention_seconds=_TASK_RETENTION_SECONDS.value,
+          cache_max_entries=task_cache_max_entries,
+      )
 
-  # Add a file handler to the logger for watch.log.
-  logger = logging.getLogger(__name__)
-  logger.addHandler(watch_log.create_file_handler())
-
-  # Build the Starlette app and add middlewares.
-  app = _build_starlette_app(agent_card, executor=executor, rpc_url=rpc_url)
-  _add_middlewares(app, logger)
-
-  # Start the server.
-  logger.info("%s listening on http://localhost:%d", agent_card.name, port)
-  uvicorn.run(
-      app, host="127.0.0.1", port=port, log_level="info", timeout_keep_alive=120
-  )
-
-
-def _create_watch_log_handler() -> logging.FileHandler:
-  """Create a file handler for watch.log logger.
-
-  watch.log is a log file meant to be watched in parallel with running a
-  scenario.  It will contain all the requests and responses to/from the agent
-  that are sent to/from the client, so engineers can see what is happening
-  between the servers in real time.
+    # Build the Starlette app and add middlewares.
+    app = _build_starlette_app(
+        agent_card,
+        executor=executor,
+        rpc_url=rpc_url,
+        task_store=store,
+        startup_hooks=startup_hooks,
+    )
+    _add_middlewares(app, logger)
+
+    # Start the server.
+    logger.info("%s listening on http://%s:%d", agent_card.name, host, port)
+    config = uvicorn.Config(
+        app, host=host, port=port, log_level="info", timeout_keep_alive=120
+    )
+    uvicorn.Server(config).run(sockets=sockets)
+
+  if workers == 1:
+    serve()
+    return
+
+  # Bind the socket once; the worker processes share it and the kernel
+  # distributes the connections between them.
+  sock = uvicorn.Config(app=None, host=host, port=port).bind_socket()
+  try:
+    _run_workers(serve, [sock], workers)
+  finally:
+    sock.close()
+
+
+def _run_workers(
+    serve: Callable[[list[socket.socket]], None],
+    sockets: list[socket.socket],
+    workers: int,
+) -> None:
+  """Serves the sockets from forked worker processes until they all exit.
 
-  Returns:
-      A logging.FileHandler instance configured for 'watch.log'.
+  Args:
+      serve: Runs a server on the given sockets, in a worker process.
+      sockets: The listening sockets.
+      workers: The number of worker processes.
+  """
+  context = multiprocessing.get_context("fork")
+  processes = [
+      context.Process(target=serve, args=(sockets,), name=f"worker-{i}")
+      for i in range(workers)
+  ]
+  for process in processes:
+    process.start()
+
+  def stop(signum, frame) -> None:
+    # Each worker shuts down gracefully on SIGTERM.
+    for process in processes:
+      if process.is_alive():
+        process.terminate()
+
+  signal.signal(signal.SIGINT, stop)
+  signal.signal(signal.SIGTERM, stop)
+  for process in processes:
+    process.join()
+
+
+class _BodySample:
+  """Keeps the first bytes of a body that is streamed through."""
+
+  def __init__(self, max_bytes: int):
+    self._max_bytes = max_bytes
+    self._sample = bytearray()
+    self._size = 0
+
+  def add(self, chunk: bytes) -> None:
+    """Records a chunk, copying it only up to the sample size."""
+    room = self._max_bytes - len(self._sample)
+    if room > 0:
+      self._sample += chunk[:room]
+    self._size += len(chunk)
+
+  def __str__(self) -> str:
+    if not self._size:
+      return "<empty>"
+    # All bodies are UTF-8 encoded JSON, but the sample may end mid-character.
+    text = watch_log.redact(self._sample.decode("utf-8", errors="replace"))
+    if self._size > len(self._sample):
+      text += f"... [{self._size - len(self._sample)} more bytes]"
+    return text
+
+
+class _LoggingMiddleware:
+  """Logs incoming request and response details.
+
+  This is a pure ASGI middleware: request and response bodies are passed
+  through chunk by chunk, so streamed responses, such as SSE task updates, are
+  never buffered. Only the first max_body_bytes of each body are copied for
+  logging, a sample_rate below 1 logs only a fraction of the requests, and
+  payment credentials are redacted before anything is written.
   """
-  file_handler = logging.FileHandler(".logs/watch.log")
-  file_handler.setLevel(logging.INFO)
-  file_handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
-  return file_handler
-
-
-class _LoggingMiddleware(BaseHTTPMiddleware):
-  """Intercepts and logs incoming request and response details."""
 
-  def __init__(self, *args, logger: logging.Logger, **kwargs):
+  def __init__(
+      self,
+      app: ASGIApp,
+      logger: logging.Logger,
+      sample_rate: float = _LOG_SAMPLE_RATE,
+      max_body_bytes: int = _MAX_LOGGED_BODY_BYTES,
+  ):
+    self._app = app
     self._logger = logger
-    super().__init__(*args, **kwargs)
+    self._sample_rate = sample_rate
+    self._max_body_bytes = max_body_bytes
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] != "http" or random.random() >= self._sample_rate:
+      await self._app(scope, receive, send)
+      return
 
-  async def dispatch(self, request: Request, call_next) -> Response:
     self._logger.info("\n\n\n")
     self._logger.info("---------- New Agent Request Received---------")
 
     # Log the request method and URL.
+    request = Request(scope)
     self._logger.info("%s %s", request.method, request.url)
 
-    # Log the request body if it's present.
-    content_length = request.headers.get("content-length")
-    if content_length and int(content_length) > 0:
-      request_body = await request.json()
-    else:
-      request_body = "<empty>"
-
-    self._logger.info("\n")
-    self._logger.info("[Request Body]")
-    self._logger.info("%s", request_body)
-
     # If the extension header is present, log a notice.
     extension_header = request.headers.get(A2A_EXTENSIONS_HEADER)
     if extension_header:
@@ -137,42 +310,71 @@ class _LoggingMiddleware(BaseHTTPMiddleware):
           "\n[Extension Header]\n%s: %s", A2A_EXTENSIONS_HEADER, extension_header
       )
 
-    response = await call_next(request)
+    request_body = _BodySample(self._max_body_bytes)
+    response_body = _BodySample(self._max_body_bytes)
 
-    # Ensure the response has a body to read.
-    if response.body_iterator:
-      body = b""
+    async def receive_and_sample() -> Message:
+      message = await receive()
+      if message["type"] == "http.request":
+        request_body.add(message.get("body", b""))
+        if not message.get("more_body", False):
+          self._log_body("[Request Body]", request_body)
+      return message
 
-      # Read the entire response body.
-      # All responses are UTF-8 encoded JSON, so this should always succeed.
-      async for chunk in response.body_iterator:
-        body += chunk
+    async def sample_and_send(message: Message) -> None:
+      if message["type"] == "http.response.body":
+        response_body.add(message.get("body", b""))
+        if not message.get("more_body", False):
+          self._log_body("[Response Body]", response_body)
+      await send(message)
 
-      try:
-        response_body_json = body.decode("utf-8")
-      except UnicodeDecodeError:
-        self._logger.warning("Failed to decode response body as UTF-8.")
-        response_body_json = body
+    await self._app(scope, receive_and_sample, sample_and_send)
 
-      self._logger.info("\n")
-      self._logger.info("[Response Body]")
-      self._logger.info("%s", response_body_json)
+  def _log_body(self, title: str, body: _BodySample) -> None:
+    """Logs a sampled body, with payment credentials redacted."""
+    self._logger.info("\n")
+    self._logger.info(title)
+    self._logger.info("%s", body)
 
-      return Response(
-          content=body,
-          status_code=response.status_code,
-          media_type=response.media_type,
-          headers=response.headers,
-      )
-    else:
-      self._logger.info("\n")
-      self._logger.info("[Response Body]")
-      self._logger.info("<empty>")
-      return response
+
+def _create_lifespan(
+    startup_hooks: Sequence[Callable[[], Awaitable[None]]],
+) -> Callable[[Starlette], contextlib.AbstractAsyncContextManager[None]]:
+  """Creates the lifespan of a server process.
+
+  Args:
+      startup_hooks: Coroutine functions run before the server is ready.
+
+  Returns:
+      The lifespan context manager.
+  """
+
+  @contextlib.asynccontextmanager
+  async def lifespan(app: Starlette) -> AsyncIterator[None]:
+    await asyncio.gather(*(hook() for hook in startup_hooks))
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    # Close the pooled connections used to call other agents.
+    await payment_remote_a2a_client.close_all_clients()
+
+  return lifespan
+
+
+async def _ready(request: Request) -> JSONResponse:
+  """Reports whether the server process is ready to serve requests."""
+  if getattr(request.app.state, "ready", False):
+    return JSONResponse({"status": "ready"})
+  return JSONResponse({"status": "unavailable"}, status_code=503)
 
 
 def _build_starlette_app(
-    agent_card: AgentCard, *, executor, rpc_url
+    agent_card: AgentCard,
+    *,
+    executor,
+    rpc_url,
+    task_store: TaskStore | None = None,
+    startup_hooks: Sequence[Callable[[], Awaitable[None]]] = (),
 ) -> A2AStarletteApplication:
   """Create and return a ready-to-serve Starlette ASGI application.
 
@@ -180,6 +382,8 @@ def _build_starlette_app(
       agent_card: The AgentCard object describing the agent.
       executor: The AgentExecutor that processes A2A requests.
       rpc_url: The base URL path at which to mount the JSON-RPC handler.
+      task_store: Where A2A tasks are stored. Defaults to process memory.
+      startup_hooks: Coroutine functions run when the app starts up.
 
   Returns:
       An instance of A2AStarletteApplication.
@@ -192,15 +396,18 @@ def _build_starlette_app(
 
   handler = DefaultRequestHandler(
       agent_executor=executor,
-      task_store=InMemoryTaskStore(),
+      task_store=task_store or InMemoryTaskStore(),
       request_context_builder=SimpleRequestContextBuilder(),
   )
 
   app = A2AStarletteApplication(
       agent_card=agent_card, http_handler=handler
   ).build(
-      rpc_url=rpc_url, agent_card_url=f"{rpc_url}{AGENT_CARD_WELL_KNOWN_PATH}"
+      rpc_url=rpc_url,
+      agent_card_url=f"{rpc_url}{AGENT_CARD_WELL_KNOWN_PATH}",
+      lifespan=_create_lifespan(startup_hooks),
   )
+  app.add_route(READY_PATH, _ready, methods=["GET"])
   return app
 
 
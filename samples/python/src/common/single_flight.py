@@ -0,0 +1,87 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Coalescing of concurrent identical calls into a single one.
+
+When a cache is cold, e.g. after a restart, many requests may miss it at once
+and each make the same slow call to fill it. A SingleFlight lets the first
+caller for a key make the call, and the callers that arrive while it is in
+flight await the same result, or exception, instead of making it again.
+
+Only idempotent calls, such as reads, may be coalesced, and a call is
+forgotten as soon as it completes: a SingleFlight does not cache results.
+"""
+
+import asyncio
+import collections
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+  """Shares the result of a call with the concurrent callers of the same key.
+
+  Calls must be made from a single event loop.
+  """
+
+  def __init__(self):
+    self._calls: dict[Hashable, asyncio.Future[T]] = {}
+    self._stats = collections.Counter()
+
+  async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+    """Returns the result of a call, making it unless it is in flight.
+
+    The call runs as its own task, so that a cancelled caller does not cancel
+    it for the others.
+
+    Args:
+      key: Identifies the call; concurrent calls with equal keys are merged.
+      call: Makes the call, if none is in flight for the key.
+
+    Returns:
+      The result of the call.
+
+    Raises:
+      Exception: Whatever the call raised, to each of its callers.
+    """
+    future = self._calls.get(key)
+    if future is None:
+      future = asyncio.ensure_future(call())
+      self._calls[key] = future
+      future.add_done_callback(lambda done: self._forget(key, done))
+      self._stats["calls"] += 1
+    else:
+      self._stats["shared"] += 1
+    return await asyncio.shield(future)
+
+  def stats(self) -> dict[str, int]:
+    """Returns the counts of calls made, and of calls shared with another."""
+    return {
+        "in_flight": len(self._calls),
+        "calls": self._stats["calls"],
+        "shared": self._stats["shared"],
+    }
+
+  def _forget(self, key: Hashable, future: asyncio.Future[T]) -> None:
+    if self._calls.get(key) is future:
+      del self._calls[key]
+    # Retrieve the exception, which is not logged as unretrieved if all the
+    # callers were cancelled.
+    if not future.cancelled():
+      future.exception()
@@ -0,0 +1,258 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""TaskStore implementations for the agent servers.
+
+The A2A SDK's InMemoryTaskStore keeps every task for the life of the process
+and loses them all on restart, including tasks waiting on user input such as
+the payment processor's OTP challenge. This module provides:
+
+1. SqliteTaskStore: persists tasks in a SQLite database in WAL mode, and
+   prunes tasks that reached a terminal state once their retention period has
+   passed.
+2. CachingTaskStore: a size-bounded, least recently used in-memory cache in
+   front of another TaskStore.
+
+Use create_task_store() to build the store selected by name.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from a2a.server.context import ServerCallContext
+from a2a.server.tasks.inmemory_task_store import InMemoryTaskStore
+from a2a.server.tasks.task_store import TaskStore
+from a2a.types import Task
+from a2a.types import TaskState
+
+
+TASK_STORE_KINDS = ("memory", "sqlite")
+
+DEFAULT_RETENTION_SECONDS = 3600.0
+DEFAULT_CACHE_MAX_ENTRIES = 1024
+
+# Tasks in these states will not change again, and may be pruned.
+_TERMINAL_STATES = (
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected,
+)
+
+# How often the SQLite store prunes tasks past their retention period.
+_PRUNE_INTERVAL_SECONDS = 60.0
+
+
+class SqliteTaskStore(TaskStore):
+  """A TaskStore that persists tasks in a SQLite database.
+
+  The database uses write-ahead logging, so several server processes can share
+  it. Queries run in a worker thread to keep the event loop free.
+  """
+
+  def __init__(
+      self,
+      path: str,
+      retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+  ):
+    """Initialization.
+
+    Args:
+      path: The path of the database file.
+      retention_seconds: How long tasks in a terminal state are kept.
+    """
+    self._retention_seconds = retention_seconds
+    self._lock = threading.Lock()
+    self._last_pruned_at = time.monotonic()
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    self._db = sqlite3.connect(
+        path, timeout=30.0, isolation_level=None, check_same_thread=False
+    )
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=NORMAL")
+    self._db.execute(
+        "CREATE TABLE IF NOT EXISTS tasks ("
+        " id TEXT PRIMARY KEY, state TEXT NOT NULL, data TEXT NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+    self._db.execute(
+        "CREATE INDEX IF NOT EXISTS tasks_by_state_and_time"
+        " ON tasks (state, updated_at)"
+    )
+
+  async def save(
+      self, task: Task, context: ServerCallContext | None = None
+  ) -> None:
+    """Saves or updates a task in the database."""
+    await asyncio.to_thread(
+        self._save, task.id, task.status.state.value, task.model_dump_json()
+    )
+
+  async def get(
+      self, task_id: str, context: ServerCallContext | None = None
+  ) -> Task | None:
+    """Retrieves a task from the database by ID."""
+    data = await asyncio.to_thread(self._get, task_id)
+    return Task.model_validate_json(data) if data is not None else None
+
+  async def delete(
+      self, task_id: str, context: ServerCallContext | None = None
+  ) -> None:
+    """Deletes a task from the database by ID."""
+    await asyncio.to_thread(self._delete, task_id)
+
+  def prune(self) -> int:
+    """Deletes terminal tasks past their retention period.
+
+    Returns:
+      The number of tasks deleted.
+    """
+    with self._lock:
+      return self._prune()
+
+  def _save(self, task_id: str, state: str, data: str) -> None:
+    with self._lock:
+      self._db.execute(
+          "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)",
+          (task_id, state, data, time.time()),
+      )
+      if time.monotonic() - self._last_pruned_at >= _PRUNE_INTERVAL_SECONDS:
+        self._prune()
+
+  def _get(self, task_id: str) -> str | None:
+    with self._lock:
+      row = self._db.execute(
+          "SELECT data FROM tasks WHERE id = ?", (task_id,)
+      ).fetchone()
+    return row[0] if row else None
+
+  def _delete(self, task_id: str) -> None:
+    with self._lock:
+      self._db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+  def _prune(self) -> int:
+    self._last_pruned_at = time.monotonic()
+    terminal_states = [state.value for state in _TERMINAL_STATES]
+    cursor = self._db.execute(
+        "DELETE FROM tasks WHERE updated_at < ? AND state IN"
+        f" ({', '.join('?' * len(terminal_states))})",
+        (time.time() - self._retention_seconds, *terminal_states),
+    )
+    if cursor.rowcount:
+      logging.info("Pruned %d finished tasks.", cursor.rowcount)
+    return cursor.rowcount
+
+
+class CachingTaskStore(TaskStore):
+  """A size-bounded LRU cache in front of another TaskStore."""
+
+  def __init__(
+      self,
+      backend: TaskStore,
+      max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+  ):
+    """Initialization.
+
+    Args:
+      backend: The TaskStore that persists the tasks.
+      max_entries: The maximum number of tasks held in memory.
+    """
+    self._backend = backend
+    self._max_entries = max_entries
+    self._tasks: collections.OrderedDict[str, Task] = (
+        collections.OrderedDict()
+    )
+    self._hits = 0
+    self._misses = 0
+
+  async def save(
+      self, task: Task, context: ServerCallContext | None = None
+  ) -> None:
+    """Saves the task in the backend, and caches it."""
+    await self._backend.save(task, context)
+    self._cache(task)
+
+  async def get(
+      self, task_id: str, context: ServerCallContext | None = None
+  ) -> Task | None:
+    """Retrieves a task from the cache, or else from the backend."""
+    task = self._tasks.get(task_id)
+    if task is not None:
+      self._tasks.move_to_end(task_id)
+      self._hits += 1
+      return task
+    self._misses += 1
+    task = await self._backend.get(task_id, context)
+    if task is not None:
+      self._cache(task)
+    return task
+
+  async def delete(
+      self, task_id: str, context: ServerCallContext | None = None
+  ) -> None:
+    """Deletes the task from the cache and the backend."""
+    self._tasks.pop(task_id, None)
+    await self._backend.delete(task_id, context)
+
+  def stats(self) -> dict[str, int]:
+    """Returns the size of the cache and its hit and miss counts."""
+    return {"size": len(self._tasks), "hits": self._hits, "misses": self._misses}
+
+  def _cache(self, task: Task) -> None:
+    self._tasks[task.id] = task
+    self._tasks.move_to_end(task.id)
+    while len(self._tasks) > self._max_entries:
+      self._tasks.popitem(last=False)
+
+
+def create_task_store(
+    kind: str,
+    path: str | None = None,
+    retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+    cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+) -> TaskStore:
+  """Creates a TaskStore.
+
+  Args:
+    kind: One of TASK_STORE_KINDS. "memory" keeps tasks in process memory;
+      "sqlite" persists them, with an in-memory cache in front.
+    path: The database path, required for the "sqlite" kind.
+    retention_seconds: How long finished tasks are kept in the database.
+    cache_max_entries: The size of the in-memory cache. 0 disables it.
+
+  Returns:
+    The TaskStore.
+
+  Raises:
+    ValueError: If the kind is unknown, or a path is required but missing.
+  """
+  if kind == "memory":
+    return InMemoryTaskStore()
+  if kind == "sqlite":
+    if not path:
+      raise ValueError("A path is required for the sqlite task store.")
+    store = SqliteTaskStore(path, retention_seconds)
+    if cache_max_entries <= 0:
+      return store
+    return CachingTaskStore(store, cache_max_entries)
+  raise ValueError(
+      f"Unknown task store: {kind}. Expected one of {TASK_STORE_KINDS}."
+  )
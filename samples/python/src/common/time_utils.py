@@ -0,0 +1,42 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parsing of the protocol's timestamps.
+
+Mandates carry times, such as a CartMandate's cart_expiry, as ISO 8601
+strings. Every agent must read them as the same instant, so a timestamp
+without a UTC offset is taken to be in UTC, never in the local time zone of
+the agent reading it.
+"""
+
+from datetime import datetime
+from datetime import timezone
+
+
+def parse_timestamp(timestamp: str) -> float:
+  """Converts an ISO 8601 timestamp to seconds since the epoch.
+
+  Args:
+    timestamp: The timestamp. If it has no UTC offset, it is in UTC.
+
+  Returns:
+    The seconds since the epoch.
+
+  Raises:
+    ValueError: If the timestamp is not in ISO 8601 format.
+  """
+  parsed = datetime.fromisoformat(timestamp)
+  if parsed.tzinfo is None:
+    parsed = parsed.replace(tzinfo=timezone.utc)
+  return parsed.timestamp()
@@ -0,0 +1,159 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The tools of an agent, indexed by name.
+
+A ToolRegistry is built once, when the agent's executor is created, and is
+immutable afterwards: tool names are checked for uniqueness then, rather than
+on every request, and a tool is then found by its name in constant time.
+
+Each tool may declare the DataPart keys it requires and whether it is
+idempotent, by being registered as a ToolSpec. The registry counts the calls
+of each tool in a latency histogram, and their errors by exception type.
+"""
+
+import bisect
+import collections
+from collections.abc import Iterable
+from collections.abc import Mapping
+from collections.abc import Set
+import dataclasses
+import threading
+import types
+from typing import Any, Callable
+
+from a2a.server.tasks.task_updater import TaskUpdater
+from a2a.types import Task
+
+from common.message_utils import DataPartIndex
+
+
+Tool = Callable[[DataPartIndex, TaskUpdater, Task | None], Any]
+
+# The upper bounds of the latency histogram buckets, in milliseconds. Slower
+# calls are counted in a last, unbounded bucket.
+_LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_LATENCY_BUCKET_LABELS = tuple(
+    f"<={bound}ms" for bound in _LATENCY_BUCKETS_MS
+) + (f">{_LATENCY_BUCKETS_MS[-1]}ms",)
+
+
+@dataclasses.dataclass(frozen=True)
+class ToolSpec:
+  """A tool and its metadata.
+
+  Attributes:
+    tool: The tool.
+    data_keys: The keys of the DataParts the tool requires.
+    idempotent: Whether calling the tool again with the same request has no
+      further effect, so that the request may be retried.
+  """
+
+  tool: Tool
+  data_keys: frozenset[str] = frozenset()
+  idempotent: bool = False
+
+  @property
+  def name(self) -> str:
+    return self.tool.__name__
+
+
+class ToolRegistry:
+  """The tools of an agent, indexed by name."""
+
+  def __init__(self, tools: Iterable[Tool | ToolSpec]):
+    """Initialization.
+
+    Args:
+      tools: The tools, either bare or with their metadata.
+
+    Raises:
+      ValueError: If several tools have the same name.
+    """
+    specs = {}
+    for tool in tools:
+      spec = tool if isinstance(tool, ToolSpec) else ToolSpec(tool)
+      if spec.name in specs:
+        raise ValueError(f"Duplicate tool name: {spec.name}")
+      specs[spec.name] = spec
+    self._specs: Mapping[str, ToolSpec] = types.MappingProxyType(specs)
+    self._lock = threading.Lock()
+    self._latencies = {
+        name: [0] * len(_LATENCY_BUCKET_LABELS) for name in specs
+    }
+    self._errors = {name: collections.Counter() for name in specs}
+
+  @property
+  def specs(self) -> Mapping[str, ToolSpec]:
+    """The metadata of each tool, by tool name."""
+    return self._specs
+
+  @property
+  def names(self) -> Set[str]:
+    """The names of the tools."""
+    return self._specs.keys()
+
+  @property
+  def tools(self) -> list[Tool]:
+    """The tools, in the order they were registered."""
+    return [spec.tool for spec in self._specs.values()]
+
+  def get(self, name: str) -> ToolSpec:
+    """Returns the tool with the given name.
+
+    Args:
+      name: The name of the tool.
+
+    Returns:
+      The tool and its metadata.
+
+    Raises:
+      ValueError: If there is no such tool.
+    """
+    spec = self._specs.get(name)
+    if spec is None:
+      raise ValueError(f"Unknown tool: {name}")
+    return spec
+
+  def record(
+      self, name: str, seconds: float, error: BaseException | None = None
+  ) -> None:
+    """Counts a call of a tool.
+
+    Args:
+      name: The name of the tool.
+      seconds: How long the call took.
+      error: The exception the call raised, if any.
+    """
+    bucket = bisect.bisect_left(_LATENCY_BUCKETS_MS, seconds * 1000)
+    with self._lock:
+      self._latencies[name][bucket] += 1
+      if error is not None:
+        self._errors[name][type(error).__name__] += 1
+
+  def stats(self) -> dict[str, dict[str, Any]]:
+    """Returns the call count, latency and error histograms of each tool."""
+    with self._lock:
+      return {
+          name: {
+              "calls": sum(self._latencies[name]),
+              "errors": sum(self._errors[name].values()),
+              "latency_ms": dict(
+                  zip(_LATENCY_BUCKET_LABELS, self._latencies[name])
+              ),
+              "errors_by_type": dict(self._errors[name]),
+          }
+          for name in self._specs
+      }
@@ -0,0 +1,399 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The user_authorization of a PaymentMandate, as an SD-JWT presentation.
+
+A user authorizes a payment by presenting a credential bound to a key on their
+device, in the SD-JWT format (https://www.rfc-editor.org/rfc/rfc9901):
+
+  <issuer-signed JWT>~<key binding JWT>
+
+The issuer-signed JWT is a credential whose cnf claim holds the public key of
+the user's device. The key binding JWT is signed by the device, and its claims
+bind the presentation to the transaction:
+
+  - aud: The merchant the presentation is intended for.
+  - nonce: A unique value, so that the presentation cannot be replayed.
+  - iat: When the user signed.
+  - exp: Optionally, until when the user authorizes the transaction. A
+    presentation without it is only accepted for a few minutes after the user
+    signs it; a purchase authorized ahead of time, e.g. a standing
+    BuyWhenReady intent, is signed until its cart expires.
+  - sd_hash: The hash of the rest of the presentation.
+  - transaction_data: The hashes of the CartMandate's contents and of the
+    PaymentMandate's contents, in that order.
+
+The sample simulates the user's device, and the issuer of its credential,
+within the shopping agent. The issuer's keys are kept in
+USER_CREDENTIAL_ISSUER_KEY_DIR, and its public keys are published there as
+jwks.json, where the other agents read them.
+"""
+
+import asyncio
+import base64
+from collections.abc import Mapping
+from collections.abc import Sequence
+import functools
+import hashlib
+import json
+import os
+import time
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric import ec
+import httpx
+
+from common import jwt_signing
+
+
+# The issuer of the simulated device's credential.
+ISSUER = "ap2_sample_user_credential_issuer"
+
+# The directory holding the simulated issuer's keys, and its published JWKS.
+ISSUER_KEY_DIR = os.getenv(
+    "USER_CREDENTIAL_ISSUER_KEY_DIR", ".state/user_credential_issuer"
+)
+
+# The type of a key binding JWT.
+KB_JWT_TYPE = "kb+jwt"
+
+# How long a cached JWKS is used before it is fetched again.
+DEFAULT_JWKS_TTL_SECONDS = 300.0
+
+# How long the simulated device's credential is valid.
+_CREDENTIAL_LIFETIME_SECONDS = 24 * 60 * 60
+
+# How long after the user signs a presentation it is accepted.
+_MAX_PRESENTATION_AGE_SECONDS = 15 * 60
+
+# The tolerated difference between the clocks of the device and the verifier.
+_CLOCK_SKEW_SECONDS = 60
+
+# The minimum time between two fetches of an issuer's JWKS, when a token is
+# signed by a key that the issuer does not publish.
+_MIN_JWKS_REFRESH_SECONDS = 30.0
+
+_JWKS_FETCH_TIMEOUT_SECONDS = 5.0
+
+
+def create_presentation(
+    transaction_data: Sequence[str],
+    audience: str,
+    nonce: str,
+    expires_at: float | None = None,
+) -> str:
+  """Signs a presentation on the simulated user's device.
+
+  Args:
+    transaction_data: The hashes of the CartMandate's contents and of the
+      PaymentMandate's contents, in that order.
+    audience: The merchant the presentation is intended for.
+    nonce: A unique value for this presentation.
+    expires_at: Until when the user authorizes the transaction, in seconds
+      since the epoch, for a purchase made later. None if it is made now.
+
+  Returns:
+    The SD-JWT presentation.
+  """
+  claims = {
+      "aud": audience,
+      "nonce": nonce,
+      "iat": int(time.time()),
+  }
+  if expires_at is not None:
+    claims["exp"] = int(expires_at)
+  credential = _device_credential(_valid_until(claims)) + "~"
+  claims["sd_hash"] = _sd_hash(credential)
+  claims["transaction_data"] = list(transaction_data)
+  key_binding_jwt = jwt_signing.encode(claims, _device_key(), typ=KB_JWT_TYPE)
+  return credential + key_binding_jwt
+
+
+def expiry_of(presentation: str) -> float:
+  """Returns a time by which a verified presentation is no longer accepted.
+
+  IDs bound to a presentation, e.g. its PaymentMandate's payment_mandate_id,
+  need only be remembered until then to detect replays.
+
+  Args:
+    presentation: The SD-JWT presentation, already verified.
+
+  Returns:
+    The time, in seconds since the epoch.
+
+  Raises:
+    ValueError: If the presentation is malformed.
+  """
+  try:
+    _, claims = jwt_signing.decode_unverified(presentation.split("~")[-1])
+    return _valid_until(claims) + _CLOCK_SKEW_SECONDS
+  except (KeyError, TypeError, ValueError, UnicodeDecodeError) as e:
+    raise ValueError(f"Malformed user authorization: {e}") from e
+
+
+async def verify_presentation(
+    presentation: str, jwks_cache: "JwksCache"
+) -> tuple[dict[str, Any], float]:
+  """Verifies an SD-JWT presentation's signatures and validity period.
+
+  The aud and transaction_data claims are returned for the caller to check
+  against its own identity and the mandates.
+
+  Args:
+    presentation: The SD-JWT presentation.
+    jwks_cache: The public keys of the trusted issuers.
+
+  Returns:
+    The claims of the key binding JWT, and the time, in seconds since the
+    epoch, until which the presentation is valid.
+
+  Raises:
+    ValueError: If the presentation is malformed, not signed by a trusted
+      issuer and the key its credential binds, or no longer valid.
+  """
+  parts = presentation.split("~")
+  if len(parts) < 2:
+    raise ValueError("User authorization is not an SD-JWT presentation.")
+  credential, key_binding_jwt = parts[0], parts[-1]
+  try:
+    header, claims = jwt_signing.decode_unverified(credential)
+    issuer, kid = claims["iss"], header["kid"]
+  except (KeyError, TypeError, ValueError, UnicodeDecodeError) as e:
+    raise ValueError(f"Malformed user credential: {e}") from e
+  issuer_key = await jwks_cache.get_key(issuer, kid)
+  _, claims = jwt_signing.verify_with_key(credential, issuer_key)
+
+  now = time.time()
+  expires_at = claims.get("exp")
+  if not isinstance(expires_at, (int, float)) or expires_at <= now:
+    raise ValueError("User credential has expired.")
+  confirmation = claims.get("cnf")
+  if not isinstance(confirmation, dict) or "jwk" not in confirmation:
+    raise ValueError("User credential is not bound to a key.")
+  device_key = jwt_signing.public_key_from_jwk(confirmation["jwk"])
+
+  header, claims = jwt_signing.verify_with_key(key_binding_jwt, device_key)
+  if header.get("typ") != KB_JWT_TYPE:
+    raise ValueError(f"Unexpected key binding JWT type: {header.get('typ')}")
+  if claims.get("sd_hash") != _sd_hash(presentation[: -len(key_binding_jwt)]):
+    raise ValueError("Key binding JWT does not match the presentation.")
+  issued_at = claims.get("iat")
+  if not isinstance(issued_at, (int, float)) or not isinstance(
+      claims.get("exp", 0), (int, float)
+  ):
+    raise ValueError("User authorization has no valid iat or exp.")
+  valid_until = _valid_until(claims)
+  if issued_at > now + _CLOCK_SKEW_SECONDS or valid_until <= now:
+    raise ValueError("User authorization is not within its validity period.")
+  if not isinstance(claims.get("aud"), str) or not claims["aud"]:
+    raise ValueError("User authorization has no audience.")
+  if not isinstance(claims.get("nonce"), str) or not claims["nonce"]:
+    raise ValueError("User authorization has no nonce.")
+  transaction_data = claims.get("transaction_data")
+  if not isinstance(transaction_data, list) or not all(
+      isinstance(item, str) for item in transaction_data
+  ):
+    raise ValueError("User authorization has no transaction_data.")
+  return claims, min(expires_at, valid_until)
+
+
+class JwksCache:
+  """The public keys of trusted issuers, fetched as JWKS.
+
+  Issuers are e.g. of user credentials, or merchants signing their carts.
+
+  An issuer's JWKS is fetched on first use and then reused for ttl_seconds.
+  A token signed by a key missing from the cached JWKS, e.g. after the issuer
+  rotates its keys, causes the JWKS to be fetched again, at most once every
+  _MIN_JWKS_REFRESH_SECONDS.
+  """
+
+  def __init__(
+      self,
+      issuers: Mapping[str, str] | None = None,
+      ttl_seconds: float = DEFAULT_JWKS_TTL_SECONDS,
+  ):
+    """Initialization.
+
+    Args:
+      issuers: The URI of the JWKS of each trusted issuer: an http(s) URL, or
+        a file path. Defaults to trusted_issuers().
+      ttl_seconds: How long a fetched JWKS is used.
+    """
+    self._issuers = dict(trusted_issuers() if issuers is None else issuers)
+    self._ttl_seconds = ttl_seconds
+    # The fetch time and the public keys by key ID, by issuer.
+    self._keys: dict[
+        str, tuple[float, dict[str, ec.EllipticCurvePublicKey]]
+    ] = {}
+
+  async def get_key(self, issuer: str, kid: str) -> ec.EllipticCurvePublicKey:
+    """Returns an issuer's public key.
+
+    Args:
+      issuer: The issuer.
+      kid: The ID of the key.
+
+    Returns:
+      The public key.
+
+    Raises:
+      ValueError: If the issuer is not trusted, its JWKS cannot be fetched, or
+        it does not publish the key.
+    """
+    uri = self._issuers.get(issuer)
+    if uri is None:
+      raise ValueError(f"Untrusted issuer: {issuer}")
+    now = time.time()
+    fetched_at, keys = self._keys.get(issuer, (0.0, {}))
+    key = keys.get(kid)
+    if key is not None and now - fetched_at < self._ttl_seconds:
+      return key
+    if key is None and now - fetched_at < _MIN_JWKS_REFRESH_SECONDS:
+      raise ValueError(f"Unknown key {kid} of issuer {issuer}.")
+
+    keys = await _fetch_jwks(uri)
+    self._keys[issuer] = (now, keys)
+    key = keys.get(kid)
+    if key is None:
+      raise ValueError(f"Unknown key {kid} of issuer {issuer}.")
+    return key
+
+
+def trusted_issuers() -> dict[str, str]:
+  """Returns the URI of the JWKS of each trusted issuer.
+
+  The issuers are read from USER_CREDENTIAL_ISSUERS, a JSON object mapping
+  each issuer to its JWKS URI. Defaults to the simulated issuer.
+  """
+  issuers = os.getenv("USER_CREDENTIAL_ISSUERS")
+  if issuers:
+    return json.loads(issuers)
+  return {ISSUER: os.path.join(ISSUER_KEY_DIR, "jwks.json")}
+
+
+async def _fetch_jwks(uri: str) -> dict[str, ec.EllipticCurvePublicKey]:
+  """Fetches a JWKS, and returns its P-256 keys by key ID.
+
+  Raises:
+    ValueError: If the JWKS cannot be fetched or parsed.
+  """
+  try:
+    if uri.startswith(("http://", "https://")):
+      async with httpx.AsyncClient(
+          timeout=_JWKS_FETCH_TIMEOUT_SECONDS
+      ) as client:
+        response = await client.get(uri)
+        response.raise_for_status()
+        jwks = response.json()
+    else:
+      jwks = await asyncio.to_thread(_read_json, uri)
+  except (httpx.HTTPError, OSError, ValueError) as e:
+    raise ValueError(f"Could not fetch the JWKS at {uri}: {e}") from e
+  if not isinstance(jwks, dict):
+    raise ValueError(f"The JWKS at {uri} is not a JSON object.")
+  return {
+      jwk["kid"]: jwt_signing.public_key_from_jwk(jwk)
+      for jwk in jwks.get("keys", [])
+      if "kid" in jwk and jwk.get("kty") == "EC"
+  }
+
+
+def _valid_until(claims: Mapping[str, Any]) -> float:
+  """Returns until when the claims of a key binding JWT are accepted."""
+  if "exp" in claims:
+    return claims["exp"]
+  return claims["iat"] + _MAX_PRESENTATION_AGE_SECONDS
+
+
+def _read_json(path: str) -> Any:
+  with open(path, encoding="utf-8") as f:
+    return json.load(f)
+
+
+def _sd_hash(value: str) -> str:
+  """Returns the base64url encoded SHA-256 hash of a presentation."""
+  value_hash = hashlib.sha256(value.encode("ascii")).digest()
+  return base64.urlsafe_b64encode(value_hash).rstrip(b"=").decode("ascii")
+
+
+@functools.cache
+def _device_key() -> ec.EllipticCurvePrivateKey:
+  """The simulated device's key, which never leaves the device."""
+  return ec.generate_private_key(ec.SECP256R1())
+
+
+# The simulated device's credential, and when it expires.
+_credential: tuple[str, float] | None = None
+
+
+def _device_credential(valid_until: float) -> str:
+  """Returns the simulated device's credential, issuing it when needed.
+
+  Args:
+    valid_until: Until when a presentation made with the credential must be
+      accepted. A presentation is only accepted while its credential is.
+  """
+  global _credential
+  now = time.time()
+  if _credential is None or _credential[1] < valid_until:
+    key_ring = _issuer_key_ring()
+    expires_at = int(max(now + _CREDENTIAL_LIFETIME_SECONDS, valid_until))
+    token = jwt_signing.encode(
+        {
+            "iss": ISSUER,
+            "iat": int(now),
+            "exp": expires_at,
+            "cnf": {"jwk": jwt_signing.public_jwk(_device_key().public_key())},
+        },
+        jwt_signing.load_private_key(
+            key_ring.private_keys_pem[key_ring.active_kid]
+        ),
+        kid=key_ring.active_kid,
+        typ="vc+sd-jwt",
+    )
+    _credential = (token, expires_at)
+  return _credential[0]
+
+
+@functools.cache
+def _issuer_key_ring() -> jwt_signing.KeyRing:
+  """Loads the simulated issuer's keys, creating them on first use.
+
+  The issuer's JWKS is (re)published alongside its keys.
+  """
+  os.makedirs(ISSUER_KEY_DIR, exist_ok=True)
+  if any(name.endswith(".pem") for name in os.listdir(ISSUER_KEY_DIR)):
+    key_ring = jwt_signing.KeyRing.from_directory(ISSUER_KEY_DIR)
+  else:
+    key_ring = jwt_signing.KeyRing.generate()
+    _write_atomically(
+        os.path.join(ISSUER_KEY_DIR, f"{key_ring.active_kid}.pem"),
+        key_ring.private_keys_pem[key_ring.active_kid],
+    )
+  _write_atomically(
+      os.path.join(ISSUER_KEY_DIR, "jwks.json"),
+      json.dumps(key_ring.jwks()).encode("utf-8"),
+  )
+  return key_ring
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+  """Writes a file, so that readers never see it partially written."""
+  temporary_path = f"{path}.{os.getpid()}.tmp"
+  # Only readable by the user, as the directory holds private keys.
+  fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+  with os.fdopen(fd, "wb") as f:
+    f.write(data)
+  os.replace(temporary_path, path)
@@ -12,26 +12,166 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Validation logic for PaymentMandate."""
+"""Validation logic for PaymentMandate.
 
+A PaymentMandate is validated by every agent it passes through: the merchant,
+its payment processor and the credentials provider. Verifying its
+user_authorization takes two signature verifications, so the verified
+presentations are cached, keyed by the digest of the presentation together
+with the mandates it authorizes, until the presentation expires. Validating
+the same mandate again then costs one hash and a dictionary lookup.
+
+A CartMandate is validated by the shopping agent when a merchant returns it:
+its merchant_authorization must be signed with a key the merchant publishes.
+The JWKS of each trusted merchant is read from MERCHANT_JWKS_URIS, a JSON
+object mapping the merchant's issuer ID to the URI of its JWKS. It defaults to
+the sample merchant's, published in MERCHANT_SIGNING_KEY_DIR.
+"""
+
+import functools
+import json
 import logging
+import os
+import time
 
+from ap2.types import canonical
+from ap2.types.mandate import CartMandate
 from ap2.types.mandate import PaymentMandate
+from common import jwt_signing
+from common import kv_store
+from common import user_authorization
+
+
+# How long a verified presentation is cached, at most.
+_CACHE_TTL_SECONDS = float(
+    os.getenv("USER_AUTHORIZATION_CACHE_TTL_SECONDS", "300")
+)
+
+# The maximum number of verified presentations cached.
+_CACHE_MAX_ENTRIES = int(
+    os.getenv("USER_AUTHORIZATION_CACHE_MAX_ENTRIES", "4096")
+)
+
+# The issuer ID of the sample merchant, and the directory of its keys.
+_SAMPLE_MERCHANT_ID = "merchant_agent"
+_SAMPLE_MERCHANT_KEY_DIR = os.getenv(
+    "MERCHANT_SIGNING_KEY_DIR", ".state/merchant_signing_keys"
+)
 
+_verified_presentations = kv_store.InMemoryKeyValueStore(
+    max_entries=_CACHE_MAX_ENTRIES
+)
 
-def validate_payment_mandate_signature(payment_mandate: PaymentMandate) -> None:
+
+async def validate_payment_mandate_signature(
+    payment_mandate: PaymentMandate,
+    cart_mandate: CartMandate | None = None,
+    audience: str | None = None,
+) -> None:
   """Validates the PaymentMandate signature.
 
+  The user_authorization must be a presentation signed by the user, whose
+  transaction_data holds the hashes of the CartMandate's contents and of the
+  PaymentMandate's contents, and whose aud is the merchant it is for.
+
   Args:
     payment_mandate: The PaymentMandate to be validated.
+    cart_mandate: The CartMandate the payment is for, if known. Its hash is
+      then checked too.
+    audience: The merchant the verifying agent is, or acts for. Defaults to
+      the merchant_agent the PaymentMandate pays.
 
   Raises:
     ValueError: If the PaymentMandate signature is not valid.
   """
-  # In a real implementation, full validation logic would reside here. For
-  # demonstration purposes, we simply log that the authorization field is
-  # populated.
   if payment_mandate.user_authorization is None:
     raise ValueError("User authorization not found in PaymentMandate.")
 
+  if audience is None:
+    audience = payment_mandate.payment_mandate_contents.merchant_agent
+  cache_key = canonical.digest([
+      payment_mandate,
+      cart_mandate.contents if cart_mandate else None,
+      audience,
+  ])
+  if _verified_presentations.get(cache_key):
+    logging.info("Valid PaymentMandate found (cached).")
+    return
+
+  claims, expires_at = await user_authorization.verify_presentation(
+      payment_mandate.user_authorization, _get_jwks_cache()
+  )
+  # A presentation for another merchant must not be accepted by this one.
+  if claims["aud"] != audience:
+    raise ValueError(
+        f"User authorization is intended for {claims['aud']}, not {audience}."
+    )
+  transaction_data = claims["transaction_data"]
+  if len(transaction_data) != 2:
+    raise ValueError("User authorization must sign exactly two hashes.")
+  cart_hash, payment_mandate_hash = transaction_data
+  if payment_mandate_hash != canonical.digest(
+      payment_mandate.payment_mandate_contents
+  ):
+    raise ValueError("User authorization does not match the PaymentMandate.")
+  if cart_mandate is not None and cart_hash != canonical.digest(
+      cart_mandate.contents
+  ):
+    raise ValueError("User authorization does not match the CartMandate.")
+
+  _verified_presentations.set(
+      cache_key,
+      True,
+      expires_at=min(expires_at, time.time() + _CACHE_TTL_SECONDS),
+  )
   logging.info("Valid PaymentMandate found.")
+
+
+async def validate_cart_mandate_signature(cart_mandate: CartMandate) -> None:
+  """Validates the merchant's signature of a CartMandate.
+
+  The merchant_authorization must be an unexpired JWT, signed with a key a
+  trusted merchant publishes, whose cart_hash is the hash of the cart's
+  contents.
+
+  Args:
+    cart_mandate: The CartMandate to be validated.
+
+  Raises:
+    ValueError: If the CartMandate signature is not valid.
+  """
+  token = cart_mandate.merchant_authorization
+  if not token:
+    raise ValueError("Merchant authorization not found in CartMandate.")
+  try:
+    header, claims = jwt_signing.decode_unverified(token)
+    issuer, kid = claims["iss"], header["kid"]
+  except (KeyError, TypeError, ValueError, UnicodeDecodeError) as e:
+    raise ValueError(f"Malformed merchant authorization: {e}") from e
+  merchant_key = await _get_merchant_jwks_cache().get_key(issuer, kid)
+  _, claims = jwt_signing.verify_with_key(token, merchant_key)
+  expires_at = claims.get("exp")
+  if not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+    raise ValueError("Merchant authorization has expired.")
+  if claims.get("cart_hash") != canonical.digest(cart_mandate.contents):
+    raise ValueError("Merchant authorization does not match the CartMandate.")
+
+
+def stats() -> dict[str, int]:
+  """Returns the hit, miss, eviction and expiration counts of the cache."""
+  return _verified_presentations.stats()
+
+
+@functools.cache
+def _get_jwks_cache() -> user_authorization.JwksCache:
+  return user_authorization.JwksCache()
+
+
+@functools.cache
+def _get_merchant_jwks_cache() -> user_authorization.JwksCache:
+  merchants = os.getenv("MERCHANT_JWKS_URIS")
+  if merchants:
+    return user_authorization.JwksCache(json.loads(merchants))
+  return user_authorization.JwksCache({
+      _SAMPLE_MERCHANT_ID: os.path.join(_SAMPLE_MERCHANT_KEY_DIR, "jwks.json")
+  })
@@ -20,7 +20,13 @@ that are sent to/from the client, so engineers can see what is happening
 between the servers in real time.
 """
 
+import atexit
+from collections.abc import Sequence
+import json
 import logging
+import logging.handlers
+import queue
+import re
 from typing import Any
 
 from a2a.server.agent_execution.context import RequestContext
@@ -28,9 +34,33 @@ from a2a.server.agent_execution.context import RequestContext
 from ap2.types.mandate import CART_MANDATE_DATA_KEY
 from ap2.types.mandate import INTENT_MANDATE_DATA_KEY
 from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
+from common.message_utils import DataPartIndex
 
 _logger = logging.getLogger(__name__)
 
+# JSON fields holding payment credentials or user authorizations, whose values
+# are never logged.
+_SENSITIVE_FIELDS = (
+    "token",
+    "cryptogram",
+    "account_number",
+    "card_number",
+    "cvc",
+    "cvv",
+    "user_authorization",
+)
+
+# A JSON string, which may be cut off at the end of a logged sample.
+_JSON_STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*(?:"|\\?$)')
+
+# A sensitive field, up to its value.
+_SENSITIVE_FIELD_PATTERN = re.compile(
+    rf'"(?:{"|".join(_SENSITIVE_FIELDS)})"\s*:\s*'
+)
+
+# Card numbers, i.e. runs of 13 to 19 digits; all but the last 4 are masked.
+_CARD_NUMBER_PATTERN = re.compile(r"(?<!\d)\d{13,19}(?!\d)")
+
 
 def create_file_handler() -> logging.FileHandler:
   """Creates a file handler to the logger for watch.log.
@@ -44,15 +74,53 @@ def create_file_handler() -> logging.FileHandler:
   return file_handler
 
 
+def create_queue_handler() -> logging.handlers.QueueHandler:
+  """Creates a handler that writes to watch.log from a background thread.
+
+  Logging a record only enqueues it; a QueueListener thread performs the file
+  I/O, so that logging large payloads does not block the event loop.
+
+  Returns:
+      A logging.handlers.QueueHandler instance feeding 'watch.log'.
+  """
+  log_queue = queue.SimpleQueue()
+  listener = logging.handlers.QueueListener(log_queue, create_file_handler())
+  listener.start()
+  atexit.register(listener.stop)
+
+  queue_handler = logging.handlers.QueueHandler(log_queue)
+  queue_handler.setLevel(logging.INFO)
+  return queue_handler
+
+
+def redact(text: str) -> str:
+  """Masks payment credentials, such as card tokens, in logged JSON text.
+
+  Args:
+    text: JSON text, possibly cut off.
+
+  Returns:
+    The text, with the values of sensitive fields redacted and card numbers
+    masked.
+  """
+  try:
+    value = json.loads(text)
+  except ValueError:
+    # A sample cut off mid-value.
+    return _mask_card_numbers(_redact_fragment(text))
+  return _redacted_json(value)
+
+
 def log_a2a_message_parts(
-    text_parts: list[str], data_parts: list[dict[str, Any]]
+    text_parts: list[str], data_parts: Sequence[dict[str, Any]]
 ):
   _load_logger()
 
   """Logs the A2A message parts to the watch.log file."""
   _log_request_instructions(text_parts)
-  _log_mandates(data_parts)
-  _log_extra_data(data_parts)
+  data_part_index = DataPartIndex.of(data_parts)
+  _log_mandates(data_part_index)
+  _log_extra_data(data_part_index)
 
 
 def log_a2a_request_extensions(context: RequestContext) -> None:
@@ -70,7 +138,7 @@ def log_a2a_request_extensions(context: RequestContext) -> None:
 
 def _load_logger():
   if not _logger.handlers:
-    _logger.addHandler(create_file_handler())
+    _logger.addHandler(create_queue_handler())
 
 
 def _log_request_instructions(text_parts: list[str]) -> None:
@@ -80,36 +148,99 @@ def _log_request_instructions(text_parts: list[str]) -> None:
   _logger.info(text_parts)
 
 
-def _log_mandates(data_parts: list[dict[str, Any]]) -> None:
+# The header logged before each kind of mandate.
+_MANDATE_HEADERS = {
+    CART_MANDATE_DATA_KEY: "[A Cart Mandate was in the request Data]",
+    INTENT_MANDATE_DATA_KEY: "[An Intent Mandate was in the request Data]",
+    PAYMENT_MANDATE_DATA_KEY: "[A Payment Mandate was in the request Data]",
+}
+
+
+def _log_mandates(data_parts: DataPartIndex) -> None:
   """Extracts and logs mandates from the data parts."""
+  for key, header in _MANDATE_HEADERS.items():
+    for value in data_parts.get_all(key):
+      _logger.info("\n")
+      _logger.info(header)
+      _logger.info("%s", _redacted_json(value))
 
-  for data_part in data_parts:
-    for key, value in data_part.items():
-      if key == CART_MANDATE_DATA_KEY:
-        _logger.info("\n")
-        _logger.info("[A Cart Mandate was in the request Data]")
-        _logger.info(value)
-      elif key == INTENT_MANDATE_DATA_KEY:
-        _logger.info("\n")
-        _logger.info("[An Intent Mandate was in the request Data]")
-        _logger.info(value)
-      elif key == PAYMENT_MANDATE_DATA_KEY:
-        _logger.info("\n")
-        _logger.info("[A Payment Mandate was in the request Data]")
-        _logger.info(value)
-
-
-def _log_extra_data(data_parts: list[dict[str, Any]]) -> None:
-  """Extracts and logs extra data from the data parts."""
-  for data_part in data_parts:
-    for key, value in data_part.items():
-      if (
-          key == CART_MANDATE_DATA_KEY
-          or key == INTENT_MANDATE_DATA_KEY
-          or key == PAYMENT_MANDATE_DATA_KEY
-      ):
-        continue
 
+def _log_extra_data(data_parts: DataPartIndex) -> None:
+  """Extracts and logs extra data from the data parts."""
+  for key in data_parts.keys():
+    if key in _MANDATE_HEADERS:
+      continue
+    for value in data_parts.get_all(key):
       _logger.info("\n")
       _logger.info("[Data Part: %s] ", key)
-      _logger.info(value)
+      _logger.info("%s", _redacted_json(value))
+
+
+def _redacted_json(value: Any) -> str:
+  """Returns a data part's value as JSON, with payment credentials redacted."""
+  return _mask_card_numbers(json.dumps(_redact_value(value), default=str))
+
+
+def _redact_value(value: Any) -> Any:
+  """Returns a JSON value with the values of its sensitive fields redacted.
+
+  Sensitive fields are redacted at any depth, whatever their value, e.g. a
+  token object with nested wallet details.
+  """
+  if isinstance(value, dict):
+    return {
+        key: "<redacted>" if key in _SENSITIVE_FIELDS else _redact_value(item)
+        for key, item in value.items()
+    }
+  if isinstance(value, list):
+    return [_redact_value(item) for item in value]
+  return value
+
+
+def _redact_fragment(text: str) -> str:
+  """Redacts the values of sensitive fields in JSON text that was cut off."""
+  parts = []
+  position = 0
+  while match := _SENSITIVE_FIELD_PATTERN.search(text, position):
+    parts.append(text[position:match.end()])
+    parts.append('"<redacted>"')
+    position = _value_end(text, match.end())
+  parts.append(text[position:])
+  return "".join(parts)
+
+
+def _value_end(text: str, start: int) -> int:
+  """Returns where the JSON value starting at start ends.
+
+  Objects and arrays are skipped as a whole, however deeply nested. A value
+  that is cut off ends with the text.
+  """
+  depth = 0
+  position = start
+  while position < len(text):
+    char = text[position]
+    if char == '"':
+      match = _JSON_STRING_PATTERN.match(text, position)
+      position = match.end() if match else len(text)
+    elif char in "{[":
+      depth += 1
+      position += 1
+    elif char in "}],":
+      if depth == 0:
+        # The end of a number or literal, within its enclosing object.
+        return position
+      if char != ",":
+        depth -= 1
+      position += 1
+    else:
+      position += 1
+    if depth == 0 and char in '"}]':
+      return position
+  return position
+
+
+def _mask_card_numbers(text: str) -> str:
+  """Masks all but the last 4 digits of the card numbers in text."""
+  return _CARD_NUMBER_PATTERN.sub(
+      lambda match: "*" * (len(match.group()) - 4) + match.group()[-4:], text
+  )
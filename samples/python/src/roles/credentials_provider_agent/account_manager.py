@@ -16,8 +16,17 @@
 
 Each 'account' contains a user's payment methods and shipping address.
 For demonstration purposes, several accounts are pre-populated with sample data.
+
+Lookups go through an index of each account's payment methods, by casefolded
+alias and by type and network, which is rebuilt whenever the account is added
+or changed through set_account() or set_payment_method().
 """
 
+from collections.abc import Mapping
+from collections.abc import Sequence
+import copy
+import threading
+import types
 from typing import Any
 
 
@@ -96,78 +105,35 @@ _account_db = {
 }
 
 
-_token = {}
-
-
-def create_token(email_address: str, payment_method_alias: str) -> str:
-  """Creates and stores a token for an account.
-
-  Args:
-    email_address: The email address of the account.
-    payment_method_alias: The alias of the payment method.
-
-  Returns:
-    The token for the payment method.
-  """
-  token = f"fake_payment_credential_token_{len(_token)}"
-
-  _token[token] = {
-      "email_address": email_address,
-      "payment_method_alias": payment_method_alias,
-      "payment_mandate_id": None,
-  }
-
-  return token
-
-
-def update_token(token: str, payment_mandate_id: str) -> None:
-  """Updates the token with the payment mandate id.
-
-  Args:
-    token: The token to update.
-    payment_mandate_id: The payment mandate id to associate with the token.
-  """
-  if token not in _token:
-    raise ValueError(f"Token {token} not found")
-  if _token[token].get("payment_mandate_id"):
-    # Do not overwrite the payment mandate id if it is already set.
-    return
-  _token[token]["payment_mandate_id"] = payment_mandate_id
-
-def verify_token(token: str, payment_mandate_id: str) -> dict[str, Any]:
-  """Look up an account by token.
+def get_account_payment_methods(
+    email_address: str,
+) -> Sequence[dict[str, Any]]:
+  """Returns the payment methods for the given account email address.
 
   Args:
-    token: The token for look up.
-    payment_mandate_id: The payment mandate id associated with the token.
+    email_address: The account's email address.
 
   Returns:
-    The account for the given token, or status:invalid_token if the token is not
-    valid.
+    The user's payment_methods. The sequence is shared, and must not be
+    modified.
   """
-  account_lookup = _token.get(token, {})
-  if not account_lookup:
-    raise ValueError("Invalid token")
-  if account_lookup.get("payment_mandate_id") != payment_mandate_id:
-    raise ValueError("Invalid token")
-  email_address = account_lookup.get("email_address")
-  alias = account_lookup.get("payment_method_alias")
-  return get_payment_method_by_alias(email_address, alias)
+  return _get_index(email_address).payment_methods
 
 
-def get_account_payment_methods(email_address: str) -> list[dict[str, Any]]:
-  """Returns a list of the payment methods for the given account email address.
+def get_account_payment_methods_by_type_and_network(
+    email_address: str,
+) -> Mapping[tuple[str, str | None], Sequence[dict[str, Any]]]:
+  """Returns the payment methods of an account, by type and network.
 
   Args:
     email_address: The account's email address.
 
   Returns:
-    A list of the user's payment_methods.
+    The user's payment methods, keyed by their type and the casefolded name
+    of each of their networks. A payment method with several networks is
+    found under each of them, and one without networks under (type, None).
   """
-
-  return list(
-      _account_db.get(email_address, {}).get("payment_methods", {}).values()
-  )
+  return _get_index(email_address).by_type_and_network
 
 
 def get_account_shipping_address(email_address: str) -> dict[str, Any]:
@@ -188,21 +154,97 @@ def get_payment_method_by_alias(
 ) -> dict[str, Any] | None:
   """Returns the payment method for a given account and alias.
 
+  Aliases are compared case-insensitively.
+
   Args:
     email_address: The account's email address.
     alias: The alias of the payment method to retrieve.
 
   Returns:
-    The payment method for the given account and alias, or status:not_found.
+    The payment method for the given account and alias, or None if not found.
   """
+  return _get_index(email_address).by_alias.get(alias.casefold())
 
-  payment_methods = list(
-      filter(
-          lambda payment_method: payment_method.get("alias").casefold()
-          == alias.casefold(),
-          get_account_payment_methods(email_address),
-      )
-  )
-  if not payment_methods:
-    return None
-  return payment_methods[0]
+
+def set_account(email_address: str, account: dict[str, Any]) -> None:
+  """Adds or replaces an account.
+
+  Args:
+    email_address: The account's email address.
+    account: The account's shipping_address and payment_methods.
+  """
+  with _index_lock:
+    _account_db[email_address] = copy.deepcopy(account)
+    _indexes.pop(email_address, None)
+
+
+def set_payment_method(
+    email_address: str, payment_method_id: str, payment_method: dict[str, Any]
+) -> None:
+  """Adds or replaces a payment method of an account, creating the account.
+
+  Args:
+    email_address: The account's email address.
+    payment_method_id: The ID of the payment method within the account.
+    payment_method: The payment method.
+  """
+  with _index_lock:
+    account = _account_db.setdefault(email_address, {})
+    account.setdefault("payment_methods", {})[payment_method_id] = (
+        copy.deepcopy(payment_method)
+    )
+    _indexes.pop(email_address, None)
+
+
+class _AccountIndex:
+  """The payment methods of an account, indexed for lookups."""
+
+  __slots__ = ("payment_methods", "by_alias", "by_type_and_network")
+
+  def __init__(self, account: Mapping[str, Any]):
+    self.payment_methods = tuple(account.get("payment_methods", {}).values())
+    by_alias = {}
+    by_type_and_network = {}
+    for payment_method in self.payment_methods:
+      alias = payment_method.get("alias")
+      if alias is not None:
+        # As before indexing, the first payment method with an alias wins.
+        by_alias.setdefault(alias.casefold(), payment_method)
+      networks = [
+          network.get("name", "").casefold()
+          for network in payment_method.get("network", [])
+      ] or [None]
+      for network in dict.fromkeys(networks):
+        by_type_and_network.setdefault(
+            (payment_method.get("type", ""), network), []
+        ).append(payment_method)
+    self.by_alias = types.MappingProxyType(by_alias)
+    self.by_type_and_network = types.MappingProxyType(
+        {key: tuple(methods) for key, methods in by_type_and_network.items()}
+    )
+
+
+_EMPTY_INDEX = _AccountIndex({})
+
+# The index of each account, built on first lookup.
+_indexes: dict[str, _AccountIndex] = {}
+
+# Serializes changes to accounts with the building of their indexes, so that
+# an index never outlives a change to its account.
+_index_lock = threading.Lock()
+
+
+def _get_index(email_address: str) -> _AccountIndex:
+  """Returns the index of an account, building it if needed."""
+  index = _indexes.get(email_address)
+  if index is not None:
+    return index
+  with _index_lock:
+    account = _account_db.get(email_address)
+    if account is None:
+      return _EMPTY_INDEX
+    index = _indexes.get(email_address)
+    if index is None:
+      index = _AccountIndex(account)
+      _indexes[email_address] = index
+    return index
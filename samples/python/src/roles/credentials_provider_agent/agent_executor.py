@@ -32,10 +32,33 @@ invoking it to complete a task.
 from typing import Any
 
 from . import tools
+from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
 from common.base_server_executor import BaseServerExecutor
 from common.system_utils import DEBUG_MODE_INSTRUCTIONS
+from common.tool_registry import ToolSpec
 
 
+# Prompts sent by known agents, mapped to the tool that handles them.
+_PROMPT_ROUTES = {
+    "Get the user's shipping address.": "handle_get_shipping_address",
+    "Get a payment credential token for the user's payment method.": (
+        "handle_create_payment_credential_token"
+    ),
+    "This is the signed payment mandate": "handle_signed_payment_mandate",
+    "Give me the payment method credentials for the given token.": (
+        "handle_get_payment_method_raw_credentials"
+    ),
+}
+
+# Keyword rules for prompts that are not in _PROMPT_ROUTES.
+_KEYWORD_RULES = [
+    (("signed", "payment", "mandate"), "handle_signed_payment_mandate"),
+    (("credentials", "token"), "handle_get_payment_method_raw_credentials"),
+    (("credential", "token"), "handle_create_payment_credential_token"),
+    (("shipping", "address"), "handle_get_shipping_address"),
+    (("payment", "methods"), "handle_search_payment_methods"),
+]
+
 
 class CredentialsProviderExecutor(BaseServerExecutor):
   """AgentExecutor for the credentials provider agent."""
@@ -60,10 +83,25 @@ class CredentialsProviderExecutor(BaseServerExecutor):
     """
 
     agent_tools = [
+        # Tools that check their own DataParts, with a more specific error,
+        # declare none.
         tools.handle_create_payment_credential_token,
-        tools.handle_get_payment_method_raw_credentials,
-        tools.handle_get_shipping_address,
-        tools.handle_search_payment_methods,
-        tools.handle_signed_payment_mandate,
+        ToolSpec(
+            tools.handle_get_payment_method_raw_credentials,
+            data_keys=frozenset({PAYMENT_MANDATE_DATA_KEY}),
+        ),
+        ToolSpec(tools.handle_get_shipping_address, idempotent=True),
+        ToolSpec(tools.handle_search_payment_methods, idempotent=True),
+        ToolSpec(
+            tools.handle_signed_payment_mandate,
+            data_keys=frozenset({PAYMENT_MANDATE_DATA_KEY}),
+            idempotent=True,
+        ),
     ]
-    super().__init__(supported_extensions, agent_tools, self._system_prompt)
+    super().__init__(
+        supported_extensions,
+        agent_tools,
+        self._system_prompt,
+        prompt_routes=_PROMPT_ROUTES,
+        keyword_rules=_KEYWORD_RULES,
+    )
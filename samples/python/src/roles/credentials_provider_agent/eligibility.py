@@ -0,0 +1,135 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Matching of a user's payment methods against what a merchant accepts.
+
+A payment method is eligible if its type is one of the merchant's supported
+methods, and one of its networks is among the networks the merchant accepts
+for that method.
+
+A merchant's PaymentMethodData are compiled once into the set of (type,
+casefolded network) pairs it accepts, and the compiled criteria are cached by
+the hash of their contents, since a merchant sends the same ones with every
+checkout. A wallet is then matched by intersecting that set with the keys of
+the wallet's index in account_manager, without looking at each payment method.
+"""
+
+from collections.abc import Iterable
+from collections.abc import Mapping
+from collections.abc import Sequence
+import hashlib
+import json
+import os
+from typing import Any
+
+from . import account_manager
+from ap2.types.payment_request import PaymentMethodData
+from common import kv_store
+
+
+# The (type, casefolded network) pairs a merchant accepts.
+Criteria = frozenset[tuple[str, str]]
+
+# The maximum number of compiled criteria cached.
+_CRITERIA_CACHE_MAX_ENTRIES = int(
+    os.getenv("ELIGIBILITY_CRITERIA_CACHE_MAX_ENTRIES", "1024")
+)
+
+_compiled_criteria = kv_store.InMemoryKeyValueStore(
+    max_entries=_CRITERIA_CACHE_MAX_ENTRIES
+)
+
+
+def compile_criteria(method_data: Sequence[Mapping[str, Any]]) -> Criteria:
+  """Compiles a merchant's accepted payment methods.
+
+  Args:
+    method_data: The merchant's PaymentMethodData, as dictionaries.
+
+  Returns:
+    The (type, casefolded network) pairs the merchant accepts.
+
+  Raises:
+    ValueError: If an item is not a valid PaymentMethodData.
+  """
+  # Merchants send plain JSON, which the C encoder of json.dumps hashes in a
+  # fraction of the time canonical.digest takes.
+  key = hashlib.sha256(
+      json.dumps(method_data, sort_keys=True).encode("utf-8")
+  ).hexdigest()
+  criteria = _compiled_criteria.get(key)
+  if criteria is None:
+    criteria = frozenset(
+        (data.supported_methods, network.casefold())
+        for data in map(PaymentMethodData.model_validate, method_data)
+        for network in (data.data or {}).get("network", [])
+    )
+    _compiled_criteria.set(key, criteria)
+  return criteria
+
+
+def eligible_payment_methods(
+    email_address: str, criteria: Criteria
+) -> list[dict[str, Any]]:
+  """Returns a user's payment methods that meet a merchant's criteria.
+
+  Args:
+    email_address: The email address of the user's account.
+    criteria: The merchant's compiled criteria.
+
+  Returns:
+    The eligible payment methods, in the order of the user's account.
+  """
+  by_type_and_network = (
+      account_manager.get_account_payment_methods_by_type_and_network(
+          email_address
+      )
+  )
+  matches = by_type_and_network.keys() & criteria
+  if not matches:
+    return []
+  if len(matches) == 1:
+    (match,) = matches
+    return list(by_type_and_network[match])
+  # A payment method with several networks is found under each of them.
+  eligible = {
+      id(payment_method)
+      for match in matches
+      for payment_method in by_type_and_network[match]
+  }
+  return [
+      payment_method
+      for payment_method in account_manager.get_account_payment_methods(
+          email_address
+      )
+      if id(payment_method) in eligible
+  ]
+
+
+def eligible_payment_methods_by_user(
+    email_addresses: Iterable[str], criteria: Criteria
+) -> dict[str, list[dict[str, Any]]]:
+  """Returns the eligible payment methods of several users.
+
+  Args:
+    email_addresses: The email addresses of the users' accounts.
+    criteria: The merchant's compiled criteria.
+
+  Returns:
+    The eligible payment methods of each user, by email address.
+  """
+  return {
+      email_address: eligible_payment_methods(email_address, criteria)
+      for email_address in email_addresses
+  }
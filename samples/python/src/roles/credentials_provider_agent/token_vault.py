@@ -0,0 +1,153 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A vault of payment credential tokens.
+
+A token stands in for one of a user's payment methods. It is issued when the
+shopping agent selects the payment method, bound to a PaymentMandate once the
+user signs it, and exchanged for the payment method's credentials when the
+payment is processed.
+
+Tokens are 128 random bits, so they can neither be guessed nor collide. The
+vault is a common.kv_store store, in process memory or in SQLite when the
+agent's server processes share it, and every token expires: an unbound token
+_UNBOUND_TOKEN_TTL after it is issued, and a bound token _BOUND_TOKEN_TTL
+after it is bound, or when the user's authorization of its PaymentMandate
+expires, if later. The in-memory store is also bounded to _MAX_TOKENS.
+"""
+
+from datetime import timedelta
+import os
+import secrets
+import time
+from typing import Any
+
+from common import kv_store
+
+
+# The prefix of every token, to tell tokens apart from other identifiers.
+_TOKEN_PREFIX = "payment_credential_token_"
+
+# The number of random bytes in a token.
+_TOKEN_BYTES = 16
+
+# How long a token may wait for the user to sign a PaymentMandate.
+_UNBOUND_TOKEN_TTL = timedelta(minutes=30)
+
+# How long a bound token may wait for the payment to be processed, at least.
+_BOUND_TOKEN_TTL = timedelta(minutes=30)
+
+# The maximum number of tokens held in memory.
+_MAX_TOKENS = int(os.getenv("CREDENTIALS_PROVIDER_MAX_TOKENS", "1000000"))
+
+
+def issue(email_address: str, payment_method_alias: str) -> str:
+  """Issues a token for a payment method.
+
+  Args:
+    email_address: The email address of the account.
+    payment_method_alias: The alias of the payment method.
+
+  Returns:
+    The token.
+  """
+  token = _TOKEN_PREFIX + secrets.token_urlsafe(_TOKEN_BYTES)
+  _tokens().set(
+      token,
+      {
+          "email_address": email_address,
+          "payment_method_alias": payment_method_alias,
+          "payment_mandate_id": None,
+      },
+      expires_at=_expiry(_UNBOUND_TOKEN_TTL),
+  )
+  return token
+
+
+def bind(
+    token: str, payment_mandate_id: str, authorized_until: float = 0.0
+) -> None:
+  """Binds a token to a PaymentMandate.
+
+  The token is bound atomically, so that of concurrent requests binding it to
+  different PaymentMandates, exactly one succeeds. Binding a token again to the
+  same PaymentMandate has no effect.
+
+  Args:
+    token: The token.
+    payment_mandate_id: The ID of the PaymentMandate.
+    authorized_until: Until when the user authorizes the PaymentMandate, in
+      seconds since the epoch. A purchase authorized ahead of time, e.g. a
+      standing BuyWhenReady intent, is made until then, so the token is kept
+      until then too.
+
+  Raises:
+    ValueError: If the token is unknown or expired, or bound to another
+      PaymentMandate.
+  """
+
+  def bind_if_unbound(entry: dict[str, Any] | None) -> dict[str, Any]:
+    if entry is None:
+      raise ValueError(f"Token {token} not found")
+    bound_id = entry.get("payment_mandate_id")
+    if bound_id is None:
+      entry["payment_mandate_id"] = payment_mandate_id
+    elif bound_id != payment_mandate_id:
+      raise ValueError(f"Token {token} is bound to another PaymentMandate")
+    return entry
+
+  _tokens().update(
+      token,
+      bind_if_unbound,
+      ttl_seconds=max(
+          _BOUND_TOKEN_TTL.total_seconds(), authorized_until - time.time()
+      ),
+  )
+
+
+def resolve(token: str, payment_mandate_id: str) -> tuple[str, str]:
+  """Returns the payment method a token stands for.
+
+  Args:
+    token: The token.
+    payment_mandate_id: The ID of the PaymentMandate the token must be bound
+      to.
+
+  Returns:
+    The email address of the account and the alias of the payment method.
+
+  Raises:
+    ValueError: If the token is unknown or expired, or not bound to the
+      PaymentMandate.
+  """
+  entry = _tokens().get(token)
+  if not entry or entry.get("payment_mandate_id") != payment_mandate_id:
+    raise ValueError("Invalid token")
+  return entry["email_address"], entry["payment_method_alias"]
+
+
+def stats() -> dict[str, int]:
+  """Returns the hit, miss, eviction and expiration counts of the vault."""
+  return _tokens().stats()
+
+
+def _tokens() -> kv_store.KeyValueStore:
+  """Returns the store of tokens, shared by the agent's server processes."""
+  return kv_store.get_store(
+      "credentials_provider.tokens", max_entries=_MAX_TOKENS
+  )
+
+
+def _expiry(ttl: timedelta) -> float:
+  return time.time() + ttl.total_seconds()
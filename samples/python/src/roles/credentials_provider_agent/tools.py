@@ -26,16 +26,19 @@ from a2a.types import Part
 from a2a.types import Task
 
 from . import account_manager
+from . import eligibility
+from . import token_vault
 from ap2.types.contact_picker import CONTACT_ADDRESS_DATA_KEY
 from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
 from ap2.types.mandate import PaymentMandate
 from ap2.types.payment_request import PAYMENT_METHOD_DATA_DATA_KEY
-from ap2.types.payment_request import PaymentMethodData
 from common import message_utils
+from common import replay_store
+from common import user_authorization
 
 
 async def handle_get_shipping_address(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
@@ -59,7 +62,7 @@ async def handle_get_shipping_address(
 
 
 async def handle_search_payment_methods(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
@@ -89,18 +92,15 @@ async def handle_search_payment_methods(
   if not method_data:
     raise ValueError("method_data is required for search_payment_methods")
 
-  merchant_method_data_list = [
-      PaymentMethodData.model_validate(data) for data in method_data
-  ]
   eligible_aliases = _get_eligible_payment_method_aliases(
-      user_email, merchant_method_data_list
+      user_email, eligibility.compile_criteria(method_data)
   )
   await updater.add_artifact([Part(root=DataPart(data=eligible_aliases))])
   await updater.complete()
 
 
 async def handle_get_payment_method_raw_credentials(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
@@ -114,16 +114,35 @@ async def handle_get_payment_method_raw_credentials(
     current_task: The current task if there is one.
   """
 
-  payment_mandate_contents = message_utils.parse_canonical_object(
+  payment_mandate = message_utils.parse_canonical_object(
       PAYMENT_MANDATE_DATA_KEY, data_parts, PaymentMandate
-  ).payment_mandate_contents
+  )
+  payment_mandate_contents = payment_mandate.payment_mandate_contents
 
   token = payment_mandate_contents.payment_response.details.get(
       "token", {}
   ).get("value", "")
   payment_mandate_id = payment_mandate_contents.payment_mandate_id
 
-  payment_method = account_manager.verify_token(token, payment_mandate_id)
+  # The token is checked first, so that a request with an invalid token
+  # cannot use up the PaymentMandate's ID.
+  email_address, alias = token_vault.resolve(token, payment_mandate_id)
+
+  # The credentials are released once per PaymentMandate. Its ID is recorded
+  # for as long as the user's authorization of it is accepted.
+  if not replay_store.get_store(
+      "credentials_provider.payment_mandate_ids"
+  ).add(
+      payment_mandate_id,
+      user_authorization.expiry_of(payment_mandate.user_authorization),
+  ):
+    raise ValueError(
+        f"Credentials already released for PaymentMandate: {payment_mandate_id}"
+    )
+
+  payment_method = account_manager.get_payment_method_by_alias(
+      email_address, alias
+  )
   if not payment_method:
     raise ValueError(f"Payment method not found for token: {token}")
   await updater.add_artifact([Part(root=DataPart(data=payment_method))])
@@ -131,7 +150,7 @@ async def handle_get_payment_method_raw_credentials(
 
 
 async def handle_create_payment_credential_token(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
@@ -155,7 +174,7 @@ async def handle_create_payment_credential_token(
         " create_payment_credential_token"
     )
 
-  tokenized_payment_method = account_manager.create_token(
+  tokenized_payment_method = token_vault.issue(
       user_email, payment_method_alias
   )
 
@@ -166,7 +185,7 @@ async def handle_create_payment_credential_token(
 
 
 async def handle_signed_payment_mandate(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
@@ -189,7 +208,11 @@ async def handle_signed_payment_mandate(
   payment_mandate_id = (
       payment_mandate.payment_mandate_contents.payment_mandate_id
   )
-  account_manager.update_token(token, payment_mandate_id)
+  token_vault.bind(
+      token,
+      payment_mandate_id,
+      user_authorization.expiry_of(payment_mandate.user_authorization),
+  )
   await updater.complete()
 
 
@@ -201,60 +224,19 @@ def _get_payment_method_aliases(
 
 
 def _get_eligible_payment_method_aliases(
-    user_email: str, merchant_accepted_payment_methods: list[PaymentMethodData]
+    user_email: str, criteria: eligibility.Criteria
 ) -> dict[str, list[str | None]]:
-  """Gets the payment_methods eligible according to given PaymentMethodData.
+  """Gets the payment_methods eligible according to the merchant's criteria.
 
   Args:
     user_email: The email address of the user's account.
-    merchant_accepted_payment_methods: A list of eligible payment method
-      criteria.
+    criteria: The merchant's accepted payment methods, compiled.
 
   Returns:
     A list of the user's eligible payment_methods.
   """
-  payment_methods = account_manager.get_account_payment_methods(user_email)
-  eligible_payment_methods = []
-
-  for payment_method in payment_methods:
-    for criteria in merchant_accepted_payment_methods:
-      if _payment_method_is_eligible(payment_method, criteria):
-        eligible_payment_methods.append(payment_method)
-        break
   return {
       "payment_method_aliases": _get_payment_method_aliases(
-          eligible_payment_methods
+          eligibility.eligible_payment_methods(user_email, criteria)
       )
   }
-
-
-def _payment_method_is_eligible(
-    payment_method: dict[str, Any], merchant_criteria: PaymentMethodData
-) -> bool:
-  """Checks if a payment method is eligible based on a PaymentMethodData.
-
-  Args:
-    payment_method: A dictionary representing the payment method.
-    merchant_criteria: A PaymentMethodData object containing the eligibility
-      criteria.
-
-  Returns:
-    True if the payment_method is eligible according to the payment method,
-    False otherwise.
-  """
-  if payment_method.get("type", "") != merchant_criteria.supported_methods:
-    return False
-
-  merchant_supported_networks = [
-      network.casefold()
-      for network in merchant_criteria.data.get("network", [])
-  ]
-  if not merchant_supported_networks:
-    return False
-
-  payment_card_networks = payment_method.get("network", [])
-  for network_info in payment_card_networks:
-    for supported_network in merchant_supported_networks:
-      if network_info.get("name", "").casefold() == supported_network:
-        return True
-  return False
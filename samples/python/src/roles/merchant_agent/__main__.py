@@ -18,6 +18,8 @@ from collections.abc import Sequence
 
 from absl import app
 
+from roles.merchant_agent import merchant_authorization
+from roles.merchant_agent import tools
 from roles.merchant_agent.agent_executor import MerchantAgentExecutor
 from common import server
 
@@ -30,6 +32,7 @@ def main(argv: Sequence[str]) -> None:
       agent_card=agent_card,
       executor=MerchantAgentExecutor(agent_card.capabilities.extensions),
       rpc_url="/a2a/merchant_agent",
+      startup_hooks=[tools.warm_up, merchant_authorization.warm_up],
   )
 
 if __name__ == "__main__":
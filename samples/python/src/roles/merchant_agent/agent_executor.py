@@ -37,11 +37,14 @@ from a2a.types import Part
 from a2a.types import Task
 from a2a.types import TextPart
 
+from . import merchant_authorization
 from . import tools
 from .sub_agents import catalog_agent
+from ap2.types.mandate import INTENT_MANDATE_DATA_KEY
 from common import message_utils
 from common.base_server_executor import BaseServerExecutor
 from common.system_utils import DEBUG_MODE_INSTRUCTIONS
+from common.tool_registry import ToolSpec
 
 
 # A list of known Shopping Agent identifiers that this Merchant is willing to
@@ -50,6 +53,24 @@ _KNOWN_SHOPPING_AGENTS = [
     "trusted_shopping_agent",
 ]
 
+# Prompts sent by known Shopping Agents, mapped to the tool that handles them.
+_PROMPT_ROUTES = {
+    "Find products that match the user's IntentMandate.": (
+        "find_items_workflow"
+    ),
+    "Update the cart with the user's shipping address.": "update_cart",
+    "Initiate a payment": "initiate_payment",
+    "Initiate a payment. Include the challenge response.": "initiate_payment",
+}
+
+# Keyword rules for prompts that are not in _PROMPT_ROUTES.
+_KEYWORD_RULES = [
+    (("find", "products"), "find_items_workflow"),
+    (("update", "cart"), "update_cart"),
+    (("dpc",), "dpc_finish"),
+    (("initiate", "payment"), "initiate_payment"),
+]
+
 class MerchantAgentExecutor(BaseServerExecutor):
   """AgentExecutor for the merchant agent."""
 
@@ -70,17 +91,29 @@ class MerchantAgentExecutor(BaseServerExecutor):
           agent.
     """
     agent_tools = [
+        # update_cart, initiate_payment and dpc_finish report their own
+        # missing DataParts, so they declare none.
         tools.update_cart,
-        catalog_agent.find_items_workflow,
+        ToolSpec(
+            catalog_agent.find_items_workflow,
+            data_keys=frozenset({INTENT_MANDATE_DATA_KEY}),
+        ),
         tools.initiate_payment,
         tools.dpc_finish,
     ]
-    super().__init__(supported_extensions, agent_tools, self._system_prompt)
+    super().__init__(
+        supported_extensions,
+        agent_tools,
+        self._system_prompt,
+        prompt_routes=_PROMPT_ROUTES,
+        keyword_rules=_KEYWORD_RULES,
+        audience=merchant_authorization.MERCHANT_NAME,
+    )
 
   async def _handle_request(
       self,
       text_parts: list[str],
-      data_parts: list[dict[str, Any]],
+      data_parts: message_utils.DataPartIndex,
       updater: TaskUpdater,
       current_task: Task | None,
   ) -> None:
@@ -96,7 +129,7 @@ class MerchantAgentExecutor(BaseServerExecutor):
     await super()._handle_request(text_parts, data_parts, updater, current_task)
 
   async def _validate_shopping_agent(
-      self, data_parts: list[dict[str, Any]], updater: TaskUpdater
+      self, data_parts: message_utils.DataPartIndex, updater: TaskUpdater
   ) -> None:
     """Validates that the incoming request is from a trusted Shopping Agent.
 
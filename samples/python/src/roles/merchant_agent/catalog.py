@@ -0,0 +1,381 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The merchant's catalog of products, and its search index.
+
+Products are loaded from a JSONL file, one product per line, or from the
+`products` table of a SQLite database. The MERCHANT_CATALOG_PATH environment
+variable selects the file; it defaults to the sample catalog.jsonl next to
+this module, and an empty value disables the catalog.
+
+The catalog is indexed in memory, and indexed again in the background
+whenever its file changes, e.g. with new prices: the SKU, price and refund
+period of each product are kept in columns, for the hard filters of a search,
+and the words of each product's label and description in an inverted index.
+A search ranks the products matching its words by BM25, with the label
+weighted twice. The BM25 term weights of each posting are computed when the
+index is built, so a search only adds them up for the postings of its words.
+"""
+
+import asyncio
+import collections
+from collections.abc import Iterable
+from collections.abc import Sequence
+import dataclasses
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+
+from ap2.types.payment_request import Money
+from ap2.types.payment_request import PaymentItem
+from common import single_flight
+
+
+_DEFAULT_CATALOG_PATH = os.path.join(
+    os.path.dirname(__file__), "catalog.jsonl"
+)
+
+# The BM25 parameters: term frequency saturation, and length normalization.
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+# The share of a query's words, weighted by their IDF, that a product must
+# match to be found. Keeps a product from matching on a single common word.
+_MIN_QUERY_COVERAGE = 0.5
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+_STOP_WORDS = frozenset({
+    "a", "an", "and", "any", "for", "i", "in", "is", "like", "looking",
+    "me", "my", "of", "on", "or", "pair", "some", "that", "the", "to",
+    "want", "with",
+})
+
+
+@dataclasses.dataclass(frozen=True)
+class Product:
+  """A product of the catalog.
+
+  Attributes:
+    sku: The SKU of the product.
+    label: The name of the product, shown to the user.
+    description: A description of the product.
+    price: The price of the product.
+    refund_period: The refund period of the product, in days. 0 if it cannot
+      be refunded.
+  """
+
+  sku: str
+  label: str
+  description: str
+  price: Money
+  refund_period: int
+
+  def to_payment_item(self) -> PaymentItem:
+    """Returns the product as an item of a PaymentRequest."""
+    return PaymentItem(
+        label=self.label,
+        amount=self.price.to_amount(),
+        refund_period=self.refund_period,
+    )
+
+
+class CatalogIndex:
+  """An immutable search index of products."""
+
+  def __init__(self, products: Iterable[Product]):
+    """Initialization.
+
+    Args:
+      products: The products.
+
+    Raises:
+      ValueError: If several products have the same SKU.
+    """
+    self._products: list[Product] = []
+    self._ids_by_sku: dict[str, int] = {}
+    for product in products:
+      if product.sku in self._ids_by_sku:
+        raise ValueError(f"Duplicate SKU in catalog: {product.sku}")
+      self._ids_by_sku[product.sku] = len(self._products)
+      self._products.append(product)
+    # The columns used by the hard filters.
+    self._refund_periods = [p.refund_period for p in self._products]
+
+    term_frequencies = [
+        collections.Counter(
+            _tokenize(product.label) * 2 + _tokenize(product.description)
+        )
+        for product in self._products
+    ]
+    lengths = [sum(counts.values()) for counts in term_frequencies]
+    average_length = sum(lengths) / len(lengths) if lengths else 1.0
+    # (product ID, BM25 term weight) of each product containing a word.
+    self._postings: dict[str, list[tuple[int, float]]] = (
+        collections.defaultdict(list)
+    )
+    for product_id, counts in enumerate(term_frequencies):
+      length_norm = 1 - _BM25_B + _BM25_B * lengths[product_id] / average_length
+      for word, frequency in counts.items():
+        self._postings[word].append((
+            product_id,
+            frequency * (_BM25_K1 + 1) / (frequency + _BM25_K1 * length_norm),
+        ))
+    self._postings = dict(self._postings)
+    self.version = _version_of(self._products)
+
+  def __len__(self) -> int:
+    return len(self._products)
+
+  def get(self, sku: str) -> Product | None:
+    """Returns the product with the given SKU, if any."""
+    product_id = self._ids_by_sku.get(sku)
+    return None if product_id is None else self._products[product_id]
+
+  def search(
+      self,
+      query: str,
+      skus: Sequence[str] | None = None,
+      requires_refundability: bool = False,
+      limit: int = 3,
+  ) -> list[Product]:
+    """Returns the products that best match a query.
+
+    Args:
+      query: The description of what the user is looking for.
+      skus: If set, only these SKUs may be returned. If none of them matches
+        the query, they are returned regardless, as the user asked for them.
+      requires_refundability: Whether to only return products that can be
+        refunded.
+      limit: The maximum number of products to return.
+
+    Returns:
+      The matching products, the best match first.
+    """
+    allowed_ids = None
+    if skus:
+      allowed_ids = {
+          self._ids_by_sku[sku] for sku in skus if sku in self._ids_by_sku
+      }
+    words = set(_tokenize(query))
+    idfs = {word: self._idf(word) for word in words}
+    scores = collections.defaultdict(float)
+    coverages = collections.defaultdict(float)
+    for word in words:
+      idf = idfs[word]
+      for product_id, weight in self._postings.get(word, ()):
+        scores[product_id] += idf * weight
+        coverages[product_id] += idf
+    min_coverage = _MIN_QUERY_COVERAGE * sum(idfs.values())
+    matches = [
+        product_id
+        for product_id, coverage in coverages.items()
+        if coverage >= min_coverage
+        and self._passes_filters(
+            product_id, allowed_ids, requires_refundability
+        )
+    ]
+    if not matches and allowed_ids:
+      matches = [
+          product_id
+          for product_id in allowed_ids
+          if self._passes_filters(
+              product_id, allowed_ids, requires_refundability
+          )
+      ]
+    best = heapq.nsmallest(
+        limit,
+        matches,
+        key=lambda product_id: (-scores.get(product_id, 0.0), product_id),
+    )
+    return [self._products[product_id] for product_id in best]
+
+  def _passes_filters(
+      self,
+      product_id: int,
+      allowed_ids: set[int] | None,
+      requires_refundability: bool,
+  ) -> bool:
+    if allowed_ids is not None and product_id not in allowed_ids:
+      return False
+    return not requires_refundability or self._refund_periods[product_id] > 0
+
+  def _idf(self, word: str) -> float:
+    """Returns the BM25 inverse document frequency of a word."""
+    document_frequency = len(self._postings.get(word, ()))
+    return math.log(
+        1
+        + (len(self._products) - document_frequency + 0.5)
+        / (document_frequency + 0.5)
+    )
+
+
+def load_products(path: str) -> list[Product]:
+  """Loads the products of a JSONL file or SQLite database.
+
+  A JSONL file has one JSON object per line, with the sku, label,
+  description, price (a PaymentCurrencyAmount) and refund_period of a product.
+  A SQLite database has a `products` table with the columns sku, label,
+  description, currency, price and refund_period.
+
+  Args:
+    path: The path of the file; a .jsonl file, or a SQLite database.
+
+  Returns:
+    The products.
+  """
+  if path.endswith(".jsonl"):
+    with open(path, encoding="utf-8") as f:
+      rows = [json.loads(line) for line in f if line.strip()]
+    return [
+        Product(
+            sku=row["sku"],
+            label=row["label"],
+            description=row.get("description", ""),
+            price=Money.model_validate(row["price"]),
+            refund_period=int(row.get("refund_period", 30)),
+        )
+        for row in rows
+    ]
+  with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as db:
+    rows = db.execute(
+        "SELECT sku, label, description, currency, price, refund_period"
+        " FROM products"
+    ).fetchall()
+  return [
+      Product(
+          sku=sku,
+          label=label,
+          description=description or "",
+          price=Money(currency=currency, value=price),
+          refund_period=int(refund_period),
+      )
+      for sku, label, description, currency, price, refund_period in rows
+  ]
+
+
+async def get_catalog() -> CatalogIndex | None:
+  """Returns the merchant's catalog, or None if it is disabled.
+
+  The catalog is indexed in a worker thread, so that the event loop keeps
+  serving requests meanwhile, and only the first call waits for it. When the
+  catalog's file changes, it is indexed again in the background, and the
+  previous index is returned until the new one is ready. The version of the
+  new index differs if any of its products changed.
+  """
+  global _latest_source, _background_indexing
+  path = os.getenv("MERCHANT_CATALOG_PATH", _DEFAULT_CATALOG_PATH)
+  if not path:
+    return None
+  source = (path, _modification_time(path))
+  _latest_source = source
+  if _catalog is None or _catalog_source[0] != path:
+    await _indexing.do(source, lambda: _index(source))
+  elif source != _catalog_source and _background_indexing is None:
+    _background_indexing = asyncio.ensure_future(
+        _indexing.do(source, lambda: _index(source))
+    )
+    _background_indexing.add_done_callback(_on_background_indexing_done)
+  return _catalog
+
+
+def normalize_query(query: str) -> str:
+  """Returns a query's words, as a search sees them, in a canonical order.
+
+  Queries with the same normalized form have the same search results.
+  """
+  return " ".join(sorted(set(_tokenize(query))))
+
+
+_catalog: CatalogIndex | None = None
+
+# The path and modification time of the file _catalog was indexed from.
+_catalog_source: tuple[str, float] | None = None
+
+# The path and modification time of the file when last checked.
+_latest_source: tuple[str, float] | None = None
+
+_indexing = single_flight.SingleFlight()
+
+_background_indexing: asyncio.Future | None = None
+
+
+def _modification_time(path: str) -> float:
+  """Returns when a catalog file was last modified."""
+  # Writes to a SQLite database may only be in its write-ahead log yet.
+  return max(
+      os.stat(file).st_mtime
+      for file in (path, f"{path}-wal")
+      if file == path or os.path.exists(file)
+  )
+
+
+async def _index(source: tuple[str, float]) -> None:
+  """Indexes a catalog file, and serves the index if it is still current."""
+  global _catalog, _catalog_source
+  path, _ = source
+  index = await asyncio.to_thread(lambda: CatalogIndex(load_products(path)))
+  # A file modified again meanwhile is indexed by a later call, unless no
+  # index of the file is served yet.
+  if (
+      _catalog is None
+      or _catalog_source[0] != path
+      or source == _latest_source
+  ):
+    _catalog = index
+    _catalog_source = source
+
+
+def _on_background_indexing_done(future: asyncio.Future) -> None:
+  global _background_indexing
+  _background_indexing = None
+  if not future.cancelled() and future.exception() is not None:
+    logging.warning(
+        "Failed to index the catalog again, serving the previous index: %s",
+        future.exception(),
+    )
+
+
+def _tokenize(text: str) -> list[str]:
+  """Returns the words of a text, lowercased and without plural endings."""
+  words = []
+  for word in _WORD_PATTERN.findall(text.casefold()):
+    if word in _STOP_WORDS:
+      continue
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+      word = word[:-1]
+    words.append(word)
+  return words
+
+
+def _version_of(products: Sequence[Product]) -> str:
+  """Returns a digest of the products, which changes with any of them."""
+  digest = hashlib.sha256()
+  for product in products:
+    digest.update(
+        json.dumps([
+            product.sku,
+            product.label,
+            product.description,
+            product.price.currency,
+            product.price.minor_units,
+            product.refund_period,
+        ]).encode("utf-8")
+    )
+  return digest.hexdigest()
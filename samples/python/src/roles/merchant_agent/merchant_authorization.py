@@ -0,0 +1,102 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Signing of CartMandates by the merchant.
+
+The merchant_authorization of a CartMandate is an ES256 JWT whose cart_hash
+claim is the hash of the canonical JSON of the cart's contents.
+
+The merchant's signing keys are read from the MERCHANT_SIGNING_KEY_DIR
+directory, as <kid>.pem files, and MERCHANT_SIGNING_KEY_ID selects the active
+key. If the directory holds no key, one is generated and stored there, so
+that all the workers of the agent sign with it.
+
+The public keys are published in the same directory, as jwks.json, where the
+shopping agent reads them to verify the carts; see common.validation.
+"""
+
+from collections.abc import Sequence
+import functools
+import logging
+import os
+import time
+
+from ap2.types import canonical
+from ap2.types.mandate import CartMandate
+from common import id_utils
+from common import jwt_signing
+
+
+# The issuer and subject of the merchant's JWTs.
+MERCHANT_ID = "merchant_agent"
+
+# The merchant's name, as in its CartMandates. The user authorizations of its
+# payments are intended for it.
+MERCHANT_NAME = "Generic Merchant"
+
+# The intended recipient of the merchant's JWTs.
+_AUDIENCE = "merchant_payment_processor_agent"
+
+# The directory of the merchant's signing keys, and of its published JWKS.
+KEY_DIR = os.getenv("MERCHANT_SIGNING_KEY_DIR", ".state/merchant_signing_keys")
+
+# How long a merchant authorization is valid.
+_TOKEN_LIFETIME_SECONDS = 15 * 60
+
+
+async def sign_cart_mandates(cart_mandates: Sequence[CartMandate]) -> None:
+  """Sets the merchant_authorization of CartMandates.
+
+  The carts are signed together, in a single call to the signer.
+
+  Args:
+    cart_mandates: The CartMandates to sign.
+  """
+  issued_at = int(time.time())
+  claims = [
+      {
+          "iss": MERCHANT_ID,
+          "sub": MERCHANT_ID,
+          "aud": _AUDIENCE,
+          "iat": issued_at,
+          "exp": issued_at + _TOKEN_LIFETIME_SECONDS,
+          "jti": id_utils.new_ulid(),
+          "cart_hash": canonical.digest(cart_mandate.contents),
+      }
+      for cart_mandate in cart_mandates
+  ]
+  tokens = await get_signer().sign_many(claims)
+  for cart_mandate, token in zip(cart_mandates, tokens, strict=True):
+    cart_mandate.merchant_authorization = token
+
+
+async def warm_up() -> None:
+  """Starts the signer, so that the first cart is signed without delay."""
+  await get_signer().sign({})
+
+
+@functools.cache
+def get_signer() -> jwt_signing.JwtSigner:
+  """Returns the signer of the merchant's JWTs, loading its keys once.
+
+  The public keys are (re)published alongside the keys.
+  """
+  key_ring = jwt_signing.KeyRing.from_directory_or_generate(
+      KEY_DIR, os.getenv("MERCHANT_SIGNING_KEY_ID")
+  )
+  try:
+    key_ring.publish_jwks(os.path.join(KEY_DIR, "jwks.json"))
+  except OSError as e:
+    logging.warning("Could not publish the merchant's JWKS: %s", e)
+  return jwt_signing.JwtSigner(key_ring)
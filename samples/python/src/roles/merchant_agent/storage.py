@@ -12,36 +12,88 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""In-memory storage for CartMandates.
+"""Storage for CartMandates.
 
 A CartMandate may be updated multiple times during the course of a shopping
 journey. This storage system is used to persist CartMandates between
 interactions between the shopper and merchant agents.
+
+The data is kept in common.kv_store stores, so that it is shared by all the
+merchant agent's server processes. CartMandates and risk data have separate
+namespaces, and CartMandates are scoped by the context ID of the shopping
+session that created them. A CartMandate is removed once its cart expires,
+risk data after _RISK_DATA_TTL, and each namespace keeps at most _MAX_ENTRIES
+values in memory, evicting the least recently used.
 """
 
-from typing import Optional
+from datetime import timedelta
+import os
+import time
+from typing import Any, Optional
 
 from ap2.types.mandate import CartMandate
+from common import kv_store
+from common import time_utils
+
+
+# The maximum number of values kept in memory per namespace.
+_MAX_ENTRIES = int(os.getenv("MERCHANT_STORAGE_MAX_ENTRIES", "10000"))
 
+# How long risk data is kept. Matches the lifetime of the carts it is
+# collected with.
+_RISK_DATA_TTL = timedelta(minutes=30)
 
-def get_cart_mandate(cart_id: str) -> Optional[CartMandate]:
-  """Get a cart mandate by cart ID."""
-  return _store.get(cart_id)
 
+def get_cart_mandate(context_id: str, cart_id: str) -> Optional[CartMandate]:
+  """Get a cart mandate by cart ID, within a context."""
+  cart_mandate = _carts().get(_cart_key(context_id, cart_id))
+  if cart_mandate is None:
+    return None
+  return CartMandate.model_validate(cart_mandate)
 
-def set_cart_mandate(cart_id: str, cart_mandate: CartMandate) -> None:
-  """Set a cart mandate by cart ID."""
-  _store[cart_id] = cart_mandate
+
+def set_cart_mandate(
+    context_id: str, cart_id: str, cart_mandate: CartMandate
+) -> None:
+  """Set a cart mandate by cart ID within a context, until the cart expires."""
+  _carts().set(
+      _cart_key(context_id, cart_id),
+      cart_mandate.model_dump(mode="json"),
+      expires_at=time_utils.parse_timestamp(cart_mandate.contents.cart_expiry),
+  )
 
 
 def set_risk_data(context_id: str, risk_data: str) -> None:
   """Set risk data by context ID."""
-  _store[context_id] = risk_data
+  _risk_data().set(
+      context_id,
+      risk_data,
+      expires_at=time.time() + _RISK_DATA_TTL.total_seconds(),
+  )
 
 
 def get_risk_data(context_id: str) -> Optional[str]:
   """Get risk data by context ID."""
-  return _store.get(context_id)
+  return _risk_data().get(context_id)
+
+
+def stats() -> dict[str, dict[str, Any]]:
+  """Returns the hit, miss, eviction and expiration counts per namespace."""
+  return {"carts": _carts().stats(), "risk_data": _risk_data().stats()}
+
+
+def _carts() -> kv_store.KeyValueStore:
+  return kv_store.get_store("merchant_agent.carts", max_entries=_MAX_ENTRIES)
+
+
+def _risk_data() -> kv_store.KeyValueStore:
+  return kv_store.get_store(
+      "merchant_agent.risk_data", max_entries=_MAX_ENTRIES
+  )
+
 
+def _cart_key(context_id: str, cart_id: str) -> str:
+  # Carts are only visible within the context (i.e. shopping session) that
+  # created them.
+  return f"{context_id}/{cart_id}"
 
-_store = {}
@@ -12,15 +12,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""A sub-agent that offers items from its 'catalog'.
+"""A sub-agent that offers items from its catalog.
 
-This agent fabricates catalog content based on the user's request.
+Items are searched for in the merchant's catalog, honoring the SKUs and the
+refundability the IntentMandate requires. If the catalog is disabled or has no
+matching item, and the IntentMandate does not restrict SKUs, the LLM
+fabricates items based on the user's request, unless
+MERCHANT_CATALOG_LLM_FALLBACK is false.
+
+The items found for an IntentMandate are cached, keyed by a digest of the
+fields that determine them: the normalized description, the SKUs, the
+merchants and the refundability, along with the catalog's version, so that
+the results of a previous catalog or of previous prices are never served.
+Concurrent identical searches share a single computation.
 """
 
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
-from typing import Any
+import functools
+import os
+import time
 
 from a2a.server.tasks.task_updater import TaskUpdater
 from a2a.types import DataPart
@@ -30,7 +42,10 @@ from a2a.types import TextPart
 from google import genai
 from pydantic import ValidationError
 
+from .. import catalog
+from .. import merchant_authorization
 from .. import storage
+from ap2.types import canonical
 from ap2.types.mandate import CART_MANDATE_DATA_KEY
 from ap2.types.mandate import CartContents
 from ap2.types.mandate import CartMandate
@@ -41,21 +56,150 @@ from ap2.types.payment_request import PaymentItem
 from ap2.types.payment_request import PaymentMethodData
 from ap2.types.payment_request import PaymentOptions
 from ap2.types.payment_request import PaymentRequest
+from common import id_utils
+from common import kv_store
+from common import llm_utils
 from common import message_utils
+from common import single_flight
 from common.system_utils import DEBUG_MODE_INSTRUCTIONS
 
+# Whether the LLM fabricates items when the catalog has none.
+_LLM_FALLBACK = (
+    os.getenv("MERCHANT_CATALOG_LLM_FALLBACK", "true").lower() == "true"
+)
+
+# The number of items offered for a search.
+_MAX_ITEMS = 3
+
+# How long the items found for an IntentMandate are cached.
+_RESULTS_CACHE_TTL_SECONDS = float(
+    os.getenv("MERCHANT_CATALOG_CACHE_TTL_SECONDS", "300")
+)
+
+# The maximum number of cached searches.
+_RESULTS_CACHE_MAX_ENTRIES = int(
+    os.getenv("MERCHANT_CATALOG_CACHE_MAX_ENTRIES", "10000")
+)
+
+_results = kv_store.InMemoryKeyValueStore(
+    max_entries=_RESULTS_CACHE_MAX_ENTRIES
+)
+
+# Concurrent requests for the same items share one search.
+_searches = single_flight.SingleFlight()
+
 
 async def find_items_workflow(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
   """Finds products that match the user's IntentMandate."""
-  llm_client = genai.Client()
-
   intent_mandate = message_utils.parse_canonical_object(
       INTENT_MANDATE_DATA_KEY, data_parts, IntentMandate
   )
+  try:
+    items = await _find_items(intent_mandate)
+  except TimeoutError as e:
+    error_message = updater.new_agent_message(
+        parts=[Part(root=TextPart(text=f"Catalog search failed: {e}"))]
+    )
+    await updater.failed(message=error_message)
+    return
+  if not items:
+    error_message = updater.new_agent_message(
+        parts=[Part(root=TextPart(text="No items match the IntentMandate."))]
+    )
+    await updater.failed(message=error_message)
+    return
+
+  try:
+    current_time = datetime.now(timezone.utc)
+    cart_mandates = [_create_cart_mandate(item, current_time) for item in items]
+    await merchant_authorization.sign_cart_mandates(cart_mandates)
+    for cart_mandate in cart_mandates:
+      await _store_and_add_cart_mandate_artifact(cart_mandate, updater)
+    risk_data = _collect_risk_data(updater)
+    updater.add_artifact([
+        Part(root=DataPart(data={"risk_data": risk_data})),
+    ])
+    await updater.complete()
+  except ValidationError as e:
+    error_message = updater.new_agent_message(
+        parts=[Part(root=TextPart(text=f"Invalid CartMandate list: {e}"))]
+    )
+    await updater.failed(message=error_message)
+    return
+
+
+async def _find_items(intent_mandate: IntentMandate) -> list[PaymentItem]:
+  """Returns the items matching an IntentMandate, from the cache if possible.
+
+  Raises:
+    TimeoutError: If the LLM is asked for items, and does not answer in time.
+  """
+  merchant_catalog = await catalog.get_catalog()
+  cache_key = canonical.digest({
+      "description": catalog.normalize_query(
+          intent_mandate.natural_language_description
+      ),
+      "skus": sorted(intent_mandate.skus or []),
+      "merchants": sorted(
+          merchant.casefold() for merchant in intent_mandate.merchants or []
+      ),
+      "requires_refundability": bool(intent_mandate.requires_refundability),
+      "catalog_version": merchant_catalog and merchant_catalog.version,
+  })
+  items = _results.get(cache_key)
+  if items is None:
+    items = await _searches.do(
+        cache_key,
+        lambda: _search_and_cache(intent_mandate, merchant_catalog, cache_key),
+    )
+  return [PaymentItem.model_validate(item) for item in items]
+
+
+async def _search_and_cache(
+    intent_mandate: IntentMandate,
+    merchant_catalog: catalog.CatalogIndex | None,
+    cache_key: str,
+) -> list[dict]:
+  """Searches for the items matching an IntentMandate, and caches them."""
+  items = _search_catalog(intent_mandate, merchant_catalog)
+  if not items and _LLM_FALLBACK and not intent_mandate.skus:
+    items = await _generate_items(intent_mandate)
+  # Items are cached as dictionaries, so that the carts of different
+  # requests never share them.
+  items = [item.model_dump() for item in items]
+  if items:
+    _results.set(
+        cache_key, items, expires_at=time.time() + _RESULTS_CACHE_TTL_SECONDS
+    )
+  return items
+
+
+def _search_catalog(
+    intent_mandate: IntentMandate,
+    merchant_catalog: catalog.CatalogIndex | None,
+) -> list[PaymentItem]:
+  """Returns the catalog's items matching an IntentMandate."""
+  if merchant_catalog is None:
+    return []
+  products = merchant_catalog.search(
+      intent_mandate.natural_language_description,
+      skus=intent_mandate.skus,
+      requires_refundability=bool(intent_mandate.requires_refundability),
+      limit=_MAX_ITEMS,
+  )
+  return [product.to_payment_item() for product in products]
+
+
+async def _generate_items(intent_mandate: IntentMandate) -> list[PaymentItem]:
+  """Has the LLM fabricate items matching an IntentMandate.
+
+  Raises:
+    TimeoutError: If the LLM does not answer in time.
+  """
   intent = intent_mandate.natural_language_description
   prompt = f"""
         Based on the user's request for '{intent}', your task is to generate 3
@@ -66,44 +210,30 @@ async def find_items_workflow(
     %s
         """ % DEBUG_MODE_INSTRUCTIONS
 
-  llm_response = llm_client.models.generate_content(
-      model="gemini-2.5-flash",
+  llm_response = await llm_utils.generate_content(
+      _get_llm_client(),
       contents=prompt,
       config={
           "response_mime_type": "application/json",
           "response_schema": list[PaymentItem],
-      }
+      },
   )
-  try:
-    items: list[PaymentItem] = llm_response.parsed
+  items: list[PaymentItem] = llm_response.parsed or []
+  if intent_mandate.requires_refundability:
+    items = [item for item in items if item.refund_period > 0]
+  return items
 
-    current_time = datetime.now(timezone.utc)
-    item_count = 0
-    for item in items:
-      item_count += 1
-      await _create_and_add_cart_mandate_artifact(
-          item, item_count, current_time, updater
-      )
-    risk_data = _collect_risk_data(updater)
-    updater.add_artifact([
-        Part(root=DataPart(data={"risk_data": risk_data})),
-    ])
-    await updater.complete()
-  except ValidationError as e:
-    error_message = updater.new_agent_message(
-        parts=[Part(root=TextPart(text=f"Invalid CartMandate list: {e}"))]
-    )
-    await updater.failed(message=error_message)
-    return
 
+@functools.cache
+def _get_llm_client() -> genai.Client:
+  """Returns the LLM client, shared by all requests."""
+  return genai.Client()
 
-async def _create_and_add_cart_mandate_artifact(
-    item: PaymentItem,
-    item_count: int,
-    current_time: datetime,
-    updater: TaskUpdater,
-) -> None:
-  """Creates a CartMandate and adds it as an artifact."""
+
+def _create_cart_mandate(
+    item: PaymentItem, current_time: datetime
+) -> CartMandate:
+  """Creates an unsigned CartMandate for an item."""
   payment_request = PaymentRequest(
       method_data=[
           PaymentMethodData(
@@ -114,7 +244,7 @@ async def _create_and_add_cart_mandate_artifact(
           )
       ],
       details=PaymentDetailsInit(
-          id=f"order_{item_count}",
+          id=f"order_{id_utils.new_ulid()}",
           display_items=[item],
           total=PaymentItem(
               label="Total",
@@ -125,16 +255,23 @@ async def _create_and_add_cart_mandate_artifact(
   )
 
   cart_contents = CartContents(
-      id=f"cart_{item_count}",
+      id=f"cart_{id_utils.new_ulid()}",
       user_cart_confirmation_required=True,
       payment_request=payment_request,
       cart_expiry=(current_time + timedelta(minutes=30)).isoformat(),
-      merchant_name="Generic Merchant",
+      merchant_name=merchant_authorization.MERCHANT_NAME,
   )
 
-  cart_mandate = CartMandate(contents=cart_contents)
+  return CartMandate(contents=cart_contents)
+
 
-  storage.set_cart_mandate(cart_mandate.contents.id, cart_mandate)
+async def _store_and_add_cart_mandate_artifact(
+    cart_mandate: CartMandate, updater: TaskUpdater
+) -> None:
+  """Stores a CartMandate and adds it as an artifact."""
+  storage.set_cart_mandate(
+      updater.context_id, cart_mandate.contents.id, cart_mandate
+  )
   await updater.add_artifact([
       Part(
           root=DataPart(data={CART_MANDATE_DATA_KEY: cart_mandate.model_dump()})
@@ -22,15 +22,14 @@ import base64
 import json
 import logging
 
-from pydantic import ValidationError
-from typing import Any
-
+from a2a.client.errors import A2AClientError
 from a2a.server.tasks.task_updater import TaskUpdater
 from a2a.types import DataPart
 from a2a.types import Part
 from a2a.types import Task
 from a2a.types import TextPart
 
+from . import merchant_authorization
 from . import storage
 from ap2.types.contact_picker import ContactAddress
 from ap2.types.mandate import CART_MANDATE_DATA_KEY
@@ -38,10 +37,13 @@ from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
 from ap2.types.mandate import PaymentMandate
 from ap2.types.payment_request import PaymentCurrencyAmount
 from ap2.types.payment_request import PaymentItem
+from ap2.types.payment_request import sum_amounts
 from common import message_utils
+from common import payment_remote_a2a_client
+from common import replay_store
+from common import user_authorization
 from common.a2a_extension_utils import EXTENSION_URI
 from common.a2a_message_builder import A2aMessageBuilder
-from common.payment_remote_a2a_client import PaymentRemoteA2aClient
 
 # A map of payment method types to their corresponding processor agent URLs.
 # This is the set of linked Merchant Payment Processor Agents this Merchant
@@ -50,12 +52,9 @@ _PAYMENT_PROCESSORS_BY_PAYMENT_METHOD_TYPE = {
     "CARD": "http://localhost:8003/a2a/merchant_payment_processor_agent",
 }
 
-# A placeholder for a JSON Web Token (JWT) used for merchant authorization.
-_FAKE_JWT = "eyJhbGciOiJSUzI1NiIsImtpZIwMjQwOTA..."
-
 
 async def update_cart(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
     debug_mode: bool = False,
@@ -80,7 +79,7 @@ async def update_cart(
     await _fail_task(updater, "Missing shipping_address.")
     return
 
-  cart_mandate = storage.get_cart_mandate(cart_id)
+  cart_mandate = storage.get_cart_mandate(updater.context_id, cart_id)
   if not cart_mandate:
     await _fail_task(updater, f"CartMandate not found for cart_id: {cart_id}")
     return
@@ -118,14 +117,18 @@ async def update_cart(
     else:
       payment_request.details.display_items.extend(tax_and_shipping_costs)
 
-    # Recompute the total amount of the PaymentRequest:
-    payment_request.details.total.amount.value = sum(
-        item.amount.value for item in payment_request.details.display_items
+    # Recompute the total amount of the PaymentRequest, exactly in minor units:
+    payment_request.details.total.amount = sum_amounts(
+        [item.amount for item in payment_request.details.display_items],
+        currency=payment_request.details.total.amount.currency,
     )
 
     # A base64url-encoded JSON Web Token (JWT) that digitally signs the cart
-    # contents by the merchant's private key.
-    cart_mandate.merchant_authorization = _FAKE_JWT
+    # contents by the merchant's private key. The contents changed, so the
+    # cart is signed again.
+    await merchant_authorization.sign_cart_mandates([cart_mandate])
+    # get_cart_mandate returns a copy, so the update is stored explicitly.
+    storage.set_cart_mandate(updater.context_id, cart_id, cart_mandate)
 
     await updater.add_artifact([
         Part(
@@ -137,12 +140,13 @@ async def update_cart(
     ])
     await updater.complete()
 
-  except ValidationError as e:
+  except ValueError as e:
+    # Includes pydantic's ValidationError.
     await _fail_task(updater, f"Invalid CartMandate after update: {e}")
 
 
 async def initiate_payment(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
     debug_mode: bool = False,
@@ -181,7 +185,19 @@ async def initiate_payment(
     )
     return
 
-  payment_processor_agent = PaymentRemoteA2aClient(
+  payment_processor_task_id = _get_payment_processor_task_id(current_task)
+  # A PaymentMandate starts one payment; later messages of the same task, e.g.
+  # with a challenge response, continue it.
+  if payment_processor_task_id is None and not replay_store.get_store(
+      "merchant_agent.payment_mandate_ids"
+  ).add(
+      payment_mandate.payment_mandate_contents.payment_mandate_id,
+      user_authorization.expiry_of(payment_mandate.user_authorization),
+  ):
+    await _fail_task(updater, "PaymentMandate has already been submitted.")
+    return
+
+  payment_processor_agent = payment_remote_a2a_client.get_client(
       name="payment_processor_agent",
       base_url=processor_url,
       required_extensions={
@@ -204,7 +220,6 @@ async def initiate_payment(
   if challenge_response:
     message_builder.add_data("challenge_response", challenge_response)
 
-  payment_processor_task_id = _get_payment_processor_task_id(current_task)
   if payment_processor_task_id:
     message_builder.set_task_id(payment_processor_task_id)
 
@@ -216,7 +231,7 @@ async def initiate_payment(
 
 
 async def dpc_finish(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
 ) -> None:
@@ -252,6 +267,28 @@ async def dpc_finish(
   await updater.complete()
 
 
+async def warm_up() -> None:
+  """Connects to the payment processors ahead of the first payment.
+
+  Run when a server process starts, so that the first payment does not wait
+  for the processors' agent cards to be resolved.
+  """
+  for processor_url in set(_PAYMENT_PROCESSORS_BY_PAYMENT_METHOD_TYPE.values()):
+    payment_processor_agent = payment_remote_a2a_client.get_client(
+        name="payment_processor_agent",
+        base_url=processor_url,
+        required_extensions={
+            EXTENSION_URI,
+        },
+    )
+    try:
+      await payment_processor_agent.get_agent_card()
+    except A2AClientError as e:
+      logging.warning(
+          "Could not reach the payment processor at %s: %s", processor_url, e
+      )
+
+
 def _get_payment_processor_task_id(task: Task | None) -> str | None:
   """Returns the task ID of the payment processor task, if it exists.
 
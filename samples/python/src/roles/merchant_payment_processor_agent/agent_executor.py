@@ -34,6 +34,10 @@ from common.base_server_executor import BaseServerExecutor
 from common.system_utils import DEBUG_MODE_INSTRUCTIONS
 
 
+# Keyword rules for prompts that do not name the tool directly.
+_KEYWORD_RULES = [
+    (("initiate", "payment"), "initiate_payment"),
+]
 
 
 class PaymentProcessorExecutor(BaseServerExecutor):
@@ -51,4 +55,9 @@ class PaymentProcessorExecutor(BaseServerExecutor):
     agent_tools = [
         tools.initiate_payment,
     ]
-    super().__init__(supported_extensions, agent_tools, self._system_prompt)
+    super().__init__(
+        supported_extensions,
+        agent_tools,
+        self._system_prompt,
+        keyword_rules=_KEYWORD_RULES,
+    )
@@ -20,7 +20,6 @@ shopping and purchasing process.
 
 
 import logging
-from typing import Any
 
 from a2a.server.tasks.task_updater import TaskUpdater
 from a2a.types import DataPart
@@ -33,21 +32,19 @@ from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
 from ap2.types.mandate import PaymentMandate
 from common import artifact_utils
 from common import message_utils
+from common import payment_remote_a2a_client
 from common.a2a_extension_utils import EXTENSION_URI
 from common.a2a_message_builder import A2aMessageBuilder
-from common.payment_remote_a2a_client import PaymentRemoteA2aClient
 
 
 async def initiate_payment(
-    data_parts: list[dict[str, Any]],
+    data_parts: message_utils.DataPartIndex,
     updater: TaskUpdater,
     current_task: Task | None,
     debug_mode: bool = False,
 ) -> None:
   """Handles the initiation of a payment."""
-  payment_mandate = message_utils.find_data_part(
-      PAYMENT_MANDATE_DATA_KEY, data_parts
-  )
+  payment_mandate = data_parts.parse(PAYMENT_MANDATE_DATA_KEY, PaymentMandate)
   if not payment_mandate:
     error_message = _create_text_parts("Missing payment_mandate.")
     await updater.failed(message=updater.new_agent_message(parts=error_message))
@@ -57,7 +54,7 @@ async def initiate_payment(
       message_utils.find_data_part("challenge_response", data_parts) or ""
   )
   await _handle_payment_mandate(
-      PaymentMandate.model_validate(payment_mandate),
+      payment_mandate,
       challenge_response,
       updater,
       current_task,
@@ -215,7 +212,7 @@ async def _request_payment_credential(
   )
   credentials_provider_url = token_object.get("url")
 
-  credentials_provider = PaymentRemoteA2aClient(
+  credentials_provider = payment_remote_a2a_client.get_client(
       name="credentials_provider",
       base_url=credentials_provider_url,
       required_extensions={EXTENSION_URI},
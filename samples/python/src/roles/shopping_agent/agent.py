@@ -22,6 +22,9 @@ The Google ADK powers this shopping agent, chosen for its simplicity and
 efficiency in developing robust LLM agents.
 """
 
+from google.adk.agents.callback_context import CallbackContext
+
+from . import buywhenready
 from . import tools
 from .subagents.payment_method_collector.agent import payment_method_collector
 from .subagents.shipping_address_collector.agent import shipping_address_collector
@@ -30,6 +33,16 @@ from common.retrying_llm_agent import RetryingLlmAgent
 from common.system_utils import DEBUG_MODE_INSTRUCTIONS
 
 
+def _start_buywhenready(callback_context: CallbackContext) -> None:
+  """Starts the BuyWhenReady engine, if it is not running yet."""
+  buywhenready.start()
+
+
+# Standing intents of earlier runs are due even if no user comes back, so the
+# engine starts with the agent. The agent may be loaded outside the server's
+# event loop, in which case the engine starts with the agent's first run.
+buywhenready.start()
+
 root_agent = RetryingLlmAgent(
     max_retries=2,
     model="gemini-2.5-flash",
@@ -100,7 +113,10 @@ root_agent = RetryingLlmAgent(
                 - Price drops by a certain percentage
                 - Purchase at a specific date/time
                 - Item becomes available in stock
-             b. Collect the specific details for their chosen condition.
+             b. Collect the specific details for their chosen condition, as a
+                dictionary with the keys price_below (an amount),
+                price_drop_percent (a percentage), purchase_at (an ISO 8601
+                date and time) or in_stock (true).
              c. Present a summary of the BuyWhenReady setup to the user:
                 - Item details and price
                 - Shipping address
@@ -111,7 +127,8 @@ root_agent = RetryingLlmAgent(
              e. When the user confirms, call the `create_payment_mandate` tool to
                 create a payment mandate.
              f. Call the following tools in order to set up the BuyWhenReady:
-                i. `sign_mandates_on_user_device`
+                i. `sign_mandates_on_user_device`, with buywhenready set to
+                   true
                 ii. `send_signed_payment_mandate_to_credentials_provider`
              g. Call the `display_kite_proof_of_intent` tool with the following parameters:
                 - user_email: from the user's session
@@ -122,6 +139,19 @@ root_agent = RetryingLlmAgent(
                 - cart_expiry: from the cart mandate
              h. Confirm the BuyWhenReady setup is complete and the purchase will
                 be executed automatically when the specified conditions are met.
+             i. Whenever the user comes back or asks about their BuyWhenReady
+                purchase, call the `get_buywhenready_updates` tool, and tell
+                the user what came of each purchase:
+                - completed: Show a 'Payment Receipt' as in step 8h.
+                - needs_user_action: The payment needs the user's confirmation.
+                  Relay the challenge in the status message, e.g. an OTP
+                  request, and do not ask for anything else. Once you have the
+                  challenge response, call the `initiate_payment_with_otp`
+                  tool and surface the result to the user. Then call
+                  `get_buywhenready_updates` again, as other purchases may
+                  need the user's action too.
+                - pending: The merchant is still processing the payment.
+                - failed: The purchase did not go through; explain why.
 
          Scenario 2:
          The user first wants you to describe all the data passed between you,
@@ -149,10 +179,12 @@ root_agent = RetryingLlmAgent(
         tools.sign_mandates_on_user_device,
         tools.update_cart,
         tools.display_kite_proof_of_intent,
+        tools.get_buywhenready_updates,
     ],
     sub_agents=[
         shopper,
         shipping_address_collector,
         payment_method_collector,
     ],
+    before_agent_callback=_start_buywhenready,
 )
@@ -0,0 +1,816 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Standing BuyWhenReady intents, and the engine that executes them.
+
+A standing intent is a purchase the user has signed in advance, to be made
+once all of its conditions hold. The conditions are given as a dictionary
+with any of these keys:
+- price_below: The item's price is below this amount.
+- price_drop_percent: The item's price dropped by this percentage of its price
+  in the cart.
+- purchase_at: This date and time, in ISO 8601, has passed.
+- in_stock: If true, the item is in stock.
+
+Intents are kept in a SQLite database, and loaded again when the agent starts.
+The engine's methods block on the database, so the coroutines of this module
+call them in worker threads.
+
+In memory, each unmet condition of an intent is indexed, so that an update only
+looks at the intents it may satisfy:
+- Price conditions are a price ceiling, in a max-heap per SKU and currency. A
+  price update pops the intents whose ceiling it meets, in O(log n) each.
+- Stock conditions are in a set per SKU, emptied when the item is in stock.
+- Date/time conditions, and the expiry of the intent's cart, are in a heap of
+  timers.
+
+An intent found by an index is checked against all its conditions. It is
+executed if they all hold, and otherwise indexed again under those that do
+not. Heap entries of an intent that was since executed, cancelled or indexed
+again are skipped when popped, rather than searched for.
+
+The prices and stock that price and stock conditions wait for are polled
+from the merchants of the intents, every BUYWHENREADY_POLL_INTERVAL_SECONDS.
+The merchant is asked for the intent's SKU, as with any IntentMandate: an item
+it offers a signed cart for is in stock, at the cart's price, and an item it
+offers none for is not.
+
+Executing an intent initiates the payment of its signed PaymentMandate with
+the merchant, as the `initiate_payment` tool does. The user signs the
+PaymentMandate of a standing intent until its cart expires, so it is accepted
+whenever the intent executes.
+
+What came of executing an intent is recorded for the shopping agent to tell
+the user. In particular, a payment the issuer challenges, e.g. with a one-time
+password, awaits the user's response: it is recorded as needing their action,
+rather than as completed, and continued by the shopping agent once they are
+back.
+
+An intent whose cart expires before its conditions hold is dropped, and
+recorded as failed.
+"""
+
+import asyncio
+from collections.abc import Mapping
+import dataclasses
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from a2a.types import Task
+from a2a.types import TaskState
+
+from . import remote_agents
+from ap2.types.mandate import CART_MANDATE_DATA_KEY
+from ap2.types.mandate import CartMandate
+from ap2.types.mandate import INTENT_MANDATE_DATA_KEY
+from ap2.types.mandate import IntentMandate
+from ap2.types.mandate import PAYMENT_MANDATE_DATA_KEY
+from ap2.types.payment_request import Money
+from common import time_utils
+from common import validation
+from common.a2a_message_builder import A2aMessageBuilder
+from common.artifact_utils import find_canonical_objects
+
+
+# The database of standing intents.
+_DB_PATH = os.getenv("BUYWHENREADY_DB_PATH", ".state/buywhenready.db")
+
+# How often the timers are checked, in seconds.
+_TIMER_RESOLUTION_SECONDS = 1.0
+
+# How often the prices and stock of the watched items are polled, in seconds.
+_POLL_INTERVAL_SECONDS = float(
+    os.getenv("BUYWHENREADY_POLL_INTERVAL_SECONDS", "60")
+)
+
+_CONDITION_KEYS = frozenset(
+    {"price_below", "price_drop_percent", "purchase_at", "in_stock"}
+)
+
+# The kinds of timers: a date/time condition, or the expiry of the intent.
+_CONDITION_TIMER = 0
+_EXPIRY_TIMER = 1
+
+# The states of an executed intent's payment.
+COMPLETED = "completed"
+NEEDS_USER_ACTION = "needs_user_action"
+PENDING = "pending"
+FAILED = "failed"
+
+_STATES_BY_TASK_STATE = {
+    TaskState.completed: COMPLETED,
+    TaskState.input_required: NEEDS_USER_ACTION,
+    TaskState.auth_required: NEEDS_USER_ACTION,
+    TaskState.submitted: PENDING,
+    TaskState.working: PENDING,
+}
+
+# How long the outcome of an executed intent is kept for the user, in seconds.
+_OUTCOME_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+@dataclasses.dataclass(slots=True)
+class StandingIntent:
+  """A purchase to make once its conditions hold.
+
+  The payment details of the intent are kept in the database only, and read
+  when it is executed.
+
+  Attributes:
+    intent_id: The ID of the intent.
+    sku: The SKU of the item.
+    currency: The currency of price_ceiling.
+    price_ceiling: The highest price to buy at, in minor units, if any.
+    purchase_at: The time to buy at or after, in seconds since the epoch, if
+      any.
+    in_stock: Whether to buy only once the item is in stock.
+    expires_at: When the intent expires with its cart, in seconds since the
+      epoch.
+  """
+
+  intent_id: str
+  sku: str
+  currency: str
+  price_ceiling: int | None
+  purchase_at: float | None
+  in_stock: bool
+  expires_at: float
+
+
+@dataclasses.dataclass(slots=True)
+class Outcome:
+  """What came of executing a standing intent.
+
+  Attributes:
+    intent_id: The ID of the intent.
+    context_id: The shopping context the intent was registered in.
+    state: COMPLETED, NEEDS_USER_ACTION, PENDING or FAILED.
+    task_id: The ID of the merchant's payment task, if it was created.
+    status: The status of the payment task, in JSON, if it was created.
+    error: Why the payment could not be initiated, if it failed to.
+    payment: The payment details of the intent, see BuyWhenReadyEngine.add().
+  """
+
+  intent_id: str
+  context_id: str
+  state: str
+  task_id: str | None
+  status: dict[str, Any] | None
+  error: str | None
+  payment: dict[str, Any]
+
+
+def parse_conditions(
+    conditions: Mapping[str, Any], cart_price: Money
+) -> tuple[int | None, float | None, bool]:
+  """Parses the BuyWhenReady conditions collected from the user.
+
+  Args:
+    conditions: The conditions, as described in the module docstring.
+    cart_price: The price of the item in the cart.
+
+  Returns:
+    The price ceiling in minor units of the cart's currency, the time to buy
+    at in seconds since the epoch, and whether the item must be in stock.
+
+  Raises:
+    ValueError: If there are no conditions, or a condition is unknown or
+      invalid.
+  """
+  unknown_keys = conditions.keys() - _CONDITION_KEYS
+  if unknown_keys:
+    raise ValueError(
+        f"Unknown BuyWhenReady conditions: {', '.join(sorted(unknown_keys))}."
+        f" Use {', '.join(sorted(_CONDITION_KEYS))}."
+    )
+  ceilings = []
+  if conditions.get("price_below") is not None:
+    price_below = Money(
+        currency=cart_price.currency, value=float(conditions["price_below"])
+    )
+    ceilings.append(price_below.minor_units - 1)
+  if conditions.get("price_drop_percent") is not None:
+    percent = float(conditions["price_drop_percent"])
+    if not 0 < percent < 100:
+      raise ValueError("price_drop_percent must be between 0 and 100.")
+    ceilings.append(int(cart_price.minor_units * (100 - percent) // 100))
+  purchase_at = None
+  if conditions.get("purchase_at") is not None:
+    purchase_at = time_utils.parse_timestamp(conditions["purchase_at"])
+  in_stock = bool(conditions.get("in_stock"))
+  if not ceilings and purchase_at is None and not in_stock:
+    raise ValueError("At least one BuyWhenReady condition is required.")
+  return min(ceilings) if ceilings else None, purchase_at, in_stock
+
+
+class BuyWhenReadyEngine:
+  """Keeps standing intents, and finds those an update satisfies."""
+
+  def __init__(self, path: str):
+    """Initialization.
+
+    Loads the intents of the database. Those that expired while the agent
+    was down are dropped by the next advance().
+
+    Args:
+      path: The path of the database file.
+    """
+    self._path = path
+    self._lock = threading.Lock()
+    self._db = None
+    self._db_pid = None
+    self._intents: dict[str, StandingIntent] = {}
+    # The generation of each intent, i.e. when it was last indexed, to tell
+    # stale heap entries. Generations are never reused, even by an intent
+    # registered again.
+    self._generations: dict[str, int] = {}
+    self._next_generation = 0
+    self._prices: dict[tuple[str, str], int] = {}
+    self._in_stock: dict[str, bool] = {}
+    # (-price_ceiling, generation, intent_id), by (SKU, currency).
+    self._price_index: dict[tuple[str, str], list[tuple[int, int, str]]] = {}
+    # The IDs of the intents waiting for the item, by SKU.
+    self._stock_index: dict[str, set[str]] = {}
+    # (time, kind, generation, intent_id)
+    self._timers: list[tuple[float, int, int, str]] = []
+    now = time.time()
+    db = self._connection()
+    db.execute(
+        "DELETE FROM outcomes WHERE recorded_at <= ?",
+        (now - _OUTCOME_TTL_SECONDS,),
+    )
+    rows = db.execute(
+        "SELECT intent_id, sku, currency, price_ceiling, purchase_at,"
+        " in_stock, expires_at FROM standing_intents"
+    )
+    for row in rows:
+      intent = StandingIntent(*row[:5], bool(row[5]), row[6])
+      self._track(intent)
+      if intent.expires_at <= now:
+        continue
+      if not self._index(intent, now):
+        # Due while the agent was down; executed by the next advance().
+        heapq.heappush(
+            self._timers,
+            (
+                now,
+                _CONDITION_TIMER,
+                self._generations[intent.intent_id],
+                intent.intent_id,
+            ),
+        )
+    logging.info("Loaded %d standing intents.", len(self._intents))
+
+  def __len__(self) -> int:
+    return len(self._intents)
+
+  def add(
+      self, intent: StandingIntent, payment: Mapping[str, Any]
+  ) -> list[dict[str, Any]]:
+    """Adds a standing intent, or replaces the one with the same ID.
+
+    Args:
+      intent: The intent.
+      payment: What executing the intent needs: the merchant_name, the
+        shopping context_id, the signed payment_mandate and the risk_data.
+
+    Returns:
+      The payment details of the intent, with its intent_id, if its
+      conditions already hold and it is to be executed right away, in which
+      case it is removed.
+    """
+    with self._lock:
+      # The same PaymentMandate may be registered again, e.g. with other
+      # conditions.
+      self._connection().execute(
+          "INSERT OR REPLACE INTO standing_intents"
+          " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+          (
+              *dataclasses.astuple(intent),
+              json.dumps(payment),
+          ),
+      )
+      previous = self._intents.get(intent.intent_id)
+      if previous is not None:
+        self._remove(previous)
+      self._track(intent)
+      return self._evaluate([intent], time.time())
+
+  def cancel(self, intent_id: str) -> bool:
+    """Cancels a standing intent.
+
+    Args:
+      intent_id: The ID of the intent.
+
+    Returns:
+      True if the intent was cancelled, False if it was not found.
+    """
+    with self._lock:
+      intent = self._intents.get(intent_id)
+      if intent is None:
+        return False
+      self._remove(intent)
+      self._delete([intent_id])
+      return True
+
+  def record_outcome(self, outcome: Outcome) -> None:
+    """Records what came of executing an intent, replacing earlier records.
+
+    Args:
+      outcome: The outcome.
+    """
+    with self._lock:
+      self._write_outcomes([outcome])
+
+  def pop_outcomes(self, context_id: str) -> list[Outcome]:
+    """Removes and returns the outcomes of a shopping context's intents.
+
+    Args:
+      context_id: The shopping context.
+
+    Returns:
+      The outcomes, oldest first.
+    """
+    with self._lock:
+      db = self._connection()
+      db.execute("BEGIN IMMEDIATE")
+      try:
+        rows = db.execute(
+            "SELECT outcome FROM outcomes WHERE context_id = ?"
+            " ORDER BY recorded_at",
+            (context_id,),
+        ).fetchall()
+        db.execute("DELETE FROM outcomes WHERE context_id = ?", (context_id,))
+      except BaseException:
+        db.execute("ROLLBACK")
+        raise
+      db.execute("COMMIT")
+      return [Outcome(**json.loads(row[0])) for row in rows]
+
+  def watched_items(self) -> list[tuple[str, str | None]]:
+    """Returns the items whose price or stock the intents depend on.
+
+    Returns:
+      The SKU of each item, with the name of the merchant of its intents.
+    """
+    with self._lock:
+      return self._connection().execute(
+          "SELECT DISTINCT sku, json_extract(payment, '$.merchant_name')"
+          " FROM standing_intents WHERE price_ceiling IS NOT NULL OR in_stock"
+      ).fetchall()
+
+  def update_price(self, sku: str, price: Money) -> list[dict[str, Any]]:
+    """Records the price of an item, and returns the intents it satisfies.
+
+    Args:
+      sku: The SKU of the item.
+      price: The item's new price.
+
+    Returns:
+      The payment details of the intents to execute, which are removed.
+    """
+    with self._lock:
+      key = (sku, price.currency)
+      self._prices[key] = price.minor_units
+      heap = self._price_index.get(key)
+      now = time.time()
+      matched = []
+      while heap and -heap[0][0] >= price.minor_units:
+        _, generation, intent_id = heapq.heappop(heap)
+        if self._generations.get(intent_id) == generation:
+          matched.append(self._intents[intent_id])
+      if heap is not None and not heap:
+        del self._price_index[key]
+      return self._evaluate(matched, now)
+
+  def update_stock(self, sku: str, in_stock: bool) -> list[dict[str, Any]]:
+    """Records whether an item is in stock, and returns satisfied intents.
+
+    Args:
+      sku: The SKU of the item.
+      in_stock: Whether the item is in stock.
+
+    Returns:
+      The payment details of the intents to execute, which are removed.
+    """
+    with self._lock:
+      self._in_stock[sku] = in_stock
+      if not in_stock:
+        return []
+      waiting = self._stock_index.pop(sku, set())
+      return self._evaluate(
+          [self._intents[intent_id] for intent_id in waiting], time.time()
+      )
+
+  def advance(self, now: float | None = None) -> list[dict[str, Any]]:
+    """Fires the due timers, and returns the intents they satisfy.
+
+    Intents whose cart has expired are dropped, and recorded as failed.
+
+    Args:
+      now: The current time, in seconds since the epoch.
+
+    Returns:
+      The payment details of the intents to execute, which are removed.
+    """
+    with self._lock:
+      now = time.time() if now is None else now
+      matched = []
+      expired = []
+      while self._timers and self._timers[0][0] <= now:
+        _, kind, generation, intent_id = heapq.heappop(self._timers)
+        intent = self._intents.get(intent_id)
+        if intent is None:
+          continue
+        if kind == _EXPIRY_TIMER:
+          if intent.expires_at > now:
+            # The intent was registered again, with a later expiry.
+            continue
+          self._remove(intent)
+          expired.append(intent_id)
+        elif self._generations[intent_id] == generation:
+          matched.append(intent)
+      if expired:
+        logging.info("Dropped %d expired standing intents.", len(expired))
+        self._write_outcomes([
+            Outcome(
+                intent_id=payment["intent_id"],
+                context_id=payment["context_id"],
+                state=FAILED,
+                task_id=None,
+                status=None,
+                error="The cart expired before the conditions were met.",
+                payment=payment,
+            )
+            for payment in self._delete(expired)
+        ])
+      return self._evaluate(matched, now)
+
+  def _evaluate(
+      self, intents: list[StandingIntent], now: float
+  ) -> list[dict[str, Any]]:
+    """Removes the intents whose conditions all hold, and indexes the others.
+
+    Returns:
+      The payment details of the removed intents.
+    """
+    satisfied = []
+    for intent in intents:
+      if self._index(intent, now):
+        continue
+      self._remove(intent)
+      satisfied.append(intent.intent_id)
+    return self._delete(satisfied) if satisfied else []
+
+  def _index(self, intent: StandingIntent, now: float) -> bool:
+    """Indexes an intent under its unmet conditions.
+
+    Returns:
+      Whether any condition is unmet.
+    """
+    intent_id = intent.intent_id
+    generation = self._next_generation
+    self._next_generation += 1
+    self._generations[intent_id] = generation
+    unmet = False
+    if intent.price_ceiling is not None:
+      key = (intent.sku, intent.currency)
+      price = self._prices.get(key)
+      if price is None or price > intent.price_ceiling:
+        heapq.heappush(
+            self._price_index.setdefault(key, []),
+            (-intent.price_ceiling, generation, intent_id),
+        )
+        unmet = True
+    if intent.purchase_at is not None and intent.purchase_at > now:
+      heapq.heappush(
+          self._timers,
+          (intent.purchase_at, _CONDITION_TIMER, generation, intent_id),
+      )
+      unmet = True
+    if intent.in_stock and not self._in_stock.get(intent.sku, False):
+      self._stock_index.setdefault(intent.sku, set()).add(intent_id)
+      unmet = True
+    return unmet
+
+  def _track(self, intent: StandingIntent) -> None:
+    """Keeps an intent in memory, until it expires."""
+    self._intents[intent.intent_id] = intent
+    heapq.heappush(
+        self._timers, (intent.expires_at, _EXPIRY_TIMER, 0, intent.intent_id)
+    )
+
+  def _remove(self, intent: StandingIntent) -> None:
+    """Removes an intent from memory; its heap entries become stale."""
+    del self._intents[intent.intent_id]
+    # An intent loaded after it expired was never indexed.
+    self._generations.pop(intent.intent_id, None)
+    waiting = self._stock_index.get(intent.sku)
+    if waiting is not None:
+      waiting.discard(intent.intent_id)
+
+  def _delete(self, intent_ids: list[str]) -> list[dict[str, Any]]:
+    """Deletes intents from the database, and returns their payment details.
+
+    The payment details of each intent are returned with its intent_id.
+    """
+    db = self._connection()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+      payments = []
+      for intent_id in intent_ids:
+        row = db.execute(
+            "SELECT payment FROM standing_intents WHERE intent_id = ?",
+            (intent_id,),
+        ).fetchone()
+        if row:
+          payments.append({**json.loads(row[0]), "intent_id": intent_id})
+      db.executemany(
+          "DELETE FROM standing_intents WHERE intent_id = ?",
+          [(intent_id,) for intent_id in intent_ids],
+      )
+    except BaseException:
+      db.execute("ROLLBACK")
+      raise
+    db.execute("COMMIT")
+    return payments
+
+  def _write_outcomes(self, outcomes: list[Outcome]) -> None:
+    """Records outcomes, replacing the earlier records of their intents."""
+    recorded_at = time.time()
+    self._connection().executemany(
+        "INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?)",
+        [
+            (
+                outcome.intent_id,
+                outcome.context_id,
+                recorded_at,
+                json.dumps(dataclasses.asdict(outcome)),
+            )
+            for outcome in outcomes
+        ],
+    )
+
+  def _connection(self) -> sqlite3.Connection:
+    """Returns the connection of the current process, opening it if needed."""
+    if self._db is None or self._db_pid != os.getpid():
+      directory = os.path.dirname(self._path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      self._db = sqlite3.connect(
+          self._path,
+          timeout=30.0,
+          isolation_level=None,
+          check_same_thread=False,
+      )
+      self._db.execute("PRAGMA journal_mode=WAL")
+      self._db.execute(
+          "CREATE TABLE IF NOT EXISTS standing_intents ("
+          " intent_id TEXT PRIMARY KEY, sku TEXT NOT NULL,"
+          " currency TEXT NOT NULL, price_ceiling INTEGER, purchase_at REAL,"
+          " in_stock INTEGER NOT NULL, expires_at REAL NOT NULL,"
+          " payment TEXT NOT NULL)"
+      )
+      self._db.execute(
+          "CREATE TABLE IF NOT EXISTS outcomes ("
+          " intent_id TEXT PRIMARY KEY, context_id TEXT NOT NULL,"
+          " recorded_at REAL NOT NULL, outcome TEXT NOT NULL)"
+      )
+      self._db.execute(
+          "CREATE INDEX IF NOT EXISTS outcomes_by_context_id"
+          " ON outcomes (context_id, recorded_at)"
+      )
+      self._db_pid = os.getpid()
+    return self._db
+
+
+def get_engine() -> BuyWhenReadyEngine:
+  """Returns the engine of the shopping agent, loading its intents once.
+
+  Loading the intents reads the database, so on the event loop, call this in
+  a worker thread.
+  """
+  global _engine
+  with _engine_lock:
+    if _engine is None:
+      _engine = BuyWhenReadyEngine(_DB_PATH)
+    return _engine
+
+
+_engine: BuyWhenReadyEngine | None = None
+
+_engine_lock = threading.Lock()
+
+
+async def register(intent: StandingIntent, payment: Mapping[str, Any]) -> None:
+  """Adds a standing intent to the engine, and starts the engine's timers.
+
+  Args:
+    intent: The intent.
+    payment: What executing the intent needs, see BuyWhenReadyEngine.add().
+  """
+  start()
+  await _execute_all(
+      await asyncio.to_thread(lambda: get_engine().add(intent, payment))
+  )
+
+
+async def pop_outcomes(context_id: str) -> list[Outcome]:
+  """Removes and returns the outcomes of a shopping context's intents."""
+  return await asyncio.to_thread(
+      lambda: get_engine().pop_outcomes(context_id)
+  )
+
+
+async def record_outcome(outcome: Outcome) -> None:
+  """Records what came of executing an intent, see pop_outcomes()."""
+  await asyncio.to_thread(lambda: get_engine().record_outcome(outcome))
+
+
+async def on_price_update(sku: str, price: Money) -> None:
+  """Executes the standing intents a new price of an item satisfies."""
+  await _execute_all(
+      await asyncio.to_thread(lambda: get_engine().update_price(sku, price))
+  )
+
+
+async def on_stock_update(sku: str, in_stock: bool) -> None:
+  """Executes the standing intents an item coming in stock satisfies."""
+  await _execute_all(
+      await asyncio.to_thread(lambda: get_engine().update_stock(sku, in_stock))
+  )
+
+
+def start() -> bool:
+  """Starts the engine's timers and its polling of the merchants, once.
+
+  Intents loaded from the database are only executed once this is called, so
+  the shopping agent calls it when it starts, and again when it runs.
+
+  Returns:
+    Whether the timers are running; False if not called from an event loop.
+  """
+  global _timer_task, _poll_task
+  try:
+    loop = asyncio.get_running_loop()
+  except RuntimeError:
+    return False
+  if _timer_task is None or _timer_task.done():
+    _timer_task = loop.create_task(_run_timers())
+  if _poll_task is None or _poll_task.done():
+    _poll_task = loop.create_task(_run_polls())
+  return True
+
+
+_timer_task: asyncio.Task | None = None
+
+_poll_task: asyncio.Task | None = None
+
+
+async def _run_timers() -> None:
+  engine = await asyncio.to_thread(get_engine)
+  while True:
+    await _execute_all(await asyncio.to_thread(engine.advance))
+    await asyncio.sleep(_TIMER_RESOLUTION_SECONDS)
+
+
+async def _run_polls() -> None:
+  engine = await asyncio.to_thread(get_engine)
+  while True:
+    items = await asyncio.to_thread(engine.watched_items)
+    results = await asyncio.gather(
+        *(_poll(sku, merchant_name) for sku, merchant_name in items),
+        return_exceptions=True,
+    )
+    for (sku, merchant_name), result in zip(items, results, strict=True):
+      if isinstance(result, Exception):
+        logging.warning(
+            "Failed to poll %s for the price of %s: %s",
+            merchant_name,
+            sku,
+            result,
+        )
+    await asyncio.sleep(_POLL_INTERVAL_SECONDS)
+
+
+async def _poll(sku: str, merchant_name: str | None) -> None:
+  """Asks a merchant for an item, and executes the intents its answer meets.
+
+  The item is in stock if the merchant offers a signed cart for it, at the
+  price of the cart, and out of stock otherwise.
+  """
+  intent_mandate = IntentMandate(
+      natural_language_description=sku,
+      skus=[sku],
+      intent_expiry=(
+          datetime.now(timezone.utc) + timedelta(minutes=5)
+      ).isoformat(),
+  )
+  message = (
+      A2aMessageBuilder()
+      .add_text("Find products that match the user's IntentMandate.")
+      .add_data(INTENT_MANDATE_DATA_KEY, intent_mandate.model_dump())
+      .add_data("shopping_agent_id", "trusted_shopping_agent")
+      .build()
+  )
+  merchant_agent = remote_agents.get_merchant_client(merchant_name)
+  task = await merchant_agent.send_a2a_message(message)
+  cart_mandates = []
+  if task.status.state == TaskState.completed:
+    cart_mandates = find_canonical_objects(
+        task.artifacts or [], CART_MANDATE_DATA_KEY, CartMandate
+    )
+  if not cart_mandates:
+    await on_stock_update(sku, False)
+    return
+  # Only the item's SKU is asked for, so the first display item of the cart
+  # is the item.
+  cart_mandate = cart_mandates[0]
+  await validation.validate_cart_mandate_signature(cart_mandate)
+  price = (
+      cart_mandate.contents.payment_request.details.display_items[0]
+      .amount.to_money()
+  )
+  await on_price_update(sku, price)
+  await on_stock_update(sku, True)
+
+
+async def _execute_all(payments: list[dict[str, Any]]) -> None:
+  results = await asyncio.gather(
+      *map(_execute, payments), return_exceptions=True
+  )
+  for result in results:
+    if isinstance(result, Exception):
+      logging.error("Failed to execute a standing intent: %s", result)
+
+
+async def _execute(payment: Mapping[str, Any]) -> None:
+  """Initiates the payment of a standing intent, and records its outcome.
+
+  A payment the issuer challenges is not complete: it awaits the user's
+  response, so it is recorded as needing their action.
+  """
+  outcome = Outcome(
+      intent_id=payment["intent_id"],
+      context_id=payment["context_id"],
+      state=FAILED,
+      task_id=None,
+      status=None,
+      error=None,
+      payment=dict(payment),
+  )
+  try:
+    task = await _initiate_payment(payment)
+  except Exception as e:
+    logging.error(
+        "Failed to execute standing intent %s: %s", outcome.intent_id, e
+    )
+    outcome.error = str(e)
+  else:
+    logging.info(
+        "Executed standing intent %s; payment task %s is %s.",
+        outcome.intent_id,
+        task.id,
+        task.status.state,
+    )
+    outcome.state = _STATES_BY_TASK_STATE.get(task.status.state, FAILED)
+    outcome.task_id = task.id
+    outcome.status = task.status.model_dump(mode="json", exclude_none=True)
+  await record_outcome(outcome)
+
+
+async def _initiate_payment(payment: Mapping[str, Any]) -> Task:
+  """Initiates the payment of a standing intent with the merchant."""
+  message = (
+      A2aMessageBuilder()
+      .set_context_id(payment["context_id"])
+      .add_text("Initiate a payment")
+      .add_data(PAYMENT_MANDATE_DATA_KEY, payment["payment_mandate"])
+      .add_data("risk_data", payment["risk_data"])
+      .add_data("shopping_agent_id", "trusted_shopping_agent")
+      .build()
+  )
+  merchant_agent = remote_agents.get_merchant_client(
+      payment.get("merchant_name")
+  )
+  return await merchant_agent.send_a2a_message(message)
@@ -19,11 +19,27 @@ the X-A2A-Extensions header in each HTTP request.
 
 This registry serves as the initial allowlist of remote agents that the shopping
 agent trusts.
+
+The merchants the shopping agent can shop from are set by the
+SHOPPING_AGENT_MERCHANTS environment variable, a JSON object mapping merchant
+names to the base URLs of their agents. By default, the only merchant is the
+sample merchant agent, which stands in for whichever merchants the user names.
 """
 
+from collections.abc import Iterable
+import json
+import os
+
+from common import payment_remote_a2a_client
 from common.a2a_extension_utils import EXTENSION_URI
 from common.payment_remote_a2a_client import PaymentRemoteA2aClient
 
+# The name of the sample merchant, as found in its CartMandates.
+DEFAULT_MERCHANT_NAME = "Generic Merchant"
+
+# The merchant the shopper names in an IntentMandate that allows any merchant.
+_ANY_MERCHANT = "any"
+
 
 credentials_provider_client = PaymentRemoteA2aClient(
     name="credentials_provider",
@@ -43,3 +59,54 @@ merchant_agent_client = PaymentRemoteA2aClient(
     },
     delay_between_calls=1.5,
 )
+
+
+# The base URLs of the merchants' agents, by merchant name.
+_merchant_agent_urls: dict[str, str] = json.loads(
+    os.getenv("SHOPPING_AGENT_MERCHANTS") or "{}"
+)
+
+
+def get_merchant_clients(
+    allowed_merchants: Iterable[str] | None = None,
+) -> dict[str, PaymentRemoteA2aClient]:
+  """Returns the clients of the known merchants a user allows.
+
+  Args:
+    allowed_merchants: The names of the merchants allowed by the user's
+      IntentMandate, compared case-insensitively, or None or "Any" for any
+      merchant. Ignored unless SHOPPING_AGENT_MERCHANTS is set.
+
+  Returns:
+    The clients of the allowed merchants, by merchant name.
+  """
+  if not _merchant_agent_urls:
+    return {DEFAULT_MERCHANT_NAME: merchant_agent_client}
+  names = list(_merchant_agent_urls)
+  allowed = {
+      merchant.strip().casefold() for merchant in allowed_merchants or ()
+  }
+  if allowed and _ANY_MERCHANT not in allowed:
+    names = [name for name in names if name.casefold() in allowed]
+  return {name: get_merchant_client(name) for name in names}
+
+
+def get_merchant_client(merchant_name: str | None) -> PaymentRemoteA2aClient:
+  """Returns the client of a merchant, or of the sample merchant if unknown.
+
+  Args:
+    merchant_name: The name of the merchant.
+
+  Returns:
+    The client of the merchant's agent.
+  """
+  base_url = _merchant_agent_urls.get(merchant_name or "")
+  if base_url is None:
+    return merchant_agent_client
+  return payment_remote_a2a_client.get_client(
+      name=merchant_name,
+      base_url=base_url,
+      required_extensions={
+          EXTENSION_URI,
+      },
+  )
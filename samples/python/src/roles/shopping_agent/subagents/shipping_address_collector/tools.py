@@ -19,15 +19,21 @@ shopping and purchasing process.
 """
 
 from a2a.types import Artifact
+from a2a.types import Task
 from google.adk.tools.tool_context import ToolContext
 
 from ap2.types.contact_picker import CONTACT_ADDRESS_DATA_KEY
 from ap2.types.contact_picker import ContactAddress
 from common import artifact_utils
 from common.a2a_message_builder import A2aMessageBuilder
+from common.single_flight import SingleFlight
 from roles.shopping_agent.remote_agents import credentials_provider_client
 
 
+# Concurrent lookups of the same user's shipping address share one request.
+_address_lookups = SingleFlight()
+
+
 async def get_shipping_address(
     user_email: str,
     tool_context: ToolContext,
@@ -41,14 +47,12 @@ async def get_shipping_address(
   Returns:
     The user's shipping address.
   """
-  message = (
-      A2aMessageBuilder()
-      .set_context_id(tool_context.state["shopping_context_id"])
-      .add_text("Get the user's shipping address.")
-      .add_data("user_email", user_email)
-      .build()
+  # The lookup is a read, so concurrent callers may share it, and the context
+  # of the first of them.
+  task = await _address_lookups.do(
+      user_email, lambda: _request_shipping_address(user_email, tool_context)
   )
-  task = await credentials_provider_client.send_a2a_message(message)
+  # Each caller parses its own copy of the address.
   shipping_address = artifact_utils.only(_parse_addresses(task.artifacts))
   return shipping_address
 
@@ -80,3 +84,17 @@ def _parse_addresses(artifacts: list[Artifact]) -> list[ContactAddress]:
   return artifact_utils.find_canonical_objects(
       artifacts, CONTACT_ADDRESS_DATA_KEY, ContactAddress
   )
+
+
+async def _request_shipping_address(
+    user_email: str, tool_context: ToolContext
+) -> Task:
+  """Asks the credentials provider for a user's shipping address."""
+  message = (
+      A2aMessageBuilder()
+      .set_context_id(tool_context.state["shopping_context_id"])
+      .add_text("Get the user's shipping address.")
+      .add_data("user_email", user_email)
+      .build()
+  )
+  return await credentials_provider_client.send_a2a_message(message)
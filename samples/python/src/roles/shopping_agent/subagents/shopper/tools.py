@@ -16,13 +16,23 @@
 
 Each agent uses individual tools to handle distinct tasks throughout the
 shopping and purchasing process.
+
+The IntentMandate is sent to all the allowed merchants at once. Each merchant
+must answer within its own timeout, and all within a global deadline, after
+which the carts of the merchants that answered are used.
 """
 
+import asyncio
+from collections.abc import Mapping
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
+import logging
+import os
 
 from a2a.types import Artifact
+from a2a.types import Message
+from a2a.types import Task
 from google.adk.tools.tool_context import ToolContext
 
 from ap2.types.mandate import CART_MANDATE_DATA_KEY
@@ -31,7 +41,19 @@ from ap2.types.mandate import INTENT_MANDATE_DATA_KEY
 from ap2.types.mandate import IntentMandate
 from common.a2a_message_builder import A2aMessageBuilder
 from common.artifact_utils import find_canonical_objects
-from roles.shopping_agent.remote_agents import merchant_agent_client
+from common.payment_remote_a2a_client import PaymentRemoteA2aClient
+from common.validation import validate_cart_mandate_signature
+from roles.shopping_agent import remote_agents
+
+# How long all the merchants have to return their carts, in seconds.
+_FIND_PRODUCTS_DEADLINE_SECONDS = float(
+    os.getenv("FIND_PRODUCTS_DEADLINE_SECONDS", "60")
+)
+
+# How long each merchant has to return its carts, in seconds.
+_MERCHANT_TIMEOUT_SECONDS = float(
+    os.getenv("FIND_PRODUCTS_MERCHANT_TIMEOUT_SECONDS", "45")
+)
 
 
 def create_intent_mandate(
@@ -72,17 +94,18 @@ def create_intent_mandate(
 async def find_products(
     tool_context: ToolContext, debug_mode: bool = False
 ) -> list[CartMandate]:
-  """Calls the merchant agent to find products matching the user's intent.
+  """Calls the merchant agents to find products matching the user's intent.
 
   Args:
     tool_context: The ADK supplied tool context.
     debug_mode: Whether the agent is in debug mode.
 
   Returns:
-    A list of CartMandate objects.
+    A list of CartMandate objects, cheapest first.
 
   Raises:
-    RuntimeError: If the merchant agent fails to provide products.
+    RuntimeError: If no merchant is allowed, or none provides products in
+      time.
   """
   intent_mandate = tool_context.state["intent_mandate"]
   if not intent_mandate:
@@ -99,13 +122,44 @@ async def find_products(
       .add_data("shopping_agent_id", "trusted_shopping_agent")
       .build()
   )
-  task = await merchant_agent_client.send_a2a_message(message)
+  merchants = remote_agents.get_merchant_clients(intent_mandate.merchants)
+  if not merchants:
+    raise RuntimeError(
+        f"None of the merchants {intent_mandate.merchants} is known."
+    )
+  tasks = await _send_to_merchants(merchants, message)
+  if not tasks:
+    raise RuntimeError("No merchant provided products in time.")
 
-  if task.status.state != "completed":
-    raise RuntimeError(f"Failed to find products: {task.status}")
+  # The merchant and shopping context of each cart, to continue with the
+  # merchant of the chosen cart.
+  cart_merchants = {}
+  cart_mandates = []
+  for merchant_name, task in tasks.items():
+    for cart_mandate in _parse_cart_mandates(task.artifacts):
+      try:
+        await validate_cart_mandate_signature(cart_mandate)
+      except ValueError as e:
+        logging.warning(
+            "Dropped cart %s of %s: %s",
+            cart_mandate.contents.id,
+            merchant_name,
+            e,
+        )
+        continue
+      cart_merchants[cart_mandate.contents.id] = {
+          "merchant_name": merchant_name,
+          "context_id": task.context_id,
+      }
+      cart_mandates.append(cart_mandate)
+  cart_mandates = _rank_cart_mandates(
+      _deduplicate_cart_mandates(cart_mandates, cart_merchants),
+      intent_mandate.requires_refundability,
+  )
 
-  tool_context.state["shopping_context_id"] = task.context_id
-  cart_mandates = _parse_cart_mandates(task.artifacts)
+  first_task = next(iter(tasks.values()))
+  tool_context.state["shopping_context_id"] = first_task.context_id
+  tool_context.state["cart_merchants"] = cart_merchants
   tool_context.state["cart_mandates"] = cart_mandates
   return cart_mandates
 
@@ -124,10 +178,113 @@ def update_chosen_cart_mandate(cart_id: str, tool_context: ToolContext) -> str:
     )
     if cart.contents.id == cart_id:
       tool_context.state["chosen_cart_id"] = cart_id
+      cart_merchant = tool_context.state.get("cart_merchants", {}).get(cart_id)
+      if cart_merchant:
+        tool_context.state["chosen_merchant_name"] = cart_merchant[
+            "merchant_name"
+        ]
+        tool_context.state["shopping_context_id"] = cart_merchant["context_id"]
       return f"CartMandate with ID {cart_id} selected."
   return f"CartMandate with ID {cart_id} not found."
 
 
+async def _send_to_merchants(
+    merchants: Mapping[str, PaymentRemoteA2aClient], message: Message
+) -> dict[str, Task]:
+  """Sends a message to several merchants at once.
+
+  Args:
+    merchants: The clients of the merchants, by merchant name.
+    message: The message.
+
+  Returns:
+    The completed tasks of the merchants that answered in time, by merchant
+    name, in the order of the merchants.
+  """
+
+  async def send(client: PaymentRemoteA2aClient) -> Task:
+    task = await asyncio.wait_for(
+        client.send_a2a_message(message), timeout=_MERCHANT_TIMEOUT_SECONDS
+    )
+    if task.status.state != "completed":
+      raise RuntimeError(f"Failed to find products: {task.status}")
+    return task
+
+  pending = {
+      name: asyncio.create_task(send(client))
+      for name, client in merchants.items()
+  }
+  await asyncio.wait(pending.values(), timeout=_FIND_PRODUCTS_DEADLINE_SECONDS)
+  tasks = {}
+  for name, pending_task in pending.items():
+    if not pending_task.done():
+      pending_task.cancel()
+      logging.warning("Merchant %s missed the deadline.", name)
+    elif pending_task.exception() is not None:
+      logging.warning(
+          "Merchant %s failed to find products: %r",
+          name,
+          pending_task.exception(),
+      )
+    else:
+      tasks[name] = pending_task.result()
+  return tasks
+
+
+def _deduplicate_cart_mandates(
+    cart_mandates: list[CartMandate],
+    cart_merchants: Mapping[str, Mapping[str, str]],
+) -> list[CartMandate]:
+  """Drops the carts in which a merchant repeats an earlier offer.
+
+  Args:
+    cart_mandates: The carts.
+    cart_merchants: The merchant of each cart, by cart ID.
+
+  Returns:
+    The first cart of each distinct offer, i.e. merchant, items and prices.
+  """
+  offers = set()
+  unique_cart_mandates = []
+  for cart_mandate in cart_mandates:
+    details = cart_mandate.contents.payment_request.details
+    offer = (
+        cart_merchants[cart_mandate.contents.id]["merchant_name"],
+        tuple(
+            (item.label, item.amount.to_money())
+            for item in details.display_items or [details.total]
+        ),
+    )
+    if offer not in offers:
+      offers.add(offer)
+      unique_cart_mandates.append(cart_mandate)
+  return unique_cart_mandates
+
+
+def _rank_cart_mandates(
+    cart_mandates: list[CartMandate], requires_refundability: bool
+) -> list[CartMandate]:
+  """Sorts carts by price, then by the longest refund period.
+
+  Carts that cannot be refunded come last if the user requires refundability.
+  """
+
+  def rank(cart_mandate: CartMandate) -> tuple[bool, str, int, int]:
+    details = cart_mandate.contents.payment_request.details
+    total = details.total.amount.to_money()
+    refund_period = min(
+        item.refund_period for item in details.display_items or [details.total]
+    )
+    return (
+        requires_refundability and refund_period <= 0,
+        total.currency,
+        total.minor_units,
+        -refund_period,
+    )
+
+  return sorted(cart_mandates, key=rank)
+
+
 def _parse_cart_mandates(artifacts: list[Artifact]) -> list[CartMandate]:
   """Parses a list of artifacts into a list of CartMandate objects."""
   return find_canonical_objects(artifacts, CART_MANDATE_DATA_KEY, CartMandate)
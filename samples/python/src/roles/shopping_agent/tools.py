@@ -26,8 +26,10 @@ import os
 from a2a.types import Artifact
 from google.adk.tools.tool_context import ToolContext
 
+from . import buywhenready
+from . import remote_agents
 from .remote_agents import credentials_provider_client
-from .remote_agents import merchant_agent_client
+from ap2.types import canonical
 from ap2.types.contact_picker import ContactAddress
 from ap2.types.mandate import CART_MANDATE_DATA_KEY
 from ap2.types.mandate import CartMandate
@@ -36,7 +38,11 @@ from ap2.types.mandate import PaymentMandate
 from ap2.types.mandate import PaymentMandateContents
 from ap2.types.payment_request import PaymentResponse
 from common import artifact_utils
+from common import time_utils
+from common import user_authorization
 from common.a2a_message_builder import A2aMessageBuilder
+from common.validation import validate_cart_mandate_signature
+from common.payment_remote_a2a_client import PaymentRemoteA2aClient
 
 
 async def update_cart(
@@ -68,11 +74,12 @@ async def update_cart(
       .add_data("debug_mode", debug_mode)
       .build()
   )
-  task = await merchant_agent_client.send_a2a_message(message)
+  task = await _merchant_client(tool_context).send_a2a_message(message)
 
   updated_cart_mandate = artifact_utils.only(
       _parse_cart_mandates(task.artifacts)
   )
+  await validate_cart_mandate_signature(updated_cart_mandate)
 
   tool_context.state["cart_mandate"] = updated_cart_mandate
   tool_context.state["shipping_address"] = shipping_address
@@ -107,7 +114,9 @@ async def initiate_payment(tool_context: ToolContext, debug_mode: bool = False):
       .add_data("debug_mode", debug_mode)
       .build()
   )
-  task = await merchant_agent_client.send_a2a_message(outgoing_message_builder)
+  task = await _merchant_client(tool_context).send_a2a_message(
+      outgoing_message_builder
+  )
   tool_context.state["initiate_payment_task_id"] = task.id
   return task.status
 
@@ -148,7 +157,9 @@ async def initiate_payment_with_otp(
       .build()
   )
 
-  task = await merchant_agent_client.send_a2a_message(outgoing_message_builder)
+  task = await _merchant_client(tool_context).send_a2a_message(
+      outgoing_message_builder
+  )
   return task.status
 
 
@@ -198,7 +209,9 @@ def create_payment_mandate(
   return payment_mandate
 
 
-def sign_mandates_on_user_device(tool_context: ToolContext) -> str:
+def sign_mandates_on_user_device(
+    tool_context: ToolContext, buywhenready: bool = False
+) -> str:
   """Simulates signing the transaction details on a user's secure device.
 
   This function represents the step where the final transaction details,
@@ -206,16 +219,19 @@ def sign_mandates_on_user_device(tool_context: ToolContext) -> str:
   secure hardware element on the user's device (e.g., Secure Enclave) to be
   cryptographically signed with the user's private key.
 
-  Note: This is a placeholder implementation. It does not perform any actual
-  cryptographic operations. It simulates the creation of a signature by
-  concatenating the mandate hashes.
+  Note: The device, and the issuer of its credential, are simulated in this
+  process. The signature is a real SD-JWT presentation, which the other
+  agents verify; see common.user_authorization.
 
   Args:
       tool_context: The context object used for state management. It is expected
         to contain the `payment_mandate` and `cart_mandate`.
+      buywhenready: Whether the user authorizes a BuyWhenReady purchase, made
+        once its conditions hold. The authorization is then valid until the
+        cart expires, rather than for a few minutes.
 
   Returns:
-      A string representing the simulated user authorization signature (JWT).
+      A string representing the user authorization signature (SD-JWT).
   """
   payment_mandate: PaymentMandate = tool_context.state["payment_mandate"]
   cart_mandate: CartMandate = tool_context.state["cart_mandate"]
@@ -223,11 +239,19 @@ def sign_mandates_on_user_device(tool_context: ToolContext) -> str:
   payment_mandate_hash = _generate_payment_mandate_hash(
       payment_mandate.payment_mandate_contents
   )
-  # A JWT containing the user's digital signature to authorize the transaction.
-  # The payload uses hashes to bind the signature to the specific cart and
-  # payment details, and includes a nonce to prevent replay attacks.
-  payment_mandate.user_authorization = (
-      cart_mandate_hash + "_" + payment_mandate_hash
+  # A presentation of the user's credential, signed by their device to
+  # authorize the transaction. The key binding JWT uses hashes to bind the
+  # signature to the specific cart and payment details, and includes a nonce
+  # to prevent replay attacks.
+  payment_mandate.user_authorization = user_authorization.create_presentation(
+      [cart_mandate_hash, payment_mandate_hash],
+      audience=cart_mandate.contents.merchant_name,
+      nonce=uuid.uuid4().hex,
+      expires_at=(
+          time_utils.parse_timestamp(cart_mandate.contents.cart_expiry)
+          if buywhenready
+          else None
+      ),
   )
   tool_context.state["signed_payment_mandate"] = payment_mandate
   return payment_mandate.user_authorization
@@ -265,11 +289,9 @@ def _generate_cart_mandate_hash(cart_mandate: CartMandate) -> str:
   """Generates a cryptographic hash of the CartMandate.
 
   This hash serves as a tamper-proof reference to the specific merchant-signed
-  cart offer that the user has approved.
-
-  Note: This is a placeholder implementation for development. A real
-  implementation must use a secure hashing algorithm (e.g., SHA-256) on the
-  canonical representation of the CartMandate object.
+  cart offer that the user has approved. It is the SHA-256 hash of the
+  canonical JSON of the CartMandate's contents, so every agent computes the
+  same hash for the same cart.
 
   Args:
       cart_mandate: The complete CartMandate object, including the merchant's
@@ -278,7 +300,7 @@ def _generate_cart_mandate_hash(cart_mandate: CartMandate) -> str:
   Returns:
       A string representing the hash of the cart mandate.
   """
-  return "fake_cart_mandate_hash_" + cart_mandate.contents.id
+  return canonical.digest(cart_mandate.contents)
 
 
 def _generate_payment_mandate_hash(
@@ -287,11 +309,8 @@ def _generate_payment_mandate_hash(
   """Generates a cryptographic hash of the PaymentMandateContents.
 
   This hash creates a tamper-proof reference to the specific payment details
-  the user is about to authorize.
-
-  Note: This is a placeholder implementation for development. A real
-  implementation must use a secure hashing algorithm (e.g., SHA-256) on the
-  canonical representation of the PaymentMandateContents object.
+  the user is about to authorize. It is the SHA-256 hash of the canonical JSON
+  of the PaymentMandateContents.
 
   Args:
       payment_mandate_contents: The payment mandate contents to hash.
@@ -299,8 +318,13 @@ def _generate_payment_mandate_hash(
   Returns:
       A string representing the hash of the payment mandate contents.
   """
-  return (
-      "fake_payment_mandate_hash_" + payment_mandate_contents.payment_mandate_id
+  return canonical.digest(payment_mandate_contents)
+
+
+def _merchant_client(tool_context: ToolContext) -> PaymentRemoteA2aClient:
+  """Returns the client of the merchant of the chosen cart."""
+  return remote_agents.get_merchant_client(
+      tool_context.state.get("chosen_merchant_name")
   )
 
 
@@ -311,7 +335,7 @@ def _parse_cart_mandates(artifacts: list[Artifact]) -> list[CartMandate]:
   )
 
 
-def display_kite_proof_of_intent(
+async def display_kite_proof_of_intent(
     user_email: str,
     wallet_address: str,
     merchant_name: str,
@@ -320,14 +344,18 @@ def display_kite_proof_of_intent(
     cart_expiry: str,
     tool_context: ToolContext,
 ) -> str:
-  """Displays the Kite proof of intent for BuyWhenReady purchases.
+  """Registers a BuyWhenReady purchase and displays its Kite proof of intent.
+
+  The signed payment mandate in state is executed once the conditions hold.
 
   Args:
     user_email: The user's email address.
     wallet_address: The user's wallet address.
     merchant_name: The merchant's name.
     item_sku: The item SKU.
-    buywhenready_conditions: The BuyWhenReady conditions.
+    buywhenready_conditions: The BuyWhenReady conditions, with any of the
+      keys price_below (an amount), price_drop_percent (a percentage),
+      purchase_at (an ISO 8601 date and time) and in_stock (true).
     cart_expiry: The cart expiration time.
     tool_context: The ADK supplied tool context.
 
@@ -337,6 +365,49 @@ def display_kite_proof_of_intent(
   # Demo fallback: if user_email not provided, use DEMO_USER_EMAIL or a default
   user_email = user_email or os.getenv("DEMO_USER_EMAIL", "bugsbunny@gmail.com")
 
+  payment_mandate = tool_context.state["signed_payment_mandate"]
+  if not payment_mandate:
+    raise RuntimeError("No signed payment mandate found in tool context state.")
+  cart_mandate: CartMandate = tool_context.state["cart_mandate"]
+  cart_expires_at = time_utils.parse_timestamp(
+      cart_mandate.contents.cart_expiry
+  )
+  # The intent is executed with the user's authorization, so it must be
+  # accepted for as long as the intent stands.
+  if (
+      user_authorization.expiry_of(payment_mandate.user_authorization)
+      < cart_expires_at
+  ):
+    raise ValueError(
+        "The payment mandate was not signed for BuyWhenReady. Call"
+        " sign_mandates_on_user_device with buywhenready set to true."
+    )
+  # The first display item of the cart is the item itself.
+  item_price = (
+      cart_mandate.contents.payment_request.details.display_items[0]
+      .amount.to_money()
+  )
+  price_ceiling, purchase_at, in_stock = buywhenready.parse_conditions(
+      buywhenready_conditions, item_price
+  )
+  await buywhenready.register(
+      buywhenready.StandingIntent(
+          intent_id=payment_mandate.payment_mandate_contents.payment_mandate_id,
+          sku=item_sku,
+          currency=item_price.currency,
+          price_ceiling=price_ceiling,
+          purchase_at=purchase_at,
+          in_stock=in_stock,
+          expires_at=cart_expires_at,
+      ),
+      {
+          "merchant_name": tool_context.state.get("chosen_merchant_name"),
+          "context_id": tool_context.state["shopping_context_id"],
+          "payment_mandate": payment_mandate.model_dump(mode="json"),
+          "risk_data": tool_context.state["risk_data"],
+      },
+  )
+
   # Format the conditions for display
   conditions_text = ""
   if buywhenready_conditions:
@@ -358,6 +429,59 @@ TTL: {cart_expiry}
 Kite prepared verifiable proof to communicate this intent from agent to merchant.
 
 Your purchase will be executed automatically when the specified conditions are met.
+If the payment then needs your confirmation, e.g. with a one-time password, I will ask you for it.
 """
 
   return proof_of_intent
+
+
+async def get_buywhenready_updates(tool_context: ToolContext) -> list[dict]:
+  """Reports what came of the BuyWhenReady purchases of this session.
+
+  A purchase whose payment needs the user's action, i.e. a challenge response
+  such as a one-time password, becomes the current payment, so that
+  `initiate_payment_with_otp` completes it. One such purchase is continued at
+  a time; the others are reported by a later call.
+
+  Args:
+    tool_context: The ADK supplied tool context.
+
+  Returns:
+    Each purchase executed, or expired, since the last call: its intent_id,
+    its state (completed, needs_user_action, pending or failed), the status of
+    the merchant's payment task, and the error if the payment was not
+    initiated, e.g. as the cart expired first.
+  """
+  outcomes = await buywhenready.pop_outcomes(
+      tool_context.state["shopping_context_id"]
+  )
+  updates = []
+  continuing = False
+  for outcome in outcomes:
+    if outcome.state == buywhenready.NEEDS_USER_ACTION:
+      if continuing:
+        await buywhenready.record_outcome(outcome)
+        continue
+      _continue_payment(outcome, tool_context)
+      continuing = True
+    updates.append({
+        "intent_id": outcome.intent_id,
+        "state": outcome.state,
+        "status": outcome.status,
+        "error": outcome.error,
+    })
+  return updates
+
+
+def _continue_payment(
+    outcome: buywhenready.Outcome, tool_context: ToolContext
+) -> None:
+  """Makes the payment of an executed intent the current payment."""
+  tool_context.state["signed_payment_mandate"] = PaymentMandate.model_validate(
+      outcome.payment["payment_mandate"]
+  )
+  tool_context.state["risk_data"] = outcome.payment["risk_data"]
+  tool_context.state["chosen_merchant_name"] = outcome.payment.get(
+      "merchant_name"
+  )
+  tool_context.state["initiate_payment_task_id"] = outcome.task_id
@@ -0,0 +1,292 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Canonical JSON serialization and hashing of the protocol's objects.
+
+Mandates are bound to signatures through hashes of their contents, e.g. the
+cart_hash of a CartMandate's merchant_authorization is a hash of the canonical
+JSON of its CartContents. Every agent must compute the same hash for the same
+contents, so the serialization follows the JSON Canonicalization Scheme (JCS):
+
+https://www.rfc-editor.org/rfc/rfc8785
+
+1. Object members are sorted by the UTF-16 code units of their names.
+2. There is no whitespace between tokens.
+3. Strings are escaped minimally, and are otherwise emitted as UTF-8.
+4. Numbers are serialized as ECMAScript serializes IEEE 754 doubles.
+
+A pydantic model is serialized as its model_dump(mode="json") would be, but in
+a single pass: fields are written straight from the model, in an order sorted
+once per model class.
+"""
+
+import decimal
+import enum
+import functools
+import hashlib
+import json
+import math
+import weakref
+
+from typing import Any
+
+import pydantic_core
+
+from pydantic import BaseModel
+
+
+# Integers beyond this magnitude cannot be represented exactly as doubles.
+_MAX_SAFE_INTEGER = 2**53 - 1
+
+# The magnitudes of the doubles that ECMAScript and repr() both write in
+# positional notation.
+_MIN_POSITIONAL_MAGNITUDE = 1e-4
+_MAX_POSITIONAL_MAGNITUDE = 1e16
+
+# ECMAScript writes a double as 0.significand * 10**n positionally if
+# _MIN_POSITIONAL_EXPONENT < n <= _MAX_POSITIONAL_EXPONENT, and in exponential
+# notation otherwise.
+_MIN_POSITIONAL_EXPONENT = -6
+_MAX_POSITIONAL_EXPONENT = 21
+
+_encode_string = json.encoder.encode_basestring
+
+# Digests of frozen models, by the models' identity.
+_digests: dict[int, str] = {}
+
+
+def canonical_json(value: object) -> str:
+  """Returns the canonical JSON serialization of a value.
+
+  Args:
+    value: A pydantic model, or any value that model_dump(mode="json") can
+      produce.
+
+  Returns:
+    The JSON text.
+
+  Raises:
+    ValueError: If the value contains a number that cannot be represented,
+      i.e. NaN, an infinity, or an integer beyond 2**53 - 1.
+  """
+  parts = []
+  _encode(value, parts)
+  return "".join(parts)
+
+
+def digest(value: object) -> str:
+  """Returns the SHA-256 hash of the canonical JSON of a value, in hex.
+
+  The digest of a frozen pydantic model is computed once, and then reused for
+  the life of the model. Its fields must therefore not contain mutable
+  containers that are modified after the first call.
+
+  Args:
+    value: A pydantic model, or any value that model_dump(mode="json") can
+      produce.
+
+  Returns:
+    The hex-encoded digest.
+
+  Raises:
+    ValueError: If the value cannot be serialized, as for canonical_json().
+  """
+  if not (isinstance(value, BaseModel) and value.model_config.get("frozen")):
+    return _sha256(value)
+
+  key = id(value)
+  value_digest = _digests.get(key)
+  if value_digest is None:
+    value_digest = _sha256(value)
+    _digests[key] = value_digest
+    weakref.finalize(value, _digests.pop, key, None)
+  return value_digest
+
+
+def _sha256(value: object) -> str:
+  return hashlib.sha256(canonical_json(value).encode("utf-8")).hexdigest()
+
+
+def _encode(value: object, parts: list[str]) -> None:
+  """Appends the canonical JSON of a value to parts."""
+  encoder = _ENCODERS_BY_TYPE.get(type(value))
+  if encoder is not None:
+    encoder(value, parts)
+  elif isinstance(value, BaseModel):
+    _encode_model(value, parts)
+  elif isinstance(value, enum.Enum):
+    _encode(value.value, parts)
+  elif isinstance(value, bool):
+    _encode_literal(value, parts)
+  elif isinstance(value, str):
+    _encode_str(value, parts)
+  elif isinstance(value, int):
+    _encode_int(value, parts)
+  elif isinstance(value, float):
+    _encode_float(value, parts)
+  elif isinstance(value, dict):
+    _encode_dict(value, parts)
+  elif isinstance(value, (list, tuple)):
+    _encode_list(value, parts)
+  else:
+    # Other types, e.g. datetimes, are converted as pydantic converts them.
+    _encode(pydantic_core.to_jsonable_python(value), parts)
+
+
+def _encode_model(model: BaseModel, parts: list[str]) -> None:
+  """Appends the canonical JSON of a pydantic model to parts."""
+  fields = _fields(type(model))
+  if fields is None:
+    _encode(model.model_dump(mode="json"), parts)
+    return
+  if model.model_extra:
+    members = {name: getattr(model, name) for name, _ in fields}
+    members.update(model.model_extra)
+    _encode_dict(members, parts)
+    return
+  if not fields:
+    parts.append("{}")
+    return
+  for name, prefix in fields:
+    parts.append(prefix)
+    _encode(getattr(model, name), parts)
+  parts.append("}")
+
+
+def _encode_dict(value: dict[str, Any], parts: list[str]) -> None:
+  if not value:
+    parts.append("{}")
+    return
+  separator = "{"
+  for name in sorted(value, key=_utf16_key):
+    if not isinstance(name, str):
+      raise ValueError(f"Object member names must be strings: {name!r}")
+    parts.append(separator)
+    parts.append(_encode_string(name))
+    parts.append(":")
+    _encode(value[name], parts)
+    separator = ","
+  parts.append("}")
+
+
+def _encode_list(value: list[Any] | tuple[Any, ...], parts: list[str]) -> None:
+  if not value:
+    parts.append("[]")
+    return
+  separator = "["
+  for item in value:
+    parts.append(separator)
+    _encode(item, parts)
+    separator = ","
+  parts.append("]")
+
+
+def _encode_str(value: str, parts: list[str]) -> None:
+  parts.append(_encode_string(value))
+
+
+def _encode_int(value: int, parts: list[str]) -> None:
+  if abs(value) > _MAX_SAFE_INTEGER:
+    raise ValueError(f"Integer out of the range of a double: {value}")
+  parts.append(str(value))
+
+
+def _encode_float(value: float, parts: list[str]) -> None:
+  parts.append(_format_number(value))
+
+
+def _encode_literal(value: bool | None, parts: list[str]) -> None:
+  parts.append(_LITERALS[value])
+
+
+_LITERALS = {None: "null", True: "true", False: "false"}
+
+_ENCODERS_BY_TYPE = {
+    str: _encode_str,
+    int: _encode_int,
+    float: _encode_float,
+    bool: _encode_literal,
+    type(None): _encode_literal,
+    dict: _encode_dict,
+    list: _encode_list,
+    tuple: _encode_list,
+}
+
+
+@functools.cache
+def _fields(
+    model_class: type[BaseModel],
+) -> tuple[tuple[str, str], ...] | None:
+  """Returns a model's fields in canonical order, with their encoded names.
+
+  Each name is encoded with the punctuation that precedes its value, so that a
+  model is encoded without sorting or escaping anything.
+
+  Returns:
+    The fields, or None if the model customizes its serialization, in which
+    case it must be dumped to be encoded.
+  """
+  decorators = model_class.__pydantic_decorators__
+  if decorators.model_serializers or decorators.field_serializers:
+    return None
+  names = [
+      name
+      for name, field in model_class.model_fields.items()
+      if not field.exclude
+  ]
+  names.extend(model_class.model_computed_fields)
+  names.sort(key=_utf16_key)
+  return tuple(
+      (name, ("," if i else "{") + _encode_string(name) + ":")
+      for i, name in enumerate(names)
+  )
+
+
+def _utf16_key(name: str) -> bytes:
+  return name.encode("utf-16-be")
+
+
+def _format_number(value: float) -> str:
+  """Formats a double as ECMAScript's Number.prototype.toString() does."""
+  if not math.isfinite(value):
+    raise ValueError(f"Number cannot be represented in JSON: {value}")
+  if value == 0:
+    return "0"
+  if value.is_integer():
+    if abs(value) <= _MAX_SAFE_INTEGER:
+      return str(int(value))
+  elif _MIN_POSITIONAL_MAGNITUDE <= abs(value) < _MAX_POSITIONAL_MAGNITUDE:
+    # repr() gives the shortest digits that round trip, as ECMAScript
+    # requires, and in this range both use the same positional notation.
+    return repr(value)
+
+  # Otherwise, the notations differ.
+  sign, digits, exponent = decimal.Decimal(repr(value)).as_tuple()
+  while len(digits) > 1 and digits[-1] == 0:
+    digits = digits[:-1]
+    exponent += 1
+  significand = "".join(map(str, digits))
+  k = len(digits)
+  n = exponent + k  # The value is 0.significand * 10**n.
+  if k <= n <= _MAX_POSITIONAL_EXPONENT:
+    text = significand + "0" * (n - k)
+  elif 0 < n <= _MAX_POSITIONAL_EXPONENT:
+    text = f"{significand[:n]}.{significand[n:]}"
+  elif _MIN_POSITIONAL_EXPONENT < n <= 0:
+    text = f"0.{'0' * -n}{significand}"
+  else:
+    e = n - 1
+    fraction = f".{significand[1:]}" if k > 1 else ""
+    text = f"{significand[0]}{fraction}e{'+' if e >= 0 else '-'}{abs(e)}"
+  return f"-{text}" if sign else text
@@ -22,11 +22,19 @@ Specification:
 https://www.w3.org/TR/payment-request/
 """
 
+import array
+from collections.abc import Sequence
+import decimal
+import functools
 from typing import Any, Dict, Optional
 
 from ap2.types.contact_picker import ContactAddress
 from pydantic import BaseModel
+from pydantic import ConfigDict
 from pydantic import Field
+from pydantic import model_serializer
+from pydantic import model_validator
+
 
 PAYMENT_METHOD_DATA_DATA_KEY = "payment_request.PaymentMethodData"
 
@@ -43,6 +51,223 @@ class PaymentCurrencyAmount(BaseModel):
   )
   value: float = Field(..., description="The monetary value.")
 
+  def to_money(self) -> "Money":
+    """Returns the amount as an exact number of minor units."""
+    return Money(
+        currency=self.currency,
+        minor_units=_to_minor_units(self.value, self.currency),
+    )
+
+
+# The ISO 4217 minor unit exponents of the currencies that do not have 2
+# decimal places.
+_CURRENCY_EXPONENTS = {
+    "BHD": 3,
+    "BIF": 0,
+    "CLF": 4,
+    "CLP": 0,
+    "DJF": 0,
+    "GNF": 0,
+    "IQD": 3,
+    "ISK": 0,
+    "JOD": 3,
+    "JPY": 0,
+    "KMF": 0,
+    "KRW": 0,
+    "KWD": 3,
+    "LYD": 3,
+    "OMR": 3,
+    "PYG": 0,
+    "RWF": 0,
+    "TND": 3,
+    "UGX": 0,
+    "UYI": 0,
+    "UYW": 4,
+    "VND": 0,
+    "VUV": 0,
+    "XAF": 0,
+    "XOF": 0,
+    "XPF": 0,
+}
+
+_DEFAULT_CURRENCY_EXPONENT = 2
+
+
+def currency_exponent(currency: str) -> int:
+  """Returns the number of decimal places of a currency's minor unit."""
+  return _CURRENCY_EXPONENTS.get(currency.upper(), _DEFAULT_CURRENCY_EXPONENT)
+
+
+@functools.total_ordering
+class Money(BaseModel):
+  """An exact monetary amount, in integer minor units of its currency.
+
+  Amounts are added and compared exactly, e.g. as cents rather than as
+  fractional dollars. A Money serializes to, and validates from, the same JSON
+  as a PaymentCurrencyAmount.
+  """
+
+  model_config = ConfigDict(frozen=True)
+
+  currency: str = Field(
+      ..., description="The three-letter ISO 4217 currency code."
+  )
+  minor_units: int = Field(
+      ..., description="The amount, in minor units of the currency."
+  )
+
+  @model_validator(mode="before")
+  @classmethod
+  def _from_amount(cls, data: object) -> object:
+    """Accepts the PaymentCurrencyAmount shape, with a decimal value."""
+    if isinstance(data, PaymentCurrencyAmount):
+      data = data.model_dump()
+    if isinstance(data, dict) and "value" in data:
+      return {
+          "currency": data["currency"],
+          "minor_units": _to_minor_units(data["value"], data["currency"]),
+      }
+    return data
+
+  @model_serializer
+  def _to_amount_shape(self) -> dict[str, Any]:
+    return {"currency": self.currency, "value": self.value}
+
+  @property
+  def value(self) -> float:
+    """The amount in major units, as in PaymentCurrencyAmount.value."""
+    return self.minor_units / 10 ** currency_exponent(self.currency)
+
+  def to_amount(self) -> PaymentCurrencyAmount:
+    """Returns the amount as a PaymentCurrencyAmount."""
+    return PaymentCurrencyAmount(currency=self.currency, value=self.value)
+
+  def __add__(self, other: "Money") -> "Money":
+    """Returns the sum of two amounts of the same currency."""
+    self._check_currency(other)
+    return Money(
+        currency=self.currency, minor_units=self.minor_units + other.minor_units
+    )
+
+  def __sub__(self, other: "Money") -> "Money":
+    """Returns the difference of two amounts of the same currency."""
+    self._check_currency(other)
+    return Money(
+        currency=self.currency, minor_units=self.minor_units - other.minor_units
+    )
+
+  def __mul__(self, quantity: int) -> "Money":
+    """Returns the amount times an integer quantity."""
+    return Money(
+        currency=self.currency, minor_units=self.minor_units * quantity
+    )
+
+  def __lt__(self, other: "Money") -> bool:
+    """Returns whether the amount is less than one of the same currency."""
+    self._check_currency(other)
+    return self.minor_units < other.minor_units
+
+  def _check_currency(self, other: "Money") -> None:
+    if other.currency != self.currency:
+      raise ValueError(
+          f"Currency mismatch: {self.currency} and {other.currency}"
+      )
+
+
+def to_minor_units(
+    amounts: Sequence[PaymentCurrencyAmount],
+) -> tuple[str | None, array.array]:
+  """Converts amounts of a single currency to an array of minor units.
+
+  Args:
+    amounts: The amounts, e.g. those of a cart's display items.
+
+  Returns:
+    The currency, or None if there are no amounts, and the amounts in minor
+    units as a signed 64-bit integer array.
+
+  Raises:
+    ValueError: If the amounts are in more than one currency.
+  """
+  currency = _common_currency(amounts)
+  return currency, array.array(
+      "q", (_to_minor_units(amount.value, currency) for amount in amounts)
+  )
+
+
+def from_minor_units(
+    currency: str, minor_units: Sequence[int]
+) -> list[PaymentCurrencyAmount]:
+  """Converts an array of minor units back to PaymentCurrencyAmounts."""
+  scale = 10 ** currency_exponent(currency)
+  return [
+      PaymentCurrencyAmount(currency=currency, value=units / scale)
+      for units in minor_units
+  ]
+
+
+def sum_amounts(
+    amounts: Sequence[PaymentCurrencyAmount], currency: str | None = None
+) -> PaymentCurrencyAmount:
+  """Returns the exact total of amounts of a single currency.
+
+  Args:
+    amounts: The amounts to total.
+    currency: The currency of the total if there are no amounts.
+
+  Returns:
+    The total.
+
+  Raises:
+    ValueError: If the amounts are in more than one currency, or in a
+      different currency than the one given.
+  """
+  amounts_currency, minor_units = to_minor_units(amounts)
+  if amounts_currency is None and currency is None:
+    raise ValueError("A currency is required to total no amounts.")
+  if currency is not None and amounts_currency not in (None, currency):
+    raise ValueError(f"Currency mismatch: {amounts_currency} and {currency}")
+  return Money(
+      currency=amounts_currency or currency, minor_units=sum(minor_units)
+  ).to_amount()
+
+
+def amounts_equal(
+    left: Sequence[PaymentCurrencyAmount],
+    right: Sequence[PaymentCurrencyAmount],
+) -> bool:
+  """Returns whether two lists of amounts are exactly equal, item by item.
+
+  Amounts are compared in minor units, so values that differ only by floating
+  point error, e.g. 0.1 + 0.2 and 0.3, are equal.
+  """
+  if len(left) != len(right):
+    return False
+  return all(
+      a.to_money() == b.to_money()
+      for a, b in zip(left, right, strict=True)
+  )
+
+
+def _common_currency(amounts: Sequence[PaymentCurrencyAmount]) -> str | None:
+  """Returns the currency of all the amounts, or None if there are none."""
+  currencies = {amount.currency for amount in amounts}
+  if len(currencies) > 1:
+    raise ValueError(f"Amounts in more than one currency: {sorted(currencies)}")
+  return currencies.pop() if currencies else None
+
+
+def _to_minor_units(value: float | int | str, currency: str) -> int:
+  """Converts a decimal amount to minor units, rounding half away from zero."""
+  # repr() gives the shortest decimal that round trips, e.g. 0.3 rather than
+  # 0.299999999999999988897769753748.
+  amount = decimal.Decimal(repr(value) if isinstance(value, float) else value)
+  return int(
+      amount.scaleb(currency_exponent(currency)).to_integral_value(
+          rounding=decimal.ROUND_HALF_UP
+      )
+  )
+
 
 class PaymentItem(BaseModel):
   """An item for purchase and the value asked for it.